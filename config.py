@@ -49,6 +49,8 @@ DEFAULT_CONFIG = {
 
     # PostgreSQL API
     "postgres_api_port": 3200,
+    "postgres_sse_port": 3201,
+    "postgres_sse_url": "",  # 비우면 http://<요청 호스트>:postgres_sse_port
     "postgres_auto_start": False,
     "postgres": {
         "host": "192.168.0.173",
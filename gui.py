@@ -15,7 +15,7 @@ from config import (
     APP_VERSION, VERSION, APP_NAME, APP_DIR,
     load_config, save_config, is_startup_enabled, set_startup_enabled
 )
-from services import mssql_db, postgres_db, git_build
+from services import mssql_db, postgres_db, git_build, treatment_sync, change_feed, sse_server
 from services.server_manager import HealthMonitor, get_health_monitor
 
 
@@ -46,22 +46,8 @@ class UnifiedServerGUI:
         self.postgres_log = None
         self.chat_log = None
 
-        # MSSQL → PostgreSQL 대기열 동기화 스레드
-        self.waiting_sync_running = False
-        self.waiting_sync_thread = None
-        self.sync_count = 0
-        self.last_sync_time = None
-
         # 요일별 스케줄 기본값 (월~일)
-        self.default_schedule = {
-            "mon": {"enabled": True, "start": "08:30", "end": "18:30"},
-            "tue": {"enabled": True, "start": "08:30", "end": "18:30"},
-            "wed": {"enabled": True, "start": "08:30", "end": "18:30"},
-            "thu": {"enabled": True, "start": "08:30", "end": "18:30"},
-            "fri": {"enabled": True, "start": "08:30", "end": "18:30"},
-            "sat": {"enabled": True, "start": "08:30", "end": "13:00"},
-            "sun": {"enabled": False, "start": "09:00", "end": "12:00"},
-        }
+        self.default_schedule = treatment_sync.DEFAULT_SCHEDULE
 
         self._setup_styles()
         self._create_widgets()
@@ -583,7 +569,7 @@ class UnifiedServerGUI:
             self.sync_postgres_label.configure(foreground="red")
 
         # 동기화 상태
-        if self.waiting_sync_running:
+        if treatment_sync.is_started():
             self.sync_status_var.set("Running")
             self.sync_status_label.configure(foreground="green")
             self.sync_start_btn.configure(state=tk.DISABLED)
@@ -594,10 +580,11 @@ class UnifiedServerGUI:
             self.sync_start_btn.configure(state=tk.NORMAL)
             self.sync_stop_btn.configure(state=tk.DISABLED)
 
-        # 통계 업데이트
-        self.sync_count_var.set(str(self.sync_count))
-        if self.last_sync_time:
-            self.last_sync_var.set(self.last_sync_time.strftime("%H:%M:%S"))
+        # 통계 업데이트 (treatment_sync 서비스 통계)
+        sync_stats = treatment_sync.get_stats()
+        self.sync_count_var.set(str(sync_stats["total_added"]))
+        if sync_stats["last_run"]:
+            self.last_sync_var.set(sync_stats["last_run"][11:])
 
         # 1초마다 업데이트
         self.root.after(1000, self._update_sync_status)
@@ -620,45 +607,17 @@ class UnifiedServerGUI:
             return
 
         def do_sync():
-            import requests
-            from datetime import datetime
-
             try:
-                mssql_port = self.mssql_port_var.get()
-                postgres_port = self.postgres_port_var.get()
-
-                mssql_res = requests.get(f"http://localhost:{mssql_port}/api/queue/status", timeout=5)
-                if mssql_res.status_code != 200:
-                    self.root.after(0, lambda: messagebox.showerror("Error", "MSSQL API 오류"))
-                    return
+                result = treatment_sync.run_once(full=True)
 
-                queue_data = mssql_res.json()
-                treating_list = queue_data.get('treating', [])
-
-                for t in treating_list:
-                    if 'treating_since' in t and 'waiting_since' not in t:
-                        t['waiting_since'] = t['treating_since']
-
-                if not treating_list:
+                if not result["fetched"]:
                     self.root.after(0, lambda: messagebox.showinfo("Info", "동기화할 환자가 없습니다."))
                     return
 
-                sync_res = requests.post(
-                    f"http://localhost:{postgres_port}/api/treatments/sync",
-                    json={"waiting": treating_list},
-                    timeout=5
-                )
-
-                if sync_res.status_code == 200:
-                    result = sync_res.json()
-                    added = result.get('added', 0)
-                    updated = result.get('updated', 0)
-                    skipped = result.get('skipped', 0)
-                    self.sync_count += added
-                    self.last_sync_time = datetime.now()
-                    self.root.after(0, lambda: messagebox.showinfo("Success", f"동기화 완료: 추가 {added}, 업데이트 {updated}, 스킵 {skipped}"))
-                else:
-                    self.root.after(0, lambda: messagebox.showerror("Error", "PostgreSQL API 오류"))
+                added = result['added']
+                updated = result['updated']
+                skipped = result['skipped']
+                self.root.after(0, lambda: messagebox.showinfo("Success", f"동기화 완료: 추가 {added}, 업데이트 {updated}, 스킵 {skipped}"))
 
             except Exception as e:
                 self.root.after(0, lambda: messagebox.showerror("Error", f"동기화 오류: {str(e)}"))
@@ -681,6 +640,10 @@ class UnifiedServerGUI:
         self.config["sync_schedule"] = schedule
 
         save_config(self.config)
+
+        # 실행 중이면 새 간격/스케줄로 다시 등록
+        if treatment_sync.is_started():
+            treatment_sync.start(self.config["sync_interval"], schedule)
         messagebox.showinfo("Success", "Sync settings saved")
 
 
@@ -893,6 +856,9 @@ class UnifiedServerGUI:
         git_build.mssql_log_callback = make_log_callback(self.mssql_log)  # MSSQL self-update 로그
         mssql_db.log_callback = make_log_callback(self.mssql_log)
         postgres_db.log_callback = make_log_callback(self.postgres_log)
+        treatment_sync.log_callback = make_log_callback(self.postgres_log)
+        change_feed.log_callback = make_log_callback(self.postgres_log)
+        sse_server.log_callback = make_log_callback(self.postgres_log)
 
     def _append_log(self, log_widget, message):
         log_widget.configure(state=tk.NORMAL)
@@ -1330,7 +1296,7 @@ class UnifiedServerGUI:
     def _start_postgres(self):
         from flask import Flask
         from flask_cors import CORS
-        from routes.postgres_routes import postgres_bp
+        from routes.postgres_routes import postgres_bp, init_schema
         from routes.file_routes import file_bp
 
         # 연결 테스트
@@ -1339,6 +1305,9 @@ class UnifiedServerGUI:
             messagebox.showerror("Error", f"PostgreSQL 연결 실패:\n{result.get('error', 'Unknown error')}")
             return
 
+        # 동기화용 테이블/인덱스 준비
+        init_schema()
+
         port = self.postgres_port_var.get()
 
         self.postgres_app = Flask(__name__)
@@ -1363,7 +1332,7 @@ class UnifiedServerGUI:
                     self.postgres_app,
                     host='0.0.0.0',
                     port=port,
-                    threads=64,
+                    threads=postgres_db.SERVER_THREADS,
                     connection_limit=200,
                     channel_timeout=120,
                     expose_tracebacks=False,
@@ -1375,6 +1344,9 @@ class UnifiedServerGUI:
 
         threading.Thread(target=run, daemon=True).start()
 
+        # SSE 구독 스트림은 별도 비동기 서버에서 처리 (/api/subscribe는 여기로 리다이렉트)
+        sse_server.start(self.config.get("postgres_sse_port", sse_server.DEFAULT_PORT))
+
         self.postgres_status_var.set("Running")
         self.postgres_status_label.configure(foreground="green")
         self.postgres_start_btn.configure(state=tk.DISABLED)
@@ -1515,131 +1487,15 @@ class UnifiedServerGUI:
 
     # ============ MSSQL → PostgreSQL 대기열 동기화 ============
     def _start_waiting_sync(self):
-        """MSSQL Waiting → PostgreSQL waiting_queue 백그라운드 동기화 시작"""
-        if self.waiting_sync_running:
-            return
-
-        self.waiting_sync_running = True
-        self.waiting_sync_thread = threading.Thread(target=self._waiting_sync_loop, daemon=True)
-        self.waiting_sync_thread.start()
-        interval = self.config.get("sync_interval", 5)
-        postgres_db.log(f"대기열 동기화 시작 ({interval}초 간격)", force=True)
+        """MSSQL Treating → PostgreSQL 치료기록 주기 동기화 시작 (treatment_sync 서비스, GUI 상태와 무관하게 실행)"""
+        treatment_sync.start(
+            self.config.get("sync_interval", treatment_sync.DEFAULT_INTERVAL),
+            self.config.get("sync_schedule", self.default_schedule)
+        )
 
     def _stop_waiting_sync(self):
         """동기화 중지"""
-        self.waiting_sync_running = False
-        if self.waiting_sync_thread:
-            self.waiting_sync_thread = None
-
-
-    def _is_within_schedule(self):
-        """현재 시간이 스케줄 내에 있는지 확인"""
-        from datetime import datetime
-
-        now = datetime.now()
-        day_map = {0: "mon", 1: "tue", 2: "wed", 3: "thu", 4: "fri", 5: "sat", 6: "sun"}
-        day_key = day_map[now.weekday()]
-
-        schedule = self.config.get("sync_schedule", self.default_schedule)
-        day_schedule = schedule.get(day_key, self.default_schedule[day_key])
-
-        if not day_schedule.get("enabled", True):
-            return False
-
-        try:
-            start_str = day_schedule.get("start", "08:30")
-            end_str = day_schedule.get("end", "18:30")
-
-            start_time = datetime.strptime(start_str, "%H:%M").time()
-            end_time = datetime.strptime(end_str, "%H:%M").time()
-            current_time = now.time()
-
-            return start_time <= current_time <= end_time
-        except:
-            return True  # 파싱 오류 시 동기화 허용
-
-    def _waiting_sync_loop(self):
-        """설정된 간격으로 MSSQL Treating(치료실)을 PostgreSQL waiting_queue에 동기화
-
-        - MSSQL Treating → PostgreSQL waiting_queue (queue_type='treatment')
-        - MSSQL Waiting(대기실)은 동기화하지 않음 (CS관리에서 수동 처리)
-        - 요일별 스케줄에 따라 동기화 실행
-        """
-        import time
-        import requests
-        from datetime import datetime
-
-        while self.waiting_sync_running:
-            interval = self.config.get("sync_interval", 5)
-
-            try:
-                # 두 서버가 모두 실행 중인지 확인
-                if not self.mssql_running or not self.postgres_running:
-                    time.sleep(interval)
-                    continue
-
-                # 스케줄 체크
-                if not self._is_within_schedule():
-                    time.sleep(interval)
-                    continue
-
-                mssql_port = self.mssql_port_var.get()
-                postgres_port = self.postgres_port_var.get()
-
-                # 1. MSSQL에서 치료실(Treating) 목록만 가져오기
-                try:
-                    mssql_res = requests.get(
-                        f"http://localhost:{mssql_port}/api/queue/status",
-                        timeout=5
-                    )
-                    if mssql_res.status_code != 200:
-                        time.sleep(interval)
-                        continue
-
-                    queue_data = mssql_res.json()
-                    treating_list = queue_data.get('treating', [])
-
-                    # treating 데이터를 waiting 형식에 맞게 변환
-                    for t in treating_list:
-                        if 'treating_since' in t and 'waiting_since' not in t:
-                            t['waiting_since'] = t['treating_since']
-
-                    sync_list = treating_list
-
-                except requests.exceptions.RequestException:
-                    time.sleep(interval)
-                    continue
-
-                # 목록이 비어있으면 동기화 스킵
-                if not sync_list:
-                    time.sleep(interval)
-                    continue
-
-                # 2. PostgreSQL에 동기화 (daily_treatment_records)
-                try:
-                    sync_res = requests.post(
-                        f"http://localhost:{postgres_port}/api/treatments/sync",
-                        json={"waiting": sync_list},
-                        timeout=5
-                    )
-
-                    if sync_res.status_code == 200:
-                        result = sync_res.json()
-                        added = result.get('added', 0)
-                        updated = result.get('updated', 0)
-                        skipped = result.get('skipped', 0)
-                        self.last_sync_time = datetime.now()
-                        if added > 0:
-                            self.sync_count += added
-                            postgres_db.log(f"치료기록 동기화: 추가 {added}, 업데이트 {updated}, 스킵 {skipped}", force=True)
-
-                except requests.exceptions.RequestException:
-                    pass
-
-            except Exception as e:
-                postgres_db.log(f"대기열 동기화 오류: {e}")
-
-            time.sleep(interval)
+        treatment_sync.stop()
 
     def _check_and_start_waiting_sync(self):
         """두 서버가 모두 실행 중이고 auto_start가 활성화되어 있으면 동기화 시작"""
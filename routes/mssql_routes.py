@@ -10,9 +10,13 @@ MSSQL API 라우트
 MODULE_VERSION = "2.6.8"
 
 from datetime import datetime
+from functools import wraps
 import threading
+import time
 from flask import Blueprint, request, jsonify, Response, make_response
 from services import mssql_db
+from services import stats_cache
+from services import stats_rollup
 from services import git_build
 from config import VERSION, load_config
 
@@ -46,6 +50,98 @@ def json_response(data, status=200):
     return add_cors_headers(response)
 
 
+# ============ SQL 날짜 조건 헬퍼 ============
+# CAST(TxDate AS DATE) = ... 처럼 컬럼을 감싸면 TxDate 인덱스를 사용할 수 없으므로
+# 모든 날짜 조건은 반열린 구간(col >= 시작일 AND col < 종료일+1)으로 작성한다.
+
+def _date_bounds(start_date, end_date=None):
+    """'YYYY-MM-DD' 시작/종료일(포함) -> (시작일, 종료일 다음날) 문자열
+
+    형식이 잘못되면 ValueError (SQL에 직접 넣어도 안전한 값만 반환)
+    """
+    from datetime import timedelta
+
+    start = datetime.strptime(str(start_date)[:10], '%Y-%m-%d')
+    end = datetime.strptime(str(end_date or start_date)[:10], '%Y-%m-%d')
+    return start.strftime('%Y-%m-%d'), (end + timedelta(days=1)).strftime('%Y-%m-%d')
+
+
+def _date_range_sql(column, start_param='start_date', end_param='end_date'):
+    """날짜 범위 조건 (mssql_db.execute용 named 파라미터)
+
+    예: _date_range_sql('r.TxDate')
+        -> "r.TxDate >= %(start_date)s AND r.TxDate < DATEADD(DAY, 1, %(end_date)s)"
+    """
+    return f"{column} >= %({start_param})s AND {column} < DATEADD(DAY, 1, %({end_param})s)"
+
+
+def _same_day_sql(column, day_expr):
+    """column이 day_expr(DATE 식, 예: CAST(r.TxDate AS DATE))과 같은 날인지 (상관 서브쿼리용)"""
+    return f"{column} >= {day_expr} AND {column} < DATEADD(DAY, 1, {day_expr})"
+
+
+# ============ 통계 결과 캐시 ============
+# 지난 기간의 통계는 바뀌지 않으므로 (endpoint, period, date, doctor, category)별로
+# 응답을 캐시한다. 종료일이 오늘 이전이면 영구(LRU), 오늘이 포함되면 짧은 TTL.
+
+def _stats_range_end(kind):
+    """요청 파라미터로 조회 기간의 마지막 날(YYYY-MM-DD) 계산
+
+    kind:
+    - 'period': period + date (daily/weekly/monthly)
+    - 'trend': period + end_date (monthly: 해당 월 말일, weekly: 해당 주 일요일)
+    - 'monthly': end_date (항상 월 단위 추이)
+    """
+    import calendar
+    from datetime import timedelta
+
+    today = datetime.now().strftime('%Y-%m-%d')
+    if kind == 'period':
+        target_date = request.args.get('date', today)
+        _, end_date, error = _get_date_range(request.args.get('period', 'daily'), target_date)
+        if error:
+            raise ValueError(error)
+        return end_date
+
+    base = datetime.strptime(request.args.get('end_date', today)[:10], '%Y-%m-%d')
+    if kind == 'trend' and request.args.get('period', 'monthly') == 'weekly':
+        return (base + timedelta(days=6 - base.weekday())).strftime('%Y-%m-%d')
+    last_day = calendar.monthrange(base.year, base.month)[1]
+    return base.replace(day=last_day).strftime('%Y-%m-%d')
+
+
+def _cached_stats(kind='period'):
+    """통계 라우트 결과 캐시 데코레이터 (200 응답만 저장)"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if request.args.get('debug'):
+                return func(*args, **kwargs)  # 디버그(타이밍) 요청은 항상 새로 계산
+            try:
+                end_date = _stats_range_end(kind)
+            except ValueError:
+                return func(*args, **kwargs)  # 잘못된 날짜는 라우트에서 오류 처리
+
+            today = datetime.now().strftime('%Y-%m-%d')
+            key = (
+                request.path,
+                request.args.get('period', ''),
+                request.args.get('date', request.args.get('end_date', today)),
+                request.args.get('doctor', ''),  # 라우트가 받는 값 그대로 (공백만 있는 값도 다른 결과)
+                request.args.get('category', ''),
+            )
+            cached = stats_cache.get(key)
+            if cached is not None:
+                return Response(cached, mimetype='application/json')
+
+            rv = func(*args, **kwargs)
+            if isinstance(rv, Response) and rv.status_code == 200:
+                stats_cache.put(key, rv.get_data(), end_date)
+            return rv
+        return wrapper
+    return decorator
+
+
 # ============ Blueprint 레벨 CORS 처리 ============
 
 @mssql_bp.after_request
@@ -192,12 +288,53 @@ def health_check():
             mssql_ok = True
     except:
         pass
-    return jsonify({"status": "ok", "mssql_connected": mssql_ok})
+    return jsonify({
+        "status": "ok",
+        "mssql_connected": mssql_ok,
+        "mssql_pool": mssql_db.get_pool_stats(),
+        "stats_cache": stats_cache.get_stats(),
+        "stats_rollup": stats_rollup.get_stats()
+    })
+
+
+@mssql_bp.route('/metrics')
+def prometheus_metrics():
+    """Connection Pool 지표 (Prometheus text 형식)"""
+    return Response(mssql_db.get_prometheus_metrics(),
+                    mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+@mssql_bp.route('/api/stats/cache/clear', methods=['POST'])
+def clear_stats_cache():
+    """통계 결과 캐시 비우기 (관리자용, 과거 데이터 수정 후 호출)
+
+    Query params:
+    - rollup: 'true'면 월별 롤업 저장소도 비움 (다음 조회/갱신 시 재계산)
+    """
+    cleared = stats_cache.clear()
+    rollup_cleared = 0
+    if request.args.get('rollup', '').lower() in ('1', 'true', 'yes'):
+        rollup_cleared = stats_rollup.clear()
+    mssql_db.log(f"통계 캐시 초기화: {cleared}개 항목, 롤업 {rollup_cleared}건 삭제")
+    return jsonify({
+        "success": True,
+        "cleared": cleared,
+        "rollup_cleared": rollup_cleared,
+        "stats_cache": stats_cache.get_stats()
+    })
+
+
+@mssql_bp.route('/api/stats/rollup/refresh', methods=['POST'])
+def refresh_stats_rollup():
+    """월별 롤업 즉시 갱신 (빠진 마감 월 계산)"""
+    saved = stats_rollup.refresh_now()
+    return jsonify({"success": True, "saved": saved, "rollup": stats_rollup.get_stats()})
 
 
 @mssql_bp.route('/api/patients/search')
 def search_patients():
     """환자 검색"""
+    conn = None
     try:
         q = request.args.get('q', '')
         limit = int(request.args.get('limit', 50))
@@ -238,7 +375,6 @@ def search_patients():
         """, (limit, f'%{q}%', f'%{q}%', f'%{q}%'))
 
         rows = cursor.fetchall()
-        conn.close()
 
         patients = []
         for p in rows:
@@ -254,11 +390,15 @@ def search_patients():
         return jsonify(patients)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 @mssql_bp.route('/api/patients/<int:patient_id>')
 def get_patient(patient_id):
     """환자 상세 조회"""
+    conn = None
     try:
         conn = mssql_db.get_connection()
         if not conn:
@@ -299,7 +439,6 @@ def get_patient(patient_id):
         """, (patient_id,))
 
         row = cursor.fetchone()
-        conn.close()
 
         if not row:
             return jsonify({"error": "환자를 찾을 수 없습니다."}), 404
@@ -314,11 +453,15 @@ def get_patient(patient_id):
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 @mssql_bp.route('/api/patients/chart/<chart_no>')
 def get_patient_by_chart(chart_no):
     """환자 상세 조회 (차트번호)"""
+    conn = None
     try:
         conn = mssql_db.get_connection()
         if not conn:
@@ -353,7 +496,6 @@ def get_patient_by_chart(chart_no):
         """, (chart_no, padded_chart_no))
 
         row = cursor.fetchone()
-        conn.close()
 
         if not row:
             return jsonify({"error": "환자를 찾을 수 없습니다."}), 404
@@ -368,6 +510,9 @@ def get_patient_by_chart(chart_no):
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 @mssql_bp.route('/api/patients/by-ids', methods=['GET', 'POST', 'OPTIONS'])
@@ -376,6 +521,7 @@ def get_patients_by_ids():
     if request.method == 'OPTIONS':
         return cors_preflight_response()
 
+    conn = None
     try:
         conn = mssql_db.get_connection()
         if not conn:
@@ -413,7 +559,6 @@ def get_patients_by_ids():
         """, tuple(patient_ids))
 
         rows = cursor.fetchall()
-        conn.close()
 
         patients = []
         for row in rows:
@@ -428,11 +573,15 @@ def get_patients_by_ids():
         return json_response({"patients": patients})
     except Exception as e:
         return json_response({"error": str(e)}, 500)
+    finally:
+        if conn:
+            conn.close()
 
 
 @mssql_bp.route('/api/today/registrations')
 def today_registrations():
     """오늘 접수 환자 목록"""
+    conn = None
     try:
         conn = mssql_db.get_connection()
         if not conn:
@@ -458,21 +607,24 @@ def today_registrations():
               c.TreatCurrent as treat_type
             FROM Detail d
             JOIN Customer c ON d.Customer_PK = c.Customer_PK
-            WHERE CAST(d.TxDate AS DATE) = %s
+            WHERE d.TxDate >= %s AND d.TxDate < %s
             ORDER BY d.WriteTime DESC
-        """, (today,))
+        """, _date_bounds(today))
 
         rows = cursor.fetchall()
-        conn.close()
 
         return jsonify(rows)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 @mssql_bp.route('/api/today/stats')
 def today_stats():
     """오늘 진료 통계"""
+    conn = None
     try:
         conn = mssql_db.get_connection()
         if not conn:
@@ -485,29 +637,28 @@ def today_stats():
         cursor.execute("""
             SELECT COUNT(DISTINCT Customer_PK) as count
             FROM Detail
-            WHERE CAST(TxDate AS DATE) = %s
-        """, (today,))
+            WHERE TxDate >= %s AND TxDate < %s
+        """, _date_bounds(today))
         reg_count = cursor.fetchone()['count']
 
         # 수납 건수
         cursor.execute("""
             SELECT COUNT(*) as count, SUM(General_Money + Bonin_Money) as total
             FROM Receipt
-            WHERE CAST(TxDate AS DATE) = %s
-        """, (today,))
+            WHERE TxDate >= %s AND TxDate < %s
+        """, _date_bounds(today))
         receipt = cursor.fetchone()
 
         # 의사별 진료 현황
         cursor.execute("""
             SELECT TxDoctor as doctor, COUNT(DISTINCT Customer_PK) as count
             FROM Detail
-            WHERE CAST(TxDate AS DATE) = %s AND TxDoctor IS NOT NULL AND TxDoctor != ''
+            WHERE TxDate >= %s AND TxDate < %s AND TxDoctor IS NOT NULL AND TxDoctor != ''
             GROUP BY TxDoctor
             ORDER BY count DESC
-        """, (today,))
+        """, _date_bounds(today))
         by_doctor = cursor.fetchall()
 
-        conn.close()
 
         return jsonify({
             "registrations": reg_count or 0,
@@ -517,11 +668,15 @@ def today_stats():
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 @mssql_bp.route('/api/today/receipts')
 def today_receipts():
     """오늘 수납 내역"""
+    conn = None
     try:
         conn = mssql_db.get_connection()
         if not conn:
@@ -542,21 +697,92 @@ def today_receipts():
               r.MisuMoney as unpaid,
               r.WriteTime as created_at
             FROM Receipt r
-            WHERE CAST(r.TxDate AS DATE) = %s
+            WHERE r.TxDate >= %s AND r.TxDate < %s
             ORDER BY r.WriteTime DESC
-        """, (today,))
+        """, _date_bounds(today))
 
         rows = cursor.fetchall()
-        conn.close()
 
         return jsonify(rows)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
+
+
+# SQL Server 파라미터 개수 제한(2100개)을 넘지 않도록 IN 목록을 나눠서 조회
+_IN_CLAUSE_CHUNK_SIZE = 1000
+
+# 수납/진료 내역 화면에서 쓰는 Detail 컬럼
+_RECEIPT_DETAIL_COLUMNS = """
+              Detail_PK as id,
+              TxItem as tx_item,
+              PxName as px_name,
+              DxName as dx_name,
+              TxDoctor as doctor,
+              TxMoney as amount,
+              InsuYes as is_covered,
+              추나여부상태 as choona_status,
+              IsYakChim as is_yakchim,
+              WriteTime as detail_time
+"""
+
+
+def _fetch_rows_for_patients(cursor, query, patient_ids, params=()):
+    """여러 환자에 대한 조회를 IN 목록 쿼리 한 번으로 처리
+
+    Args:
+        cursor: as_dict=True 커서
+        query: '{placeholders}' 자리에 IN 목록이 들어가는 SQL.
+               patient_id 컬럼을 반환해야 하고, IN 목록이 다른 파라미터보다 앞에 와야 함
+        patient_ids: Customer_PK 목록 (중복/None 허용)
+        params: IN 목록 뒤에 오는 파라미터
+
+    Returns:
+        dict: {Customer_PK: [row, ...]} (쿼리의 ORDER BY 순서 유지)
+    """
+    unique_ids = list(dict.fromkeys(pid for pid in patient_ids if pid is not None))
+    rows_by_patient = {pid: [] for pid in unique_ids}
+
+    for i in range(0, len(unique_ids), _IN_CLAUSE_CHUNK_SIZE):
+        chunk = unique_ids[i:i + _IN_CLAUSE_CHUNK_SIZE]
+        placeholders = ', '.join(['%s'] * len(chunk))
+        cursor.execute(query.format(placeholders=placeholders), tuple(chunk) + tuple(params))
+        for row in cursor.fetchall():
+            rows_by_patient.setdefault(row['patient_id'], []).append(row)
+
+    return rows_by_patient
+
+
+def _fetch_details_for_patients(cursor, patient_ids, target_date,
+                                columns=_RECEIPT_DETAIL_COLUMNS, order_by='WriteTime ASC'):
+    """여러 환자의 특정 날짜 진료 내역(Detail)을 한 번에 조회
+
+    Args:
+        cursor: as_dict=True 커서
+        patient_ids: Customer_PK 목록
+        target_date: 'YYYY-MM-DD'
+        columns: SELECT 컬럼 목록 (patient_id는 자동 추가)
+        order_by: 환자 내 정렬 기준
+
+    Returns:
+        dict: {Customer_PK: [detail, ...]}
+    """
+    return _fetch_rows_for_patients(cursor, f"""
+            SELECT
+              Customer_PK as patient_id,
+              {columns.strip()}
+            FROM Detail
+            WHERE Customer_PK IN ({{placeholders}}) AND TxDate >= %s AND TxDate < %s
+            ORDER BY Customer_PK, {order_by}
+        """, patient_ids, _date_bounds(target_date))
 
 
 @mssql_bp.route('/api/receipts/by-date')
 def receipts_by_date():
     """날짜별 수납/진료 내역 조회 (수납현황용)"""
+    conn = None
     try:
         conn = mssql_db.get_connection()
         if not conn:
@@ -591,38 +817,24 @@ def receipts_by_date():
             FROM Receipt r
             LEFT JOIN Customer c ON r.Customer_PK = c.Customer_PK
             LEFT JOIN Transaction_TB t ON r.Receipt_PK = t.trans_Receipt_PK
-            WHERE CAST(r.TxDate AS DATE) = %s
+            WHERE r.TxDate >= %s AND r.TxDate < %s
             GROUP BY r.Receipt_PK, r.Customer_PK, r.Customer_name, r.sn,
                      r.Bonin_Money, r.CheongGu_Money, r.General_Money, r.MisuMoney,
                      r.WriteTime, c.insu_type, c.insu_bohum_type, c.insu_boho_type,
                      c.pregmark, c.SeriousTag, c.birth
             ORDER BY r.WriteTime ASC
-        """, (target_date,))
+        """, _date_bounds(target_date))
         receipts = cursor.fetchall()
 
-        # 2. 각 환자별 진료 내역 조회 (Detail)
+        # 2. 수납 환자들의 당일 진료 내역 일괄 조회 (Detail, 환자별 N+1 쿼리 방지)
+        details_by_patient = _fetch_details_for_patients(
+            cursor, [r['patient_id'] for r in receipts], target_date
+        )
+
         result = []
         for r in receipts:
             patient_id = r['patient_id']
-
-            # 해당 환자의 당일 진료 내역
-            cursor.execute("""
-                SELECT
-                  Detail_PK as id,
-                  TxItem as tx_item,
-                  PxName as px_name,
-                  DxName as dx_name,
-                  TxDoctor as doctor,
-                  TxMoney as amount,
-                  InsuYes as is_covered,
-                  추나여부상태 as choona_status,
-                  IsYakChim as is_yakchim,
-                  WriteTime as detail_time
-                FROM Detail
-                WHERE Customer_PK = %s AND CAST(TxDate AS DATE) = %s
-                ORDER BY WriteTime ASC
-            """, (patient_id, target_date))
-            details = cursor.fetchall()
+            details = details_by_patient.get(patient_id, [])
 
             # 치료 항목 분류
             treatments = []
@@ -740,7 +952,6 @@ def receipts_by_date():
         total_transfer = sum(r['transfer'] for r in result)
         total_unpaid = sum(r['unpaid'] or 0 for r in result)
 
-        conn.close()
 
         return jsonify({
             'date': target_date,
@@ -758,11 +969,15 @@ def receipts_by_date():
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 @mssql_bp.route('/api/receipts/by-patient')
 def receipts_by_patient():
     """환자별 수납내역 조회 (patientId 또는 chartNo 기준, 페이지네이션 지원)"""
+    conn = None
     try:
         # 파라미터 파싱
         patient_id = request.args.get('patientId', type=int)
@@ -794,11 +1009,11 @@ def receipts_by_patient():
             params.append(padded_chart_no)
 
         if start_date:
-            where_conditions.append("CAST(r.TxDate AS DATE) >= %s")
-            params.append(start_date)
+            where_conditions.append("r.TxDate >= %s")
+            params.append(_date_bounds(start_date)[0])
         if end_date:
-            where_conditions.append("CAST(r.TxDate AS DATE) <= %s")
-            params.append(end_date)
+            where_conditions.append("r.TxDate < %s")
+            params.append(_date_bounds(end_date)[1])
 
         where_clause = " AND ".join(where_conditions)
 
@@ -874,9 +1089,9 @@ def receipts_by_patient():
                       IsYakChim as is_yakchim,
                       WriteTime as detail_time
                     FROM Detail
-                    WHERE Customer_PK = %s AND CAST(TxDate AS DATE) = %s
+                    WHERE Customer_PK = %s AND TxDate >= %s AND TxDate < %s
                     ORDER BY WriteTime ASC
-                """, (r['patient_id'], receipt_date_str))
+                """, (r['patient_id'], *_date_bounds(receipt_date_str)))
                 details = cursor.fetchall()
             else:
                 details = []
@@ -984,7 +1199,6 @@ def receipts_by_patient():
                 'treatments': treatments
             })
 
-        conn.close()
 
         return jsonify({
             'receipts': result,
@@ -1006,6 +1220,9 @@ def receipts_by_patient():
     except Exception as e:
         mssql_db.log(f"환자별 수납내역 조회 오류: {str(e)}")
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 @mssql_bp.route('/api/reservations', methods=['GET', 'POST'])
@@ -1022,6 +1239,7 @@ def reservations():
 
 def create_reservation():
     """예약 생성 (MSSQL Reservation_New 테이블에 INSERT)"""
+    conn = None
     try:
         try:
             data = request.get_json(force=True, silent=True) or {}
@@ -1053,7 +1271,6 @@ def create_reservation():
         patient = cursor.fetchone()
 
         if not patient:
-            conn.close()
             return jsonify({"error": "환자를 찾을 수 없습니다."}), 404
 
         # 2. 예약 INSERT (Res_Key는 IDENTITY이므로 자동 생성)
@@ -1120,17 +1337,20 @@ def create_reservation():
             WHERE Res_Key = %s
         """, (new_key,))
         created = cursor.fetchone()
-        conn.close()
 
         return jsonify(created), 201
 
     except Exception as e:
         mssql_db.log(f"예약 생성 오류: {str(e)}")
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 def get_reservations():
     """예약 조회"""
+    conn = None
     try:
         conn = mssql_db.get_connection()
         if not conn:
@@ -1174,16 +1394,19 @@ def get_reservations():
 
         cursor.execute(query, tuple(params))
         rows = cursor.fetchall()
-        conn.close()
 
         return jsonify(rows)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 @mssql_bp.route('/api/reservations/<int:reservation_id>', methods=['PATCH'])
 def update_reservation(reservation_id):
     """예약 수정"""
+    conn = None
     try:
         data = request.get_json(force=True, silent=True) or {}
         if not data:
@@ -1198,7 +1421,6 @@ def update_reservation(reservation_id):
         # 기존 예약 확인
         cursor.execute("SELECT Res_Key FROM Reservation_New WHERE Res_Key = %s", (reservation_id,))
         if not cursor.fetchone():
-            conn.close()
             return jsonify({"error": "예약을 찾을 수 없습니다."}), 404
 
         # 수정 가능한 필드 매핑
@@ -1220,7 +1442,6 @@ def update_reservation(reservation_id):
                 params.append(data[key])
 
         if not updates:
-            conn.close()
             return jsonify({"error": "수정할 필드가 없습니다."}), 400
 
         # 수정 시간 업데이트
@@ -1252,18 +1473,21 @@ def update_reservation(reservation_id):
             WHERE Res_Key = %s
         """, (reservation_id,))
         updated = cursor.fetchone()
-        conn.close()
 
         return jsonify(updated)
 
     except Exception as e:
         mssql_db.log(f"예약 수정 오류: {str(e)}")
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 @mssql_bp.route('/api/reservations/<int:reservation_id>/cancel', methods=['POST'])
 def cancel_reservation(reservation_id):
     """예약 취소"""
+    conn = None
     try:
         conn = mssql_db.get_connection()
         if not conn:
@@ -1274,7 +1498,6 @@ def cancel_reservation(reservation_id):
         # 기존 예약 확인
         cursor.execute("SELECT Res_Key FROM Reservation_New WHERE Res_Key = %s", (reservation_id,))
         if not cursor.fetchone():
-            conn.close()
             return jsonify({"error": "예약을 찾을 수 없습니다."}), 404
 
         # 취소 처리
@@ -1284,13 +1507,15 @@ def cancel_reservation(reservation_id):
             WHERE Res_Key = %s
         """, (reservation_id,))
         conn.commit()
-        conn.close()
 
         return jsonify({"success": True})
 
     except Exception as e:
         mssql_db.log(f"예약 취소 오류: {str(e)}")
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 @mssql_bp.route('/api/reservations/on-site-count')
@@ -1299,6 +1524,7 @@ def on_site_reservation_count():
     - 침치료 환자 = 자보환자 + 청구금이 0원이 아닌 건보환자 (Receipt 테이블 기준)
     - Receipt + Detail JOIN으로 담당의사 매핑
     """
+    conn = None
     try:
         target_date = request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
         conn = mssql_db.get_connection()
@@ -1309,28 +1535,29 @@ def on_site_reservation_count():
 
         # 1. Receipt 테이블에서 침치료 환자 조회
         # 침치료 환자 = 자보환자(TxItem에 '자동차보험' 포함) OR 청구금(CheongGu_Money)이 0원이 아닌 환자
+        day_bounds = _date_bounds(target_date)
         cursor.execute("""
             SELECT DISTINCT
                 r.Customer_PK as patient_id,
                 (SELECT TOP 1 d.TxDoctor FROM Detail d
                  WHERE d.Customer_PK = r.Customer_PK
-                   AND CAST(d.TxDate AS DATE) = %s
+                   AND d.TxDate >= %s AND d.TxDate < %s
                    AND d.TxDoctor IS NOT NULL AND d.TxDoctor != ''
                  ORDER BY d.WriteTime ASC) as doctor
             FROM Receipt r
-            WHERE CAST(r.TxDate AS DATE) = %s
+            WHERE r.TxDate >= %s AND r.TxDate < %s
               AND (
                   -- 자보환자: Detail에 '자동차보험' TxItem이 있는 경우
                   EXISTS (
                       SELECT 1 FROM Detail d2
                       WHERE d2.Customer_PK = r.Customer_PK
-                        AND CAST(d2.TxDate AS DATE) = %s
+                        AND d2.TxDate >= %s AND d2.TxDate < %s
                         AND d2.TxItem LIKE '%%자동차보험%%'
                   )
                   -- OR 청구금이 0원이 아닌 경우 (건보 침치료)
                   OR ISNULL(r.CheongGu_Money, 0) > 0
               )
-        """, (target_date, target_date, target_date))
+        """, day_bounds * 3)
         all_visited_rows = cursor.fetchall()
 
         # 환자별로 첫 번째 담당의사만 사용 (중복 제거)
@@ -1344,7 +1571,6 @@ def on_site_reservation_count():
         visited_patients = list(patient_doctor_map.keys())
 
         if not visited_patients:
-            conn.close()
             return jsonify({
                 "date": target_date,
                 "visited_count": 0,
@@ -1359,10 +1585,10 @@ def on_site_reservation_count():
         cursor.execute(f"""
             SELECT DISTINCT Res_Customer_PK as patient_id
             FROM Reservation_New
-            WHERE CAST(Res_updatetime AS DATE) = %s
+            WHERE Res_updatetime >= %s AND Res_updatetime < %s
               AND Res_Date > %s
               AND Res_Customer_PK IN ({placeholders})
-        """, (target_date, target_date, *visited_patients))
+        """, (*day_bounds, target_date, *visited_patients))
 
         on_site_patients = set([row['patient_id'] for row in cursor.fetchall()])
 
@@ -1383,7 +1609,6 @@ def on_site_reservation_count():
                 'on_site_count': len(data['on_site'])
             }
 
-        conn.close()
 
         return jsonify({
             "date": target_date,
@@ -1396,11 +1621,15 @@ def on_site_reservation_count():
     except Exception as e:
         mssql_db.log(f"현장예약 카운트 오류: {str(e)}")
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 @mssql_bp.route('/api/patients/daily-visits')
 def daily_visits():
     """특정 날짜에 내원한 침환자(약환자 제외) 상세 목록"""
+    conn = None
     try:
         target_date = request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
         conn = mssql_db.get_connection()
@@ -1418,50 +1647,50 @@ def daily_visits():
                 d.TxDoctor as doctor
             FROM Detail d
             JOIN Customer c ON d.Customer_PK = c.Customer_PK
-            WHERE CAST(d.TxDate AS DATE) = %s
+            WHERE d.TxDate >= %s AND d.TxDate < %s
               AND d.TxDoctor IS NOT NULL
               AND d.TxDoctor != ''
               AND NOT EXISTS (
                   SELECT 1 FROM Detail d2
                   WHERE d2.Customer_PK = d.Customer_PK
-                    AND CAST(d2.TxDate AS DATE) = %s
+                    AND d2.TxDate >= %s AND d2.TxDate < %s
                     AND (d2.TxItem LIKE '%%한약%%' OR d2.TxItem LIKE '%%탕%%' OR d2.TxItem LIKE '%%환%%')
               )
             ORDER BY c.name
-        """, (target_date, target_date))
+        """, _date_bounds(target_date) * 2)
         patients = cursor.fetchall()
 
+        # 2. 진료/수납/현장예약 내역 일괄 조회 (환자 수와 무관하게 쿼리 3개)
+        patient_ids = [p['patient_id'] for p in patients]
+
+        details_by_patient = _fetch_details_for_patients(
+            cursor, patient_ids, target_date,
+            columns="TxItem, TxQty, TxDoctor, TxPrice",
+            order_by="Detail_PK"
+        )
+
+        receipts_by_patient = _fetch_rows_for_patients(cursor, """
+            SELECT Customer_PK as patient_id, PayType, PayMoney, PayMemo
+            FROM Receipt
+            WHERE Customer_PK IN ({placeholders}) AND PayDate >= %s AND PayDate < %s
+        """, patient_ids, _date_bounds(target_date))
+
+        # 다음 예약이 있는지 확인 (현장예약)
+        reservations_by_patient = _fetch_rows_for_patients(cursor, """
+            SELECT Res_Customer_PK as patient_id, Res_Date, Res_Time_0, Res_DoctorName
+            FROM Reservation_New
+            WHERE Res_Customer_PK IN ({placeholders})
+              AND Res_updatetime >= %s AND Res_updatetime < %s
+              AND Res_Date > %s
+              AND Res_Canceled = 0
+        """, patient_ids, (*_date_bounds(target_date), target_date))
+
         result = []
         for patient in patients:
             patient_id = patient['patient_id']
-
-            # 진료내역
-            cursor.execute("""
-                SELECT TxItem, TxQty, TxDoctor, TxPrice
-                FROM Detail
-                WHERE Customer_PK = %s AND CAST(TxDate AS DATE) = %s
-                ORDER BY Detail_PK
-            """, (patient_id, target_date))
-            details = cursor.fetchall()
-
-            # 수납내역
-            cursor.execute("""
-                SELECT PayType, PayMoney, PayMemo
-                FROM Receipt
-                WHERE Customer_PK = %s AND CAST(PayDate AS DATE) = %s
-            """, (patient_id, target_date))
-            receipts = cursor.fetchall()
-
-            # 다음 예약이 있는지 확인 (현장예약)
-            cursor.execute("""
-                SELECT Res_Date, Res_Time_0, Res_DoctorName
-                FROM Reservation_New
-                WHERE Res_Customer_PK = %s
-                  AND CAST(Res_updatetime AS DATE) = %s
-                  AND Res_Date > %s
-                  AND Res_Canceled = 0
-            """, (patient_id, target_date, target_date))
-            next_reservations = cursor.fetchall()
+            details = details_by_patient.get(patient_id, [])
+            receipts = receipts_by_patient.get(patient_id, [])
+            next_reservations = reservations_by_patient.get(patient_id, [])
 
             result.append({
                 'patient_id': patient_id,
@@ -1474,7 +1703,6 @@ def daily_visits():
                 'has_next_reservation': len(next_reservations) > 0
             })
 
-        conn.close()
 
         return jsonify({
             "date": target_date,
@@ -1485,11 +1713,15 @@ def daily_visits():
     except Exception as e:
         mssql_db.log(f"일일 내원환자 조회 오류: {str(e)}")
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 @mssql_bp.route('/api/doctors')
 def doctors():
     """의사 목록 조회"""
+    conn = None
     try:
         conn = mssql_db.get_connection()
         if not conn:
@@ -1508,7 +1740,6 @@ def doctors():
         """)
 
         rows = cursor.fetchall()
-        conn.close()
 
         colors = ['#3b82f6', '#10b981', '#f59e0b', '#ef4444', '#8b5cf6']
         doctors = []
@@ -1526,11 +1757,15 @@ def doctors():
         return jsonify(doctors)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 @mssql_bp.route('/api/patients/<int:patient_id>/treatments')
 def patient_treatments(patient_id):
     """환자별 진료 내역"""
+    conn = None
     try:
         conn = mssql_db.get_connection()
         if not conn:
@@ -1556,7 +1791,6 @@ def patient_treatments(patient_id):
         """, (limit, patient_id))
 
         rows = cursor.fetchall()
-        conn.close()
 
         treatments = []
         for t in rows:
@@ -1568,11 +1802,15 @@ def patient_treatments(patient_id):
         return jsonify(treatments)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 @mssql_bp.route('/api/patients/<int:patient_id>/detail-comments')
 def patient_detail_comments(patient_id):
     """환자별 날짜별 진료메모 조회 (DetailComment + Detail 조인으로 담당의 포함)"""
+    conn = None
     try:
         conn = mssql_db.get_connection()
         if not conn:
@@ -1582,7 +1820,7 @@ def patient_detail_comments(patient_id):
 
         cursor = conn.cursor(as_dict=True)
         # DetailComment에서 Comment1, Comment2 가져오고, Detail에서 담당의(TxDoctor) 조인
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT TOP %s
               dc.Customer_PK as patient_id,
               dc.TxDate as date,
@@ -1591,7 +1829,7 @@ def patient_detail_comments(patient_id):
               (SELECT TOP 1 d.TxDoctor
                FROM MasterDB.dbo.Detail d
                WHERE d.Customer_PK = dc.Customer_PK
-                 AND CAST(d.TxDate as DATE) = CAST(dc.TxDate as DATE)
+                 AND {_same_day_sql('d.TxDate', 'CAST(dc.TxDate AS DATE)')}
                ORDER BY d.Detail_PK) as doctor
             FROM MasterDB.dbo.DetailComment dc
             WHERE dc.Customer_PK = %s
@@ -1599,7 +1837,6 @@ def patient_detail_comments(patient_id):
         """, (limit, patient_id))
 
         rows = cursor.fetchall()
-        conn.close()
 
         comments = []
         for r in rows:
@@ -1614,11 +1851,15 @@ def patient_detail_comments(patient_id):
         return jsonify(comments)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 @mssql_bp.route('/api/queue/status')
 def queue_status():
     """대기/치료 현황"""
+    conn = None
     try:
         conn = mssql_db.get_connection()
         if not conn:
@@ -1681,7 +1922,6 @@ def queue_status():
         """)
         beds = cursor.fetchall()
 
-        conn.close()
 
         # 데이터 변환
         for w in waiting:
@@ -1712,6 +1952,9 @@ def queue_status():
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 @mssql_bp.route('/api/today/pending-payments')
@@ -1721,11 +1964,13 @@ def today_pending_payments():
     - 치료 항목 (침, 추나, 약침, 비급여)
     - 종별 (건보/차상위/1종,2종/자보/일반/임산부/산정특례)
     """
+    conn = None
     try:
         conn = mssql_db.get_connection()
         if not conn:
             return jsonify({"error": "MSSQL 연결 실패"}), 500
 
+        today = datetime.now().strftime('%Y-%m-%d')
         cursor = conn.cursor(as_dict=True)
 
         # 1. 수납대기 환자 조회 (Receipt + Treating JOIN)
@@ -1749,18 +1994,15 @@ def today_pending_payments():
             FROM Receipt r
             INNER JOIN TreatCurrent.dbo.Treating t ON r.Customer_PK = t.Customer_PK
             LEFT JOIN Customer c ON r.Customer_PK = c.Customer_PK
-            WHERE CAST(r.TxDate AS DATE) = CAST(GETDATE() AS DATE)
+            WHERE r.TxDate >= %s AND r.TxDate < %s
             ORDER BY t.IntoTime ASC
-        """)
+        """, _date_bounds(today))
         pending = cursor.fetchall()
 
-        result = []
-        for p in pending:
-            patient_id = p['patient_id']
-
-            # 2. 각 환자의 치료 항목 조회
-            cursor.execute("""
-                SELECT
+        # 2. 수납대기 환자들의 치료 항목 일괄 조회
+        details_by_patient = _fetch_details_for_patients(
+            cursor, [p['patient_id'] for p in pending], today,
+            columns="""
                   Detail_PK as id,
                   TxItem,
                   PxName,
@@ -1768,10 +2010,13 @@ def today_pending_payments():
                   추나여부상태 as choona_status,
                   IsYakChim as is_yakchim,
                   TxMoney
-                FROM Detail
-                WHERE Customer_PK = %s AND CAST(TxDate AS DATE) = CAST(GETDATE() AS DATE)
-            """, (patient_id,))
-            details = cursor.fetchall()
+            """,
+            order_by="Detail_PK"
+        )
+
+        result = []
+        for p in pending:
+            details = details_by_patient.get(p['patient_id'], [])
 
             # 치료 항목 분류
             has_acupuncture = False  # 침
@@ -1843,10 +2088,12 @@ def today_pending_payments():
                 'insurance_type': insurance_type
             })
 
-        conn.close()
         return jsonify(result)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 def _classify_insurance_type(insu_type, insu_bohum_type, insu_boho_type, pregmark, serious_tag, is_jabo):
@@ -1897,6 +2144,7 @@ def _classify_insurance_type(insu_type, insu_bohum_type, insu_boho_type, pregmar
 @mssql_bp.route('/api/doctors')
 def get_doctors():
     """의료진 목록 조회 (UserInfo.dbo.UserTable에서)"""
+    conn = None
     try:
         conn = mssql_db.get_connection()
         if not conn:
@@ -1932,7 +2180,6 @@ def get_doctors():
         """)
         status_info = {row['userpk']: row for row in cursor.fetchall()}
 
-        conn.close()
 
         result = []
         for doc in doctors:
@@ -1979,11 +2226,15 @@ def get_doctors():
         return jsonify(result)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 @mssql_bp.route('/api/doctors/schedule')
 def get_doctors_schedule():
     """의료진 근무일정 조회 (년/월 단위)"""
+    conn = None
     try:
         year = int(request.args.get('year', datetime.now().year))
         month = int(request.args.get('month', datetime.now().month))
@@ -2006,7 +2257,6 @@ def get_doctors_schedule():
         """, (year, month))
 
         schedules = cursor.fetchall()
-        conn.close()
 
         result = []
         for sch in schedules:
@@ -2033,11 +2283,15 @@ def get_doctors_schedule():
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 @mssql_bp.route('/api/doctors/today')
 def get_doctors_today():
     """오늘 근무 의료진 목록"""
+    conn = None
     try:
         today = datetime.now()
         year = today.year
@@ -2061,7 +2315,6 @@ def get_doctors_today():
         """, (year, month))
 
         schedules = cursor.fetchall()
-        conn.close()
 
         working_today = []
         for sch in schedules:
@@ -2090,9 +2343,13 @@ def get_doctors_today():
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 @mssql_bp.route('/api/statistics')
+@_cached_stats()
 def get_statistics():
     """통계 대시보드 API
 
@@ -2106,6 +2363,7 @@ def get_statistics():
     - reservations: 예약 현황 (예약율, 현장예약율)
     - revenue: 매출 현황 (급여/자보/비급여)
     """
+    conn = None
     try:
         period = request.args.get('period', 'daily')  # daily, weekly, monthly
         target_date = request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
@@ -2148,86 +2406,86 @@ def get_statistics():
 
         # === 1. 환자 현황 ===
         # 1-1. 침초진 (신규등록 + 건보청구 > 0 + NOT 자보)
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT COUNT(DISTINCT c.Customer_PK) as cnt
             FROM Customer c
             JOIN Receipt r ON c.Customer_PK = r.Customer_PK
-            WHERE CAST(c.reg_date AS DATE) BETWEEN '{start_date}' AND '{end_date}'
-              AND CAST(r.TxDate AS DATE) = CAST(c.reg_date AS DATE)
+            WHERE {_date_range_sql('c.reg_date')}
+              AND {_same_day_sql('r.TxDate', 'CAST(c.reg_date AS DATE)')}
               AND ISNULL(r.CheongGu_Money, 0) > 0
               AND NOT EXISTS (
                 SELECT 1 FROM Detail d
                 WHERE d.Customer_PK = c.Customer_PK
-                AND CAST(d.TxDate AS DATE) = CAST(c.reg_date AS DATE)
+                AND {_same_day_sql('d.TxDate', 'CAST(c.reg_date AS DATE)')}
                 AND d.TxItem LIKE '%자동차보험%'
               )
-        """)
+        """, {'start_date': start_date, 'end_date': end_date})
         chim_chojin = cursor.fetchone()['cnt']
 
         # 1-2. 자보초진 (신규등록 + 자보환자)
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT COUNT(DISTINCT c.Customer_PK) as cnt
             FROM Customer c
             JOIN Detail d ON c.Customer_PK = d.Customer_PK
-            WHERE CAST(c.reg_date AS DATE) BETWEEN '{start_date}' AND '{end_date}'
-              AND CAST(d.TxDate AS DATE) = CAST(c.reg_date AS DATE)
+            WHERE {_date_range_sql('c.reg_date')}
+              AND {_same_day_sql('d.TxDate', 'CAST(c.reg_date AS DATE)')}
               AND d.TxItem LIKE '%자동차보험%'
-        """)
+        """, {'start_date': start_date, 'end_date': end_date})
         jabo_chojin = cursor.fetchone()['cnt']
 
         # 1-3. 약초진 (신규등록 + 청구금0 + 비급여 > 0)
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT COUNT(DISTINCT c.Customer_PK) as cnt
             FROM Customer c
             JOIN Receipt r ON c.Customer_PK = r.Customer_PK
-            WHERE CAST(c.reg_date AS DATE) BETWEEN '{start_date}' AND '{end_date}'
-              AND CAST(r.TxDate AS DATE) = CAST(c.reg_date AS DATE)
+            WHERE {_date_range_sql('c.reg_date')}
+              AND {_same_day_sql('r.TxDate', 'CAST(c.reg_date AS DATE)')}
               AND ISNULL(r.CheongGu_Money, 0) = 0
               AND ISNULL(r.General_Money, 0) > 0
               AND NOT EXISTS (
                 SELECT 1 FROM Detail d
                 WHERE d.Customer_PK = c.Customer_PK
-                AND CAST(d.TxDate AS DATE) = CAST(c.reg_date AS DATE)
+                AND {_same_day_sql('d.TxDate', 'CAST(c.reg_date AS DATE)')}
                 AND d.TxItem LIKE '%자동차보험%'
               )
-        """)
+        """, {'start_date': start_date, 'end_date': end_date})
         yak_chojin = cursor.fetchone()['cnt']
 
         # 1-4. 침환자 재초진 (기존환자 + 진찰료(초진) + NOT 자보)
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT COUNT(DISTINCT d.Customer_PK) as cnt
             FROM Detail d
             JOIN Customer c ON d.Customer_PK = c.Customer_PK
             JOIN Receipt r ON d.Customer_PK = r.Customer_PK AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE)
-            WHERE CAST(d.TxDate AS DATE) BETWEEN '{start_date}' AND '{end_date}'
-              AND CAST(c.reg_date AS DATE) < CAST(d.TxDate AS DATE)
+            WHERE {_date_range_sql('d.TxDate')}
+              AND c.reg_date < CAST(d.TxDate AS DATE)
               AND d.PxName = N'진찰료(초진)'
               AND ISNULL(r.CheongGu_Money, 0) > 0
               AND NOT EXISTS (
                 SELECT 1 FROM Detail d2
                 WHERE d2.Customer_PK = d.Customer_PK
-                AND CAST(d2.TxDate AS DATE) = CAST(d.TxDate AS DATE)
+                AND {_same_day_sql('d2.TxDate', 'CAST(d.TxDate AS DATE)')}
                 AND d2.TxItem LIKE '%자동차보험%'
               )
-        """)
+        """, {'start_date': start_date, 'end_date': end_date})
         chim_rechojin = cursor.fetchone()['cnt']
 
         # 1-5. 자보 재초진 (기존환자 + 새 사고번호)
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             WITH PeriodJabo AS (
                 SELECT DISTINCT d.Customer_PK, d.사고번호
                 FROM Detail d
                 JOIN Customer c ON d.Customer_PK = c.Customer_PK
                 WHERE d.TxItem LIKE '%자동차보험%'
-                  AND CAST(d.TxDate AS DATE) BETWEEN '{start_date}' AND '{end_date}'
-                  AND CAST(c.reg_date AS DATE) < '{start_date}'
+                  AND {_date_range_sql('d.TxDate')}
+                  AND c.reg_date < %(start_date)s
                   AND d.사고번호 IS NOT NULL AND d.사고번호 != ''
             ),
             PreviousAccidents AS (
                 SELECT DISTINCT d.Customer_PK, d.사고번호
                 FROM Detail d
                 WHERE d.TxItem LIKE '%자동차보험%'
-                  AND CAST(d.TxDate AS DATE) < '{start_date}'
+                  AND d.TxDate < %(start_date)s
                   AND d.사고번호 IS NOT NULL AND d.사고번호 != ''
             )
             SELECT COUNT(DISTINCT pj.Customer_PK) as cnt
@@ -2236,146 +2494,146 @@ def get_statistics():
                 SELECT 1 FROM PreviousAccidents pa
                 WHERE pa.Customer_PK = pj.Customer_PK AND pa.사고번호 = pj.사고번호
             )
-        """)
+        """, {'start_date': start_date, 'end_date': end_date})
         jabo_rechojin = cursor.fetchone()['cnt']
 
         # 1-6. 약환자 재초진 (기존환자 + 3개월 공백 후 비급여)
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT COUNT(DISTINCT r.Customer_PK) as cnt
             FROM Receipt r
             JOIN Customer c ON r.Customer_PK = c.Customer_PK
-            WHERE CAST(r.TxDate AS DATE) BETWEEN '{start_date}' AND '{end_date}'
-              AND CAST(c.reg_date AS DATE) < '{start_date}'
+            WHERE {_date_range_sql('r.TxDate')}
+              AND c.reg_date < %(start_date)s
               AND ISNULL(r.CheongGu_Money, 0) = 0
               AND ISNULL(r.General_Money, 0) > 0
               AND NOT EXISTS (
                 SELECT 1 FROM Detail d
                 WHERE d.Customer_PK = r.Customer_PK
-                AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE)
+                AND {_same_day_sql('d.TxDate', 'CAST(r.TxDate AS DATE)')}
                 AND d.TxItem LIKE '%자동차보험%'
               )
               AND NOT EXISTS (
                 SELECT 1 FROM Receipt r2
                 WHERE r2.Customer_PK = r.Customer_PK
-                AND CAST(r2.TxDate AS DATE) < CAST(r.TxDate AS DATE)
-                AND CAST(r2.TxDate AS DATE) >= DATEADD(MONTH, -3, CAST(r.TxDate AS DATE))
+                AND r2.TxDate < CAST(r.TxDate AS DATE)
+                AND r2.TxDate >= DATEADD(MONTH, -3, CAST(r.TxDate AS DATE))
               )
-        """)
+        """, {'start_date': start_date, 'end_date': end_date})
         yak_rechojin = cursor.fetchone()['cnt']
 
         # 1-7. 평균 침환자수 (기간 내 일평균)
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT COUNT(DISTINCT CONCAT(r.Customer_PK, '_', CAST(r.TxDate AS DATE))) as total_visits
             FROM Receipt r
-            WHERE CAST(r.TxDate AS DATE) BETWEEN '{start_date}' AND '{end_date}'
+            WHERE {_date_range_sql('r.TxDate')}
               AND (
                 ISNULL(r.CheongGu_Money, 0) > 0
                 OR EXISTS (
                   SELECT 1 FROM Detail d
                   WHERE d.Customer_PK = r.Customer_PK
-                  AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE)
+                  AND {_same_day_sql('d.TxDate', 'CAST(r.TxDate AS DATE)')}
                   AND d.TxItem LIKE '%자동차보험%'
                 )
               )
-        """)
+        """, {'start_date': start_date, 'end_date': end_date})
         total_chim_visits = cursor.fetchone()['total_visits']
 
         # 기간 내 영업일 수 계산
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT COUNT(DISTINCT CAST(TxDate AS DATE)) as work_days
             FROM Receipt
-            WHERE CAST(TxDate AS DATE) BETWEEN '{start_date}' AND '{end_date}'
-        """)
+            WHERE {_date_range_sql('TxDate')}
+        """, {'start_date': start_date, 'end_date': end_date})
         work_days = cursor.fetchone()['work_days'] or 1
         avg_chim_patients = round(total_chim_visits / work_days, 1)
 
         # === 2. 추나 현황 ===
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT
                 SUM(CASE WHEN d.InsuYes = 1 AND d.PxName LIKE '%단순추나%' THEN 1 ELSE 0 END) as simple_chuna,
                 SUM(CASE WHEN d.InsuYes = 1 AND d.PxName LIKE '%복잡추나%' THEN 1 ELSE 0 END) as complex_chuna,
                 SUM(CASE WHEN d.TxItem LIKE '%자동차보험%' AND d.PxName LIKE '%추나%' THEN 1 ELSE 0 END) as jabo_chuna,
                 SUM(CASE WHEN d.InsuYes = 0 AND d.PxName LIKE '%추나%' AND d.TxItem NOT LIKE '%자동차보험%' THEN 1 ELSE 0 END) as uncovered_chuna
             FROM Detail d
-            WHERE CAST(d.TxDate AS DATE) BETWEEN '{start_date}' AND '{end_date}'
+            WHERE {_date_range_sql('d.TxDate')}
               AND d.PxName LIKE '%추나%'
-        """)
+        """, {'start_date': start_date, 'end_date': end_date})
         chuna = cursor.fetchone()
 
         # === 3. 예약 현황 ===
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT COUNT(DISTINCT r.Customer_PK) as total_chim
             FROM Receipt r
-            WHERE CAST(r.TxDate AS DATE) BETWEEN '{start_date}' AND '{end_date}'
+            WHERE {_date_range_sql('r.TxDate')}
               AND (
                 ISNULL(r.CheongGu_Money, 0) > 0
                 OR EXISTS (
                   SELECT 1 FROM Detail d
                   WHERE d.Customer_PK = r.Customer_PK
-                  AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE)
+                  AND {_same_day_sql('d.TxDate', 'CAST(r.TxDate AS DATE)')}
                   AND d.TxItem LIKE '%자동차보험%'
                 )
               )
-        """)
+        """, {'start_date': start_date, 'end_date': end_date})
         total_chim = cursor.fetchone()['total_chim']
 
         # 예약하고 온 환자 (치료일에 해당 날짜 예약이 있었던 경우)
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT COUNT(DISTINCT r.Customer_PK) as reserved_count
             FROM Receipt r
-            WHERE CAST(r.TxDate AS DATE) BETWEEN '{start_date}' AND '{end_date}'
+            WHERE {_date_range_sql('r.TxDate')}
               AND (
                 ISNULL(r.CheongGu_Money, 0) > 0
                 OR EXISTS (
                   SELECT 1 FROM Detail d
                   WHERE d.Customer_PK = r.Customer_PK
-                  AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE)
+                  AND {_same_day_sql('d.TxDate', 'CAST(r.TxDate AS DATE)')}
                   AND d.TxItem LIKE '%자동차보험%'
                 )
               )
               AND EXISTS (
                 SELECT 1 FROM Reservation_New res
                 WHERE res.Customer_PK = r.Customer_PK
-                AND CAST(res.Res_Date AS DATE) = CAST(r.TxDate AS DATE)
+                AND {_same_day_sql('res.Res_Date', 'CAST(r.TxDate AS DATE)')}
               )
-        """)
+        """, {'start_date': start_date, 'end_date': end_date})
         reserved_count = cursor.fetchone()['reserved_count']
 
         # 현장예약 (치료받은 날 미래 예약 생성)
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT COUNT(DISTINCT r.Customer_PK) as onsite_count
             FROM Receipt r
-            WHERE CAST(r.TxDate AS DATE) BETWEEN '{start_date}' AND '{end_date}'
+            WHERE {_date_range_sql('r.TxDate')}
               AND (
                 ISNULL(r.CheongGu_Money, 0) > 0
                 OR EXISTS (
                   SELECT 1 FROM Detail d
                   WHERE d.Customer_PK = r.Customer_PK
-                  AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE)
+                  AND {_same_day_sql('d.TxDate', 'CAST(r.TxDate AS DATE)')}
                   AND d.TxItem LIKE '%자동차보험%'
                 )
               )
               AND EXISTS (
                 SELECT 1 FROM Reservation_New res
                 WHERE res.Customer_PK = r.Customer_PK
-                AND CAST(res.Res_Date AS DATE) > CAST(r.TxDate AS DATE)
-                AND CAST(res.Res_updatetime AS DATE) = CAST(r.TxDate AS DATE)
+                AND res.Res_Date >= DATEADD(DAY, 1, CAST(r.TxDate AS DATE))
+                AND {_same_day_sql('res.Res_updatetime', 'CAST(r.TxDate AS DATE)')}
               )
-        """)
+        """, {'start_date': start_date, 'end_date': end_date})
         onsite_count = cursor.fetchone()['onsite_count']
 
         reservation_rate = round(reserved_count / total_chim * 100, 1) if total_chim > 0 else 0
         onsite_rate = round(onsite_count / total_chim * 100, 1) if total_chim > 0 else 0
 
         # === 4. 매출 현황 ===
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             WITH JaboReceipts AS (
                 SELECT DISTINCT r.Receipt_PK
                 FROM Receipt r
                 WHERE EXISTS (
                     SELECT 1 FROM Detail d
                     WHERE d.Customer_PK = r.Customer_PK
-                    AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE)
+                    AND {_same_day_sql('d.TxDate', 'CAST(r.TxDate AS DATE)')}
                     AND d.TxItem LIKE '%자동차보험%'
                 )
             )
@@ -2385,11 +2643,10 @@ def get_statistics():
                 SUM(CASE WHEN jr.Receipt_PK IS NULL THEN ISNULL(r.General_Money, 0) ELSE 0 END) as uncovered_revenue
             FROM Receipt r
             LEFT JOIN JaboReceipts jr ON r.Receipt_PK = jr.Receipt_PK
-            WHERE CAST(r.TxDate AS DATE) BETWEEN '{start_date}' AND '{end_date}'
-        """)
+            WHERE {_date_range_sql('r.TxDate')}
+        """, {'start_date': start_date, 'end_date': end_date})
         revenue = cursor.fetchone()
 
-        conn.close()
 
         return jsonify({
             "period": period,
@@ -2429,9 +2686,13 @@ def get_statistics():
     except Exception as e:
         mssql_db.log(f"통계 조회 오류: {str(e)}")
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 @mssql_bp.route('/api/statistics2')
+@_cached_stats()
 def get_statistics2():
     """통계 대시보드 API v2 - 단순화된 버전
 
@@ -2442,6 +2703,7 @@ def get_statistics2():
     import re
     from datetime import timedelta
 
+    conn = None
     try:
         period = request.args.get('period', 'daily')
         target_date = request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
@@ -2481,77 +2743,77 @@ def get_statistics2():
         stats = {}
 
         # 1. 침초진
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT COUNT(DISTINCT c.Customer_PK) as cnt
             FROM Customer c
             INNER JOIN Receipt r ON c.Customer_PK = r.Customer_PK
-            WHERE CAST(c.reg_date AS DATE) BETWEEN '{start_date}' AND '{end_date}'
-              AND CAST(r.TxDate AS DATE) = CAST(c.reg_date AS DATE)
+            WHERE {_date_range_sql('c.reg_date')}
+              AND {_same_day_sql('r.TxDate', 'CAST(c.reg_date AS DATE)')}
               AND ISNULL(r.CheongGu_Money, 0) > 0
               AND NOT EXISTS (
                 SELECT 1 FROM Detail d WHERE d.Customer_PK = c.Customer_PK
-                AND CAST(d.TxDate AS DATE) = CAST(c.reg_date AS DATE)
+                AND {_same_day_sql('d.TxDate', 'CAST(c.reg_date AS DATE)')}
                 AND d.TxItem LIKE '%자동차보험%'
               )
-        """)
+        """, {'start_date': start_date, 'end_date': end_date})
         stats['chim_chojin'] = cursor.fetchone()['cnt']
 
         # 2. 자보초진
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT COUNT(DISTINCT c.Customer_PK) as cnt
             FROM Customer c
             INNER JOIN Detail d ON c.Customer_PK = d.Customer_PK
-            WHERE CAST(c.reg_date AS DATE) BETWEEN '{start_date}' AND '{end_date}'
-              AND CAST(d.TxDate AS DATE) = CAST(c.reg_date AS DATE)
+            WHERE {_date_range_sql('c.reg_date')}
+              AND {_same_day_sql('d.TxDate', 'CAST(c.reg_date AS DATE)')}
               AND d.TxItem LIKE '%자동차보험%'
-        """)
+        """, {'start_date': start_date, 'end_date': end_date})
         stats['jabo_chojin'] = cursor.fetchone()['cnt']
 
         # 3. 약초진
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT COUNT(DISTINCT c.Customer_PK) as cnt
             FROM Customer c
             INNER JOIN Receipt r ON c.Customer_PK = r.Customer_PK
-            WHERE CAST(c.reg_date AS DATE) BETWEEN '{start_date}' AND '{end_date}'
-              AND CAST(r.TxDate AS DATE) = CAST(c.reg_date AS DATE)
+            WHERE {_date_range_sql('c.reg_date')}
+              AND {_same_day_sql('r.TxDate', 'CAST(c.reg_date AS DATE)')}
               AND ISNULL(r.CheongGu_Money, 0) = 0
               AND ISNULL(r.General_Money, 0) > 0
               AND NOT EXISTS (
                 SELECT 1 FROM Detail d WHERE d.Customer_PK = c.Customer_PK
-                AND CAST(d.TxDate AS DATE) = CAST(c.reg_date AS DATE)
+                AND {_same_day_sql('d.TxDate', 'CAST(c.reg_date AS DATE)')}
                 AND d.TxItem LIKE '%자동차보험%'
               )
-        """)
+        """, {'start_date': start_date, 'end_date': end_date})
         stats['yak_chojin'] = cursor.fetchone()['cnt']
 
         # 4. 침환자 재초진
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT COUNT(DISTINCT d.Customer_PK) as cnt
             FROM Detail d
             INNER JOIN Customer c ON d.Customer_PK = c.Customer_PK
             INNER JOIN Receipt r ON d.Customer_PK = r.Customer_PK AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE)
-            WHERE CAST(d.TxDate AS DATE) BETWEEN '{start_date}' AND '{end_date}'
-              AND CAST(c.reg_date AS DATE) < CAST(d.TxDate AS DATE)
+            WHERE {_date_range_sql('d.TxDate')}
+              AND c.reg_date < CAST(d.TxDate AS DATE)
               AND d.PxName = N'진찰료(초진)'
               AND ISNULL(r.CheongGu_Money, 0) > 0
               AND NOT EXISTS (
                 SELECT 1 FROM Detail d2 WHERE d2.Customer_PK = d.Customer_PK
-                AND CAST(d2.TxDate AS DATE) = CAST(d.TxDate AS DATE)
+                AND {_same_day_sql('d2.TxDate', 'CAST(d.TxDate AS DATE)')}
                 AND d2.TxItem LIKE '%자동차보험%'
               )
-        """)
+        """, {'start_date': start_date, 'end_date': end_date})
         stats['chim_rechojin'] = cursor.fetchone()['cnt']
 
         # 5. 자보 재초진
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT COUNT(DISTINCT pj.Customer_PK) as cnt
             FROM (
                 SELECT DISTINCT d.Customer_PK, d.사고번호
                 FROM Detail d
                 INNER JOIN Customer c ON d.Customer_PK = c.Customer_PK
                 WHERE d.TxItem LIKE '%자동차보험%'
-                  AND CAST(d.TxDate AS DATE) BETWEEN '{start_date}' AND '{end_date}'
-                  AND CAST(c.reg_date AS DATE) < '{start_date}'
+                  AND {_date_range_sql('d.TxDate')}
+                  AND c.reg_date < %(start_date)s
                   AND d.사고번호 IS NOT NULL AND d.사고번호 != ''
             ) pj
             WHERE NOT EXISTS (
@@ -2559,120 +2821,119 @@ def get_statistics2():
                 WHERE d2.Customer_PK = pj.Customer_PK
                   AND d2.사고번호 = pj.사고번호
                   AND d2.TxItem LIKE '%자동차보험%'
-                  AND CAST(d2.TxDate AS DATE) < '{start_date}'
+                  AND d2.TxDate < %(start_date)s
             )
-        """)
+        """, {'start_date': start_date, 'end_date': end_date})
         stats['jabo_rechojin'] = cursor.fetchone()['cnt']
 
         # 6. 약환자 재초진
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT COUNT(DISTINCT r.Customer_PK) as cnt
             FROM Receipt r
             INNER JOIN Customer c ON r.Customer_PK = c.Customer_PK
-            WHERE CAST(r.TxDate AS DATE) BETWEEN '{start_date}' AND '{end_date}'
-              AND CAST(c.reg_date AS DATE) < '{start_date}'
+            WHERE {_date_range_sql('r.TxDate')}
+              AND c.reg_date < %(start_date)s
               AND ISNULL(r.CheongGu_Money, 0) = 0
               AND ISNULL(r.General_Money, 0) > 0
               AND NOT EXISTS (
                 SELECT 1 FROM Detail d WHERE d.Customer_PK = r.Customer_PK
-                AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE)
+                AND {_same_day_sql('d.TxDate', 'CAST(r.TxDate AS DATE)')}
                 AND d.TxItem LIKE '%자동차보험%'
               )
               AND NOT EXISTS (
                 SELECT 1 FROM Receipt r2 WHERE r2.Customer_PK = r.Customer_PK
-                AND CAST(r2.TxDate AS DATE) < CAST(r.TxDate AS DATE)
-                AND CAST(r2.TxDate AS DATE) >= DATEADD(MONTH, -3, CAST(r.TxDate AS DATE))
+                AND r2.TxDate < CAST(r.TxDate AS DATE)
+                AND r2.TxDate >= DATEADD(MONTH, -3, CAST(r.TxDate AS DATE))
               )
-        """)
+        """, {'start_date': start_date, 'end_date': end_date})
         stats['yak_rechojin'] = cursor.fetchone()['cnt']
 
         # 7. 총 침환자 방문수
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT COUNT(DISTINCT CONCAT(r.Customer_PK, '_', CAST(r.TxDate AS DATE))) as cnt
             FROM Receipt r
-            WHERE CAST(r.TxDate AS DATE) BETWEEN '{start_date}' AND '{end_date}'
+            WHERE {_date_range_sql('r.TxDate')}
               AND (ISNULL(r.CheongGu_Money, 0) > 0
                 OR EXISTS (SELECT 1 FROM Detail d WHERE d.Customer_PK = r.Customer_PK
-                  AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE) AND d.TxItem LIKE '%자동차보험%'))
-        """)
+                  AND {_same_day_sql('d.TxDate', 'CAST(r.TxDate AS DATE)')} AND d.TxItem LIKE '%자동차보험%'))
+        """, {'start_date': start_date, 'end_date': end_date})
         stats['total_visits'] = cursor.fetchone()['cnt']
 
         # 8. 영업일 수
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT COUNT(DISTINCT CAST(TxDate AS DATE)) as cnt
-            FROM Receipt WHERE CAST(TxDate AS DATE) BETWEEN '{start_date}' AND '{end_date}'
-        """)
+            FROM Receipt WHERE {_date_range_sql('TxDate')}
+        """, {'start_date': start_date, 'end_date': end_date})
         stats['work_days'] = cursor.fetchone()['cnt']
 
         # 9. 총 침환자수
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT COUNT(DISTINCT r.Customer_PK) as cnt
             FROM Receipt r
-            WHERE CAST(r.TxDate AS DATE) BETWEEN '{start_date}' AND '{end_date}'
+            WHERE {_date_range_sql('r.TxDate')}
               AND (ISNULL(r.CheongGu_Money, 0) > 0
                 OR EXISTS (SELECT 1 FROM Detail d WHERE d.Customer_PK = r.Customer_PK
-                  AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE) AND d.TxItem LIKE '%자동차보험%'))
-        """)
+                  AND {_same_day_sql('d.TxDate', 'CAST(r.TxDate AS DATE)')} AND d.TxItem LIKE '%자동차보험%'))
+        """, {'start_date': start_date, 'end_date': end_date})
         stats['total_chim'] = cursor.fetchone()['cnt']
 
         # 10. 예약하고 온 환자
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT COUNT(DISTINCT r.Customer_PK) as cnt
             FROM Receipt r
-            WHERE CAST(r.TxDate AS DATE) BETWEEN '{start_date}' AND '{end_date}'
+            WHERE {_date_range_sql('r.TxDate')}
               AND (ISNULL(r.CheongGu_Money, 0) > 0
                 OR EXISTS (SELECT 1 FROM Detail d WHERE d.Customer_PK = r.Customer_PK
-                  AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE) AND d.TxItem LIKE '%자동차보험%'))
+                  AND {_same_day_sql('d.TxDate', 'CAST(r.TxDate AS DATE)')} AND d.TxItem LIKE '%자동차보험%'))
               AND EXISTS (SELECT 1 FROM Reservation_New res WHERE res.Customer_PK = r.Customer_PK
-                AND CAST(res.Res_Date AS DATE) = CAST(r.TxDate AS DATE))
-        """)
+                AND {_same_day_sql('res.Res_Date', 'CAST(r.TxDate AS DATE)')})
+        """, {'start_date': start_date, 'end_date': end_date})
         stats['reserved_count'] = cursor.fetchone()['cnt']
 
         # 11. 현장예약
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT COUNT(DISTINCT r.Customer_PK) as cnt
             FROM Receipt r
-            WHERE CAST(r.TxDate AS DATE) BETWEEN '{start_date}' AND '{end_date}'
+            WHERE {_date_range_sql('r.TxDate')}
               AND (ISNULL(r.CheongGu_Money, 0) > 0
                 OR EXISTS (SELECT 1 FROM Detail d WHERE d.Customer_PK = r.Customer_PK
-                  AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE) AND d.TxItem LIKE '%자동차보험%'))
+                  AND {_same_day_sql('d.TxDate', 'CAST(r.TxDate AS DATE)')} AND d.TxItem LIKE '%자동차보험%'))
               AND EXISTS (SELECT 1 FROM Reservation_New res WHERE res.Customer_PK = r.Customer_PK
-                AND CAST(res.Res_Date AS DATE) > CAST(r.TxDate AS DATE)
-                AND CAST(res.Res_updatetime AS DATE) = CAST(r.TxDate AS DATE))
-        """)
+                AND res.Res_Date >= DATEADD(DAY, 1, CAST(r.TxDate AS DATE))
+                AND {_same_day_sql('res.Res_updatetime', 'CAST(r.TxDate AS DATE)')})
+        """, {'start_date': start_date, 'end_date': end_date})
         stats['onsite_count'] = cursor.fetchone()['cnt']
 
         # 추나 현황 쿼리
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT
                 SUM(CASE WHEN d.InsuYes = 1 AND d.PxName LIKE '%단순추나%' THEN 1 ELSE 0 END) as simple_chuna,
                 SUM(CASE WHEN d.InsuYes = 1 AND d.PxName LIKE '%복잡추나%' THEN 1 ELSE 0 END) as complex_chuna,
                 SUM(CASE WHEN d.TxItem LIKE '%자동차보험%' AND d.PxName LIKE '%추나%' THEN 1 ELSE 0 END) as jabo_chuna,
                 SUM(CASE WHEN d.InsuYes = 0 AND d.PxName LIKE '%추나%' AND d.TxItem NOT LIKE '%자동차보험%' THEN 1 ELSE 0 END) as uncovered_chuna
             FROM Detail d
-            WHERE CAST(d.TxDate AS DATE) BETWEEN '{start_date}' AND '{end_date}'
+            WHERE {_date_range_sql('d.TxDate')}
               AND d.PxName LIKE '%추나%'
-        """)
+        """, {'start_date': start_date, 'end_date': end_date})
         chuna = cursor.fetchone()
 
         # 매출 현황 쿼리
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT
                 SUM(CASE WHEN NOT EXISTS (SELECT 1 FROM Detail d WHERE d.Customer_PK = r.Customer_PK
-                    AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE) AND d.TxItem LIKE '%자동차보험%')
+                    AND {_same_day_sql('d.TxDate', 'CAST(r.TxDate AS DATE)')} AND d.TxItem LIKE '%자동차보험%')
                     THEN ISNULL(r.Bonin_Money, 0) + ISNULL(r.CheongGu_Money, 0) ELSE 0 END) as insurance_revenue,
                 SUM(CASE WHEN EXISTS (SELECT 1 FROM Detail d WHERE d.Customer_PK = r.Customer_PK
-                    AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE) AND d.TxItem LIKE '%자동차보험%')
+                    AND {_same_day_sql('d.TxDate', 'CAST(r.TxDate AS DATE)')} AND d.TxItem LIKE '%자동차보험%')
                     THEN ISNULL(r.Bonin_Money, 0) + ISNULL(r.CheongGu_Money, 0) + ISNULL(r.General_Money, 0) ELSE 0 END) as jabo_revenue,
                 SUM(CASE WHEN NOT EXISTS (SELECT 1 FROM Detail d WHERE d.Customer_PK = r.Customer_PK
-                    AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE) AND d.TxItem LIKE '%자동차보험%')
+                    AND {_same_day_sql('d.TxDate', 'CAST(r.TxDate AS DATE)')} AND d.TxItem LIKE '%자동차보험%')
                     THEN ISNULL(r.General_Money, 0) ELSE 0 END) as uncovered_revenue
             FROM Receipt r
-            WHERE CAST(r.TxDate AS DATE) BETWEEN '{start_date}' AND '{end_date}'
-        """)
+            WHERE {_date_range_sql('r.TxDate')}
+        """, {'start_date': start_date, 'end_date': end_date})
         revenue = cursor.fetchone()
 
-        conn.close()
 
         # 계산
         work_days = stats.get('work_days', 1) or 1
@@ -2723,13 +2984,18 @@ def get_statistics2():
     except Exception as e:
         mssql_db.log(f"통계v2 조회 오류: {str(e)}")
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 # ============ 개별 통계 API (v3) ============
 
 @mssql_bp.route('/api/stats/doctors')
+@_cached_stats()
 def stats_doctors():
     """해당 날짜에 진료한 원장 목록 API"""
+    conn = None
     try:
         target_date = request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
 
@@ -2744,22 +3010,24 @@ def stats_doctors():
         cursor = conn.cursor(as_dict=True)
 
         # Detail 테이블에서 해당 날짜에 진료한 의사 목록 (TxDoctor)
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT DISTINCT d.TxDoctor as name
             FROM Detail d
-            WHERE CAST(d.TxDate AS DATE) = '{target_date}'
+            WHERE {_date_range_sql('d.TxDate', 'target_date', 'target_date')}
               AND d.TxDoctor IS NOT NULL
               AND d.TxDoctor != ''
             ORDER BY d.TxDoctor
-        """)
+        """, {'target_date': target_date})
         doctors = [row['name'] for row in cursor.fetchall()]
-        conn.close()
 
         return jsonify({"date": target_date, "doctors": doctors})
 
     except Exception as e:
         mssql_db.log(f"원장목록 오류: {str(e)}")
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 def _get_date_range(period: str, target_date: str):
@@ -2794,8 +3062,10 @@ def _get_date_range(period: str, target_date: str):
 
 
 @mssql_bp.route('/api/stats/patients')
+@_cached_stats()
 def stats_patients():
     """환자 현황 통계 API"""
+    conn = None
     try:
         period = request.args.get('period', 'daily')
         target_date = request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
@@ -2810,8 +3080,8 @@ def stats_patients():
         if doctor and not re.match(r'^[\w가-힣\s]+$', doctor):
             return jsonify({"error": "Invalid doctor name"}), 400
 
-        doctor_filter = f"AND d.TxDoctor = N'{doctor}'" if doctor else ""
-        doctor_filter_detail = f"AND d2.TxDoctor = N'{doctor}'" if doctor else ""
+        doctor_filter = "AND d.TxDoctor = %(doctor)s" if doctor else ""
+        doctor_filter_detail = "AND d2.TxDoctor = %(doctor)s" if doctor else ""
 
         conn = mssql_db.get_connection()
         if not conn:
@@ -2819,138 +3089,124 @@ def stats_patients():
 
         cursor = conn.cursor(as_dict=True)
 
+        # 기간 내 자보 방문 (#JaboVisits)
+        mssql_db.stage_visits(cursor, start_date, end_date)
+
         # 침초진 (원장별: 해당 환자가 그날 해당 원장에게 진료받았는지)
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT COUNT(DISTINCT c.Customer_PK) as cnt
             FROM Customer c
             INNER JOIN Receipt r ON c.Customer_PK = r.Customer_PK
-            WHERE CAST(c.reg_date AS DATE) BETWEEN '{start_date}' AND '{end_date}'
-              AND CAST(r.TxDate AS DATE) = CAST(c.reg_date AS DATE)
+            WHERE {_date_range_sql('c.reg_date')}
+              AND {_same_day_sql('r.TxDate', 'CAST(c.reg_date AS DATE)')}
               AND ISNULL(r.CheongGu_Money, 0) > 0
-              AND NOT EXISTS (
-                SELECT 1 FROM Detail d WHERE d.Customer_PK = c.Customer_PK
-                AND CAST(d.TxDate AS DATE) = CAST(c.reg_date AS DATE)
-                AND d.TxItem LIKE '%자동차보험%'
-              )
-              {f"AND EXISTS (SELECT 1 FROM Detail d WHERE d.Customer_PK = c.Customer_PK AND CAST(d.TxDate AS DATE) = CAST(c.reg_date AS DATE) AND d.TxDoctor = N'{doctor}')" if doctor else ""}
-        """)
+              AND NOT {mssql_db.jabo_visit_sql('c.Customer_PK', 'c.reg_date')}
+              {f"AND EXISTS (SELECT 1 FROM Detail d WHERE d.Customer_PK = c.Customer_PK AND {_same_day_sql('d.TxDate', 'CAST(c.reg_date AS DATE)')} AND d.TxDoctor = %(doctor)s)" if doctor else ""}
+        """, {'start_date': start_date, 'end_date': end_date, 'doctor': doctor})
         chim_chojin = cursor.fetchone()['cnt']
 
         # 자보초진
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT COUNT(DISTINCT c.Customer_PK) as cnt
             FROM Customer c
             INNER JOIN Detail d ON c.Customer_PK = d.Customer_PK
-            WHERE CAST(c.reg_date AS DATE) BETWEEN '{start_date}' AND '{end_date}'
-              AND CAST(d.TxDate AS DATE) = CAST(c.reg_date AS DATE)
+            WHERE {_date_range_sql('c.reg_date')}
+              AND {_same_day_sql('d.TxDate', 'CAST(c.reg_date AS DATE)')}
               AND d.TxItem LIKE '%자동차보험%'
-              {f"AND d.TxDoctor = N'{doctor}'" if doctor else ""}
-        """)
+              {"AND d.TxDoctor = %(doctor)s" if doctor else ""}
+        """, {'start_date': start_date, 'end_date': end_date, 'doctor': doctor})
         jabo_chojin = cursor.fetchone()['cnt']
 
         # 약초진
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT COUNT(DISTINCT c.Customer_PK) as cnt
             FROM Customer c
             INNER JOIN Receipt r ON c.Customer_PK = r.Customer_PK
-            WHERE CAST(c.reg_date AS DATE) BETWEEN '{start_date}' AND '{end_date}'
-              AND CAST(r.TxDate AS DATE) = CAST(c.reg_date AS DATE)
+            WHERE {_date_range_sql('c.reg_date')}
+              AND {_same_day_sql('r.TxDate', 'CAST(c.reg_date AS DATE)')}
               AND ISNULL(r.CheongGu_Money, 0) = 0
               AND ISNULL(r.General_Money, 0) > 0
-              AND NOT EXISTS (
-                SELECT 1 FROM Detail d WHERE d.Customer_PK = c.Customer_PK
-                AND CAST(d.TxDate AS DATE) = CAST(c.reg_date AS DATE)
-                AND d.TxItem LIKE '%자동차보험%'
-              )
-              {f"AND EXISTS (SELECT 1 FROM Detail d WHERE d.Customer_PK = c.Customer_PK AND CAST(d.TxDate AS DATE) = CAST(c.reg_date AS DATE) AND d.TxDoctor = N'{doctor}')" if doctor else ""}
-        """)
+              AND NOT {mssql_db.jabo_visit_sql('c.Customer_PK', 'c.reg_date')}
+              {f"AND EXISTS (SELECT 1 FROM Detail d WHERE d.Customer_PK = c.Customer_PK AND {_same_day_sql('d.TxDate', 'CAST(c.reg_date AS DATE)')} AND d.TxDoctor = %(doctor)s)" if doctor else ""}
+        """, {'start_date': start_date, 'end_date': end_date, 'doctor': doctor})
         yak_chojin = cursor.fetchone()['cnt']
 
         # 침환자 재초진
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT COUNT(DISTINCT d.Customer_PK) as cnt
             FROM Detail d
             INNER JOIN Customer c ON d.Customer_PK = c.Customer_PK
             INNER JOIN Receipt r ON d.Customer_PK = r.Customer_PK AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE)
-            WHERE CAST(d.TxDate AS DATE) BETWEEN '{start_date}' AND '{end_date}'
-              AND CAST(c.reg_date AS DATE) < CAST(d.TxDate AS DATE)
+            WHERE {_date_range_sql('d.TxDate')}
+              AND c.reg_date < CAST(d.TxDate AS DATE)
               AND d.PxName = N'진찰료(초진)'
               AND ISNULL(r.CheongGu_Money, 0) > 0
-              AND NOT EXISTS (
-                SELECT 1 FROM Detail d2 WHERE d2.Customer_PK = d.Customer_PK
-                AND CAST(d2.TxDate AS DATE) = CAST(d.TxDate AS DATE)
-                AND d2.TxItem LIKE '%자동차보험%'
-              )
-              {f"AND d.TxDoctor = N'{doctor}'" if doctor else ""}
-        """)
+              AND NOT {mssql_db.jabo_visit_sql('d.Customer_PK', 'd.TxDate')}
+              {"AND d.TxDoctor = %(doctor)s" if doctor else ""}
+        """, {'start_date': start_date, 'end_date': end_date, 'doctor': doctor})
         chim_rechojin = cursor.fetchone()['cnt']
 
         # 자보 재초진
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT COUNT(DISTINCT pj.Customer_PK) as cnt
             FROM (
                 SELECT DISTINCT d.Customer_PK, d.사고번호
                 FROM Detail d
                 INNER JOIN Customer c ON d.Customer_PK = c.Customer_PK
                 WHERE d.TxItem LIKE '%자동차보험%'
-                  AND CAST(d.TxDate AS DATE) BETWEEN '{start_date}' AND '{end_date}'
-                  AND CAST(c.reg_date AS DATE) < '{start_date}'
+                  AND {_date_range_sql('d.TxDate')}
+                  AND c.reg_date < %(start_date)s
                   AND d.사고번호 IS NOT NULL AND d.사고번호 != ''
-                  {f"AND d.TxDoctor = N'{doctor}'" if doctor else ""}
+                  {"AND d.TxDoctor = %(doctor)s" if doctor else ""}
             ) pj
             WHERE NOT EXISTS (
                 SELECT 1 FROM Detail d2
                 WHERE d2.Customer_PK = pj.Customer_PK
                   AND d2.사고번호 = pj.사고번호
                   AND d2.TxItem LIKE '%자동차보험%'
-                  AND CAST(d2.TxDate AS DATE) < '{start_date}'
+                  AND d2.TxDate < %(start_date)s
             )
-        """)
+        """, {'start_date': start_date, 'end_date': end_date, 'doctor': doctor})
         jabo_rechojin = cursor.fetchone()['cnt']
 
         # 약환자 재초진
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT COUNT(DISTINCT r.Customer_PK) as cnt
             FROM Receipt r
             INNER JOIN Customer c ON r.Customer_PK = c.Customer_PK
-            WHERE CAST(r.TxDate AS DATE) BETWEEN '{start_date}' AND '{end_date}'
-              AND CAST(c.reg_date AS DATE) < '{start_date}'
+            WHERE {_date_range_sql('r.TxDate')}
+              AND c.reg_date < %(start_date)s
               AND ISNULL(r.CheongGu_Money, 0) = 0
               AND ISNULL(r.General_Money, 0) > 0
-              AND NOT EXISTS (
-                SELECT 1 FROM Detail d WHERE d.Customer_PK = r.Customer_PK
-                AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE)
-                AND d.TxItem LIKE '%자동차보험%'
-              )
+              AND NOT {mssql_db.jabo_visit_sql('r.Customer_PK', 'r.TxDate')}
               AND NOT EXISTS (
                 SELECT 1 FROM Receipt r2 WHERE r2.Customer_PK = r.Customer_PK
-                AND CAST(r2.TxDate AS DATE) < CAST(r.TxDate AS DATE)
-                AND CAST(r2.TxDate AS DATE) >= DATEADD(MONTH, -3, CAST(r.TxDate AS DATE))
+                AND r2.TxDate < CAST(r.TxDate AS DATE)
+                AND r2.TxDate >= DATEADD(MONTH, -3, CAST(r.TxDate AS DATE))
               )
-              {f"AND EXISTS (SELECT 1 FROM Detail d WHERE d.Customer_PK = r.Customer_PK AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE) AND d.TxDoctor = N'{doctor}')" if doctor else ""}
-        """)
+              {f"AND EXISTS (SELECT 1 FROM Detail d WHERE d.Customer_PK = r.Customer_PK AND {_same_day_sql('d.TxDate', 'CAST(r.TxDate AS DATE)')} AND d.TxDoctor = %(doctor)s)" if doctor else ""}
+        """, {'start_date': start_date, 'end_date': end_date, 'doctor': doctor})
         yak_rechojin = cursor.fetchone()['cnt']
 
         # 건보 침환자 총 방문수 (자보 제외)
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT COUNT(DISTINCT CONCAT(r.Customer_PK, '_', CAST(r.TxDate AS DATE))) as cnt
             FROM Receipt r
-            WHERE CAST(r.TxDate AS DATE) BETWEEN '{start_date}' AND '{end_date}'
+            WHERE {_date_range_sql('r.TxDate')}
               AND ISNULL(r.CheongGu_Money, 0) > 0
-              AND NOT EXISTS (SELECT 1 FROM Detail d WHERE d.Customer_PK = r.Customer_PK
-                  AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE) AND d.TxItem LIKE '%자동차보험%')
-              {f"AND EXISTS (SELECT 1 FROM Detail d WHERE d.Customer_PK = r.Customer_PK AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE) AND d.TxDoctor = N'{doctor}')" if doctor else ""}
-        """)
+              AND NOT {mssql_db.jabo_visit_sql('r.Customer_PK', 'r.TxDate')}
+              {f"AND EXISTS (SELECT 1 FROM Detail d WHERE d.Customer_PK = r.Customer_PK AND {_same_day_sql('d.TxDate', 'CAST(r.TxDate AS DATE)')} AND d.TxDoctor = %(doctor)s)" if doctor else ""}
+        """, {'start_date': start_date, 'end_date': end_date, 'doctor': doctor})
         chim_total_visits = cursor.fetchone()['cnt']
 
         # 자보 침환자 총 방문수
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT COUNT(DISTINCT CONCAT(d.Customer_PK, '_', CAST(d.TxDate AS DATE))) as cnt
             FROM Detail d
-            WHERE CAST(d.TxDate AS DATE) BETWEEN '{start_date}' AND '{end_date}'
+            WHERE {_date_range_sql('d.TxDate')}
               AND d.TxItem LIKE '%자동차보험%'
-              {f"AND d.TxDoctor = N'{doctor}'" if doctor else ""}
-        """)
+              {"AND d.TxDoctor = %(doctor)s" if doctor else ""}
+        """, {'start_date': start_date, 'end_date': end_date, 'doctor': doctor})
         jabo_total_visits = cursor.fetchone()['cnt']
 
         # 건보 재진 = 총방문 - 초진 - 재초진
@@ -2964,13 +3220,13 @@ def stats_patients():
             jabo_rejin = 0
 
         # 영업일 수
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT COUNT(DISTINCT CAST(TxDate AS DATE)) as cnt
-            FROM Receipt WHERE CAST(TxDate AS DATE) BETWEEN '{start_date}' AND '{end_date}'
-        """)
+            FROM Receipt WHERE {_date_range_sql('TxDate')}
+        """, {'start_date': start_date, 'end_date': end_date})
         work_days = cursor.fetchone()['cnt'] or 1
 
-        conn.close()
+        mssql_db.drop_staged_visits(cursor)
 
         total_visits = chim_total_visits + jabo_total_visits
         avg_chim_daily = round(total_visits / work_days, 1) if work_days > 0 else 0
@@ -2995,11 +3251,16 @@ def stats_patients():
     except Exception as e:
         mssql_db.log(f"환자통계 오류: {str(e)}")
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 @mssql_bp.route('/api/stats/chuna')
+@_cached_stats()
 def stats_chuna():
     """추나 현황 통계 API"""
+    conn = None
     try:
         period = request.args.get('period', 'daily')
         target_date = request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
@@ -3013,7 +3274,7 @@ def stats_chuna():
         if doctor and not re.match(r'^[\w가-힣\s]+$', doctor):
             return jsonify({"error": "Invalid doctor name"}), 400
 
-        doctor_filter = f"AND d.TxDoctor = N'{doctor}'" if doctor else ""
+        doctor_filter = "AND d.TxDoctor = %(doctor)s" if doctor else ""
 
         conn = mssql_db.get_connection()
         if not conn:
@@ -3021,72 +3282,55 @@ def stats_chuna():
 
         cursor = conn.cursor(as_dict=True)
 
+        # 기간 내 자보 방문 (#JaboVisits)
+        mssql_db.stage_visits(cursor, start_date, end_date)
+
         # 자보추나 카운트 (같은 환자의 같은 날에 자동차보험 항목이 있는 경우)
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT COUNT(*) as cnt
             FROM Detail d
-            WHERE CAST(d.TxDate AS DATE) BETWEEN '{start_date}' AND '{end_date}'
+            WHERE {_date_range_sql('d.TxDate')}
               AND d.PxName LIKE '%추나%'
-              AND EXISTS (
-                SELECT 1 FROM Detail d2
-                WHERE d2.Customer_PK = d.Customer_PK
-                  AND CAST(d2.TxDate AS DATE) = CAST(d.TxDate AS DATE)
-                  AND d2.TxItem LIKE '%자동차보험%'
-              )
+              AND {mssql_db.jabo_visit_sql('d.Customer_PK', 'd.TxDate')}
               {doctor_filter}
-        """)
+        """, {'start_date': start_date, 'end_date': end_date, 'doctor': doctor})
         jabo = cursor.fetchone()['cnt'] or 0
 
         # 건보 단순추나 (자보환자 제외)
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT COUNT(*) as cnt
             FROM Detail d
-            WHERE CAST(d.TxDate AS DATE) BETWEEN '{start_date}' AND '{end_date}'
+            WHERE {_date_range_sql('d.TxDate')}
               AND d.PxName LIKE '%단순추나%'
-              AND NOT EXISTS (
-                SELECT 1 FROM Detail d2
-                WHERE d2.Customer_PK = d.Customer_PK
-                  AND CAST(d2.TxDate AS DATE) = CAST(d.TxDate AS DATE)
-                  AND d2.TxItem LIKE '%자동차보험%'
-              )
+              AND NOT {mssql_db.jabo_visit_sql('d.Customer_PK', 'd.TxDate')}
               {doctor_filter}
-        """)
+        """, {'start_date': start_date, 'end_date': end_date, 'doctor': doctor})
         insurance_simple = cursor.fetchone()['cnt'] or 0
 
         # 건보 복잡추나 (자보환자 제외)
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT COUNT(*) as cnt
             FROM Detail d
-            WHERE CAST(d.TxDate AS DATE) BETWEEN '{start_date}' AND '{end_date}'
+            WHERE {_date_range_sql('d.TxDate')}
               AND d.PxName LIKE '%복잡추나%'
-              AND NOT EXISTS (
-                SELECT 1 FROM Detail d2
-                WHERE d2.Customer_PK = d.Customer_PK
-                  AND CAST(d2.TxDate AS DATE) = CAST(d.TxDate AS DATE)
-                  AND d2.TxItem LIKE '%자동차보험%'
-              )
+              AND NOT {mssql_db.jabo_visit_sql('d.Customer_PK', 'd.TxDate')}
               {doctor_filter}
-        """)
+        """, {'start_date': start_date, 'end_date': end_date, 'doctor': doctor})
         insurance_complex = cursor.fetchone()['cnt'] or 0
 
         # 비급여 추나 (자보환자 제외, 급여 아닌 것)
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT COUNT(*) as cnt
             FROM Detail d
-            WHERE CAST(d.TxDate AS DATE) BETWEEN '{start_date}' AND '{end_date}'
+            WHERE {_date_range_sql('d.TxDate')}
               AND d.PxName LIKE '%추나%'
               AND d.InsuYes = 0
-              AND NOT EXISTS (
-                SELECT 1 FROM Detail d2
-                WHERE d2.Customer_PK = d.Customer_PK
-                  AND CAST(d2.TxDate AS DATE) = CAST(d.TxDate AS DATE)
-                  AND d2.TxItem LIKE '%자동차보험%'
-              )
+              AND NOT {mssql_db.jabo_visit_sql('d.Customer_PK', 'd.TxDate')}
               {doctor_filter}
-        """)
+        """, {'start_date': start_date, 'end_date': end_date, 'doctor': doctor})
         uncovered = cursor.fetchone()['cnt'] or 0
 
-        conn.close()
+        mssql_db.drop_staged_visits(cursor)
 
         return jsonify({
             "period": period,
@@ -3102,11 +3346,16 @@ def stats_chuna():
     except Exception as e:
         mssql_db.log(f"추나통계 오류: {str(e)}")
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 @mssql_bp.route('/api/stats/reservations')
+@_cached_stats()
 def stats_reservations():
     """예약 현황 통계 API"""
+    conn = None
     try:
         period = request.args.get('period', 'daily')
         target_date = request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
@@ -3120,7 +3369,7 @@ def stats_reservations():
         if doctor and not re.match(r'^[\w가-힣\s]+$', doctor):
             return jsonify({"error": "Invalid doctor name"}), 400
 
-        doctor_exists_filter = f"AND EXISTS (SELECT 1 FROM Detail d2 WHERE d2.Customer_PK = r.Customer_PK AND CAST(d2.TxDate AS DATE) = CAST(r.TxDate AS DATE) AND d2.TxDoctor = N'{doctor}')" if doctor else ""
+        doctor_exists_filter = f"AND EXISTS (SELECT 1 FROM Detail d2 WHERE d2.Customer_PK = r.Customer_PK AND {_same_day_sql('d2.TxDate', 'CAST(r.TxDate AS DATE)')} AND d2.TxDoctor = %(doctor)s)" if doctor else ""
 
         conn = mssql_db.get_connection()
         if not conn:
@@ -3129,47 +3378,46 @@ def stats_reservations():
         cursor = conn.cursor(as_dict=True)
 
         # 총 침환자수
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT COUNT(DISTINCT r.Customer_PK) as cnt
             FROM Receipt r
-            WHERE CAST(r.TxDate AS DATE) BETWEEN '{start_date}' AND '{end_date}'
+            WHERE {_date_range_sql('r.TxDate')}
               AND (ISNULL(r.CheongGu_Money, 0) > 0
                 OR EXISTS (SELECT 1 FROM Detail d WHERE d.Customer_PK = r.Customer_PK
-                  AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE) AND d.TxItem LIKE '%자동차보험%'))
+                  AND {_same_day_sql('d.TxDate', 'CAST(r.TxDate AS DATE)')} AND d.TxItem LIKE '%자동차보험%'))
               {doctor_exists_filter}
-        """)
+        """, {'start_date': start_date, 'end_date': end_date, 'doctor': doctor})
         total_chim = cursor.fetchone()['cnt']
 
         # 예약하고 온 환자
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT COUNT(DISTINCT r.Customer_PK) as cnt
             FROM Receipt r
-            WHERE CAST(r.TxDate AS DATE) BETWEEN '{start_date}' AND '{end_date}'
+            WHERE {_date_range_sql('r.TxDate')}
               AND (ISNULL(r.CheongGu_Money, 0) > 0
                 OR EXISTS (SELECT 1 FROM Detail d WHERE d.Customer_PK = r.Customer_PK
-                  AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE) AND d.TxItem LIKE '%자동차보험%'))
+                  AND {_same_day_sql('d.TxDate', 'CAST(r.TxDate AS DATE)')} AND d.TxItem LIKE '%자동차보험%'))
               AND EXISTS (SELECT 1 FROM Reservation_New res WHERE res.Res_Customer_PK = r.Customer_PK
-                AND CAST(res.Res_Date AS DATE) = CAST(r.TxDate AS DATE))
+                AND {_same_day_sql('res.Res_Date', 'CAST(r.TxDate AS DATE)')})
               {doctor_exists_filter}
-        """)
+        """, {'start_date': start_date, 'end_date': end_date, 'doctor': doctor})
         reserved_count = cursor.fetchone()['cnt']
 
         # 현장예약
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT COUNT(DISTINCT r.Customer_PK) as cnt
             FROM Receipt r
-            WHERE CAST(r.TxDate AS DATE) BETWEEN '{start_date}' AND '{end_date}'
+            WHERE {_date_range_sql('r.TxDate')}
               AND (ISNULL(r.CheongGu_Money, 0) > 0
                 OR EXISTS (SELECT 1 FROM Detail d WHERE d.Customer_PK = r.Customer_PK
-                  AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE) AND d.TxItem LIKE '%자동차보험%'))
+                  AND {_same_day_sql('d.TxDate', 'CAST(r.TxDate AS DATE)')} AND d.TxItem LIKE '%자동차보험%'))
               AND EXISTS (SELECT 1 FROM Reservation_New res WHERE res.Res_Customer_PK = r.Customer_PK
-                AND CAST(res.Res_Date AS DATE) > CAST(r.TxDate AS DATE)
-                AND CAST(res.Res_updatetime AS DATE) = CAST(r.TxDate AS DATE))
+                AND res.Res_Date >= DATEADD(DAY, 1, CAST(r.TxDate AS DATE))
+                AND {_same_day_sql('res.Res_updatetime', 'CAST(r.TxDate AS DATE)')})
               {doctor_exists_filter}
-        """)
+        """, {'start_date': start_date, 'end_date': end_date, 'doctor': doctor})
         onsite_count = cursor.fetchone()['cnt']
 
-        conn.close()
 
         reservation_rate = round(reserved_count / total_chim * 100, 1) if total_chim > 0 else 0
         onsite_rate = round(onsite_count / total_chim * 100, 1) if total_chim > 0 else 0
@@ -3189,11 +3437,16 @@ def stats_reservations():
     except Exception as e:
         mssql_db.log(f"예약통계 오류: {str(e)}")
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 @mssql_bp.route('/api/stats/revenue')
+@_cached_stats()
 def stats_revenue():
     """매출 현황 통계 API"""
+    conn = None
     try:
         period = request.args.get('period', 'daily')
         target_date = request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
@@ -3207,7 +3460,7 @@ def stats_revenue():
         if doctor and not re.match(r'^[\w가-힣\s]+$', doctor):
             return jsonify({"error": "Invalid doctor name"}), 400
 
-        doctor_exists_filter = f"AND EXISTS (SELECT 1 FROM Detail d2 WHERE d2.Customer_PK = r.Customer_PK AND CAST(d2.TxDate AS DATE) = CAST(r.TxDate AS DATE) AND d2.TxDoctor = N'{doctor}')" if doctor else ""
+        doctor_exists_filter = f"AND EXISTS (SELECT 1 FROM Detail d2 WHERE d2.Customer_PK = r.Customer_PK AND {_same_day_sql('d2.TxDate', 'CAST(r.TxDate AS DATE)')} AND d2.TxDoctor = %(doctor)s)" if doctor else ""
 
         conn = mssql_db.get_connection()
         if not conn:
@@ -3215,53 +3468,52 @@ def stats_revenue():
 
         cursor = conn.cursor(as_dict=True)
 
+        # 기간 내 자보 방문 (#JaboVisits)
+        mssql_db.stage_visits(cursor, start_date, end_date)
+
         # 급여매출 (자보 제외)
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT ISNULL(SUM(ISNULL(r.Bonin_Money, 0) + ISNULL(r.CheongGu_Money, 0)), 0) as insurance
             FROM Receipt r
-            WHERE CAST(r.TxDate AS DATE) BETWEEN '{start_date}' AND '{end_date}'
-              AND NOT EXISTS (SELECT 1 FROM Detail d WHERE d.Customer_PK = r.Customer_PK
-                AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE) AND d.TxItem LIKE '%자동차보험%')
+            WHERE {_date_range_sql('r.TxDate')}
+              AND NOT {mssql_db.jabo_visit_sql('r.Customer_PK', 'r.TxDate')}
               {doctor_exists_filter}
-        """)
+        """, {'start_date': start_date, 'end_date': end_date, 'doctor': doctor})
         insurance = int(cursor.fetchone()['insurance'] or 0)
 
         # 건보추나 매출 (자보 제외, 추나 행의 TxMoney 합계)
-        doctor_filter_detail = f"AND d.TxDoctor = N'{doctor}'" if doctor else ""
-        cursor.execute(f"""
+        doctor_filter_detail = "AND d.TxDoctor = %(doctor)s" if doctor else ""
+        mssql_db.execute(cursor, f"""
             SELECT ISNULL(SUM(ISNULL(d.TxMoney, 0)), 0) as chuna_revenue
             FROM Detail d
-            WHERE CAST(d.TxDate AS DATE) BETWEEN '{start_date}' AND '{end_date}'
+            WHERE {_date_range_sql('d.TxDate')}
               AND d.PxName LIKE '%추나%'
-              AND NOT EXISTS (SELECT 1 FROM Detail d2 WHERE d2.Customer_PK = d.Customer_PK
-                AND CAST(d2.TxDate AS DATE) = CAST(d.TxDate AS DATE) AND d2.TxItem LIKE '%자동차보험%')
+              AND NOT {mssql_db.jabo_visit_sql('d.Customer_PK', 'd.TxDate')}
               {doctor_filter_detail}
-        """)
+        """, {'start_date': start_date, 'end_date': end_date, 'doctor': doctor})
         chuna_revenue = int(cursor.fetchone()['chuna_revenue'] or 0)
 
         # 자보매출
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT ISNULL(SUM(ISNULL(r.Bonin_Money, 0) + ISNULL(r.CheongGu_Money, 0) + ISNULL(r.General_Money, 0)), 0) as jabo
             FROM Receipt r
-            WHERE CAST(r.TxDate AS DATE) BETWEEN '{start_date}' AND '{end_date}'
-              AND EXISTS (SELECT 1 FROM Detail d WHERE d.Customer_PK = r.Customer_PK
-                AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE) AND d.TxItem LIKE '%자동차보험%')
+            WHERE {_date_range_sql('r.TxDate')}
+              AND {mssql_db.jabo_visit_sql('r.Customer_PK', 'r.TxDate')}
               {doctor_exists_filter}
-        """)
+        """, {'start_date': start_date, 'end_date': end_date, 'doctor': doctor})
         jabo = int(cursor.fetchone()['jabo'] or 0)
 
         # 비급여매출 (자보 제외)
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT ISNULL(SUM(ISNULL(r.General_Money, 0)), 0) as uncovered
             FROM Receipt r
-            WHERE CAST(r.TxDate AS DATE) BETWEEN '{start_date}' AND '{end_date}'
-              AND NOT EXISTS (SELECT 1 FROM Detail d WHERE d.Customer_PK = r.Customer_PK
-                AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE) AND d.TxItem LIKE '%자동차보험%')
+            WHERE {_date_range_sql('r.TxDate')}
+              AND NOT {mssql_db.jabo_visit_sql('r.Customer_PK', 'r.TxDate')}
               {doctor_exists_filter}
-        """)
+        """, {'start_date': start_date, 'end_date': end_date, 'doctor': doctor})
         uncovered = int(cursor.fetchone()['uncovered'] or 0)
 
-        conn.close()
+        mssql_db.drop_staged_visits(cursor)
 
         return jsonify({
             "period": period,
@@ -3278,9 +3530,390 @@ def stats_revenue():
     except Exception as e:
         mssql_db.log(f"매출통계 오류: {str(e)}")
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
+
+
+# ============ 월별 추이 롤업 ============
+# 18개월 추이 중 마감된 월은 바뀌지 않으므로 services.stats_rollup(SQLite)에 월별 집계를 저장하고
+# 저장되지 않은 월(이번 달 포함)만 MSSQL에서 계산한다.
+
+_TREND_MONTHS = 18
+_TREND_MAX_WORKERS = 3  # 추이 항목 동시 계산 연결 수 (mssql_db.POOL_SIZE보다 작게 유지)
+
+_VISIT_ROUTE_KEYWORDS = (
+    ("intro", ['소개', '소문', '내원환자', '직원']),
+    ("search", ['네이버', '지도', '인터넷', '홈페이지', '검색', '블로그']),
+    ("signboard", ['간판', '현수막', '근처']),
+)
+
+_UNCOVERED_CATEGORIES = ["맞춤한약", "녹용", "공진단", "경옥고", "상비한약", "약침", "다이어트"]
+
+_YAK_PX_CONDITION = """(
+    {a}.PxName LIKE '한약%' OR {a}.PxName LIKE '공진단%' OR {a}.PxName LIKE '경옥고%'
+    OR {a}.PxName LIKE '녹용추가%' OR {a}.PxName LIKE '린다%' OR {a}.PxName LIKE '슬림환%'
+    OR {a}.PxName LIKE '%치료약%' OR {a}.PxName LIKE '%종합진료비%'
+    OR {a}.PxName = '재처방' OR {a}.PxName = '내원상담')"""
+
+
+def _classify_visit_route(suggest):
+    """내원경로(SUGGEST) -> intro/search/signboard/other"""
+    suggest = suggest or ''
+    for category, keywords in _VISIT_ROUTE_KEYWORDS:
+        if any(kw in suggest for kw in keywords):
+            return category
+    return "other"
+
+
+def _categorize_uncovered(px_name):
+    """비급여 처방명 -> 비급여 추이 카테고리 (해당 없으면 None)"""
+    if not px_name:
+        return None
+    name = px_name.strip()
+
+    # 경옥고 (경옥고, 경옥환, 녹용경옥고, 녹용경옥환) - 녹용보다 먼저 체크
+    if '경옥고' in name or '경옥환' in name:
+        return "경옥고"
+    # 녹용 (경옥고 제외 후)
+    if '녹용' in name:
+        return "녹용"
+    # 공진단
+    if '공진단' in name:
+        return "공진단"
+    # 약침
+    if '약침' in name or name in ['봉침', '자하거', '태반주사', '신바로']:
+        return "약침"
+    # 다이어트
+    if any(d in name for d in ['린다프리미엄', '린다스탠다드', '린다스페셜', '린다환', '린디톡스', '슬림환', '체감탕']):
+        return "다이어트"
+    # 상비한약 (상비약, 감기약, 치료약, 자운고, 상용환)
+    if any(kw in name for kw in ['상비약', '감기약', '치료약', '자운고', '상용환']):
+        return "상비한약"
+    # 맞춤한약 (탕약, 환, 처방 등)
+    if any(kw in name for kw in ['탕', '환', '고', '산', '처방', '첩', '제', '약']):
+        if '공진단' not in name and '경옥고' not in name and '경옥환' not in name:
+            return "맞춤한약"
+
+    return None
+
+
+def _trend_month_list(end_date, count=_TREND_MONTHS):
+    """end_date가 속한 월까지 count개월 ('YYYY-MM', 과거 -> 현재 순서)"""
+    year, month = end_date.year, end_date.month
+    months = []
+    for _ in range(count):
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return months[::-1]
+
+
+def _month_range(month):
+    """'YYYY-MM' -> (월 1일, 월 말일) 문자열"""
+    import calendar
+
+    year, mon = int(month[:4]), int(month[5:7])
+    return f"{month}-01", f"{month}-{calendar.monthrange(year, mon)[1]:02d}"
+
+
+def _trend_revenue(cursor, months):
+    """매출추이: 급여/추나/자보/비급여 (자보 여부는 #JaboVisits로 판단)"""
+    params = {'range_start': _month_range(months[0])[0], 'range_end': _month_range(months[-1])[1]}
+    mssql_db.stage_visits(cursor, params['range_start'], params['range_end'])
+    jabo_exists = mssql_db.jabo_visit_sql('r.Customer_PK', 'r.TxDate')
+
+    def receipt_sum(money_expr, jabo_condition):
+        mssql_db.execute(cursor, f"""
+            SELECT FORMAT(r.TxDate, 'yyyy-MM') as month,
+                   ISNULL(SUM({money_expr}), 0) as amount
+            FROM Receipt r
+            WHERE {_date_range_sql('r.TxDate', 'range_start', 'range_end')}
+              AND {jabo_condition}
+            GROUP BY FORMAT(r.TxDate, 'yyyy-MM')
+        """, params)
+        return {row['month']: int(row['amount'] or 0) for row in cursor.fetchall()}
+
+    # 급여매출 (자보 제외)
+    insurance = receipt_sum("ISNULL(r.Bonin_Money, 0) + ISNULL(r.CheongGu_Money, 0)", f"NOT {jabo_exists}")
+    # 자보매출
+    jabo = receipt_sum("ISNULL(r.Bonin_Money, 0) + ISNULL(r.CheongGu_Money, 0) + ISNULL(r.General_Money, 0)",
+                       jabo_exists)
+    # 비급여매출 (자보 제외)
+    uncovered = receipt_sum("ISNULL(r.General_Money, 0)", f"NOT {jabo_exists}")
+
+    # 추나매출 (자보 제외)
+    mssql_db.execute(cursor, f"""
+        SELECT FORMAT(d.TxDate, 'yyyy-MM') as month,
+               ISNULL(SUM(ISNULL(d.TxMoney, 0)), 0) as chuna
+        FROM Detail d
+        WHERE {_date_range_sql('d.TxDate', 'range_start', 'range_end')}
+          AND d.PxName LIKE '%추나%'
+          AND NOT {mssql_db.jabo_visit_sql('d.Customer_PK', 'd.TxDate')}
+        GROUP BY FORMAT(d.TxDate, 'yyyy-MM')
+    """, params)
+    chuna = {row['month']: int(row['chuna'] or 0) for row in cursor.fetchall()}
+    mssql_db.drop_staged_visits(cursor)
+
+    result = {}
+    for m in months:
+        ins, jab, unc = insurance.get(m, 0), jabo.get(m, 0), uncovered.get(m, 0)
+        result[m] = {
+            "insurance": ins, "chuna": chuna.get(m, 0), "jabo": jab,
+            "uncovered": unc, "total": ins + jab + unc
+        }
+    return result
+
+
+def _trend_visit_route(cursor, months):
+    """침초진 유입추이: 소개/검색/간판/기타 (약환자+자보환자 제외)"""
+    mssql_db.execute(cursor, f"""
+        SELECT FORMAT(c.reg_date, 'yyyy-MM') as month, c.SUGGEST, COUNT(DISTINCT c.Customer_PK) as cnt
+        FROM Customer c
+        JOIN Receipt r ON c.Customer_PK = r.Customer_PK
+        WHERE {_date_range_sql('c.reg_date', 'range_start', 'range_end')}
+          AND {_same_day_sql('r.TxDate', 'CAST(c.reg_date AS DATE)')}
+          AND r.CheongGu_Money > 0
+          AND c.SUGGEST IS NOT NULL AND c.SUGGEST != ''
+          AND NOT EXISTS (SELECT 1 FROM custcarinsuinfo ci WHERE ci.custpk = c.Customer_PK)
+        GROUP BY FORMAT(c.reg_date, 'yyyy-MM'), c.SUGGEST
+    """, {'range_start': _month_range(months[0])[0], 'range_end': _month_range(months[-1])[1]})
+
+    result = {m: {"intro": 0, "search": 0, "signboard": 0, "other": 0} for m in months}
+    for row in cursor.fetchall():
+        if row['month'] in result:
+            result[row['month']][_classify_visit_route(row['SUGGEST'])] += row['cnt'] or 0
+    for data in result.values():
+        data["total"] = data["intro"] + data["search"] + data["signboard"] + data["other"]
+    return result
+
+
+def _trend_chim_patient(cursor, months):
+    """침환자현황 추이: 평환(일평균), 침 초진+재초진, 자보 초진+재초진 (월별 쿼리)"""
+    result = {}
+    for m in months:
+        month_start, month_end = _month_range(m)
+        params = {'month_start': month_start, 'month_end': month_end}
+
+        # 평환 (일평균)
+        mssql_db.execute(cursor, f"""
+            SELECT COUNT(DISTINCT CONCAT(r.Customer_PK, '_', CAST(r.TxDate AS DATE))) as total_visits
+            FROM Receipt r
+            WHERE {_date_range_sql('r.TxDate', 'month_start', 'month_end')}
+              AND (ISNULL(r.CheongGu_Money, 0) > 0
+                OR EXISTS (SELECT 1 FROM custcarinsuinfo ci WHERE ci.custpk = r.Customer_PK))
+        """, params)
+        total_visits = cursor.fetchone()['total_visits'] or 0
+
+        mssql_db.execute(cursor, f"""
+            SELECT COUNT(DISTINCT CAST(TxDate AS DATE)) as work_days
+            FROM Receipt WHERE {_date_range_sql('TxDate', 'month_start', 'month_end')}
+        """, params)
+        work_days = cursor.fetchone()['work_days'] or 1
+
+        # 침 초진
+        mssql_db.execute(cursor, f"""
+            SELECT COUNT(DISTINCT c.Customer_PK) as cnt FROM Customer c
+            JOIN Receipt r ON c.Customer_PK = r.Customer_PK
+            WHERE {_date_range_sql('c.reg_date', 'month_start', 'month_end')}
+              AND {_same_day_sql('r.TxDate', 'CAST(c.reg_date AS DATE)')} AND r.CheongGu_Money > 0
+              AND NOT EXISTS (SELECT 1 FROM custcarinsuinfo ci WHERE ci.custpk = c.Customer_PK)
+        """, params)
+        chim_chojin = cursor.fetchone()['cnt'] or 0
+
+        # 침 재초진
+        mssql_db.execute(cursor, f"""
+            SELECT COUNT(DISTINCT d.Customer_PK) as cnt FROM Detail d
+            JOIN Customer c ON d.Customer_PK = c.Customer_PK
+            JOIN Receipt r ON d.Customer_PK = r.Customer_PK AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE)
+            WHERE {_date_range_sql('d.TxDate', 'month_start', 'month_end')}
+              AND c.reg_date < %(month_start)s AND d.PxName = N'진찰료(초진)'
+              AND ISNULL(r.CheongGu_Money, 0) > 0
+              AND NOT EXISTS (SELECT 1 FROM custcarinsuinfo ci WHERE ci.custpk = d.Customer_PK)
+        """, params)
+        chim_rechojin = cursor.fetchone()['cnt'] or 0
+
+        # 자보 초진
+        mssql_db.execute(cursor, f"""
+            SELECT COUNT(DISTINCT c.Customer_PK) as cnt FROM Customer c
+            WHERE {_date_range_sql('c.reg_date', 'month_start', 'month_end')}
+              AND EXISTS (SELECT 1 FROM custcarinsuinfo ci WHERE ci.custpk = c.Customer_PK)
+        """, params)
+        jabo_chojin = cursor.fetchone()['cnt'] or 0
+
+        # 자보 재초진
+        mssql_db.execute(cursor, f"""
+            WITH PeriodJabo AS (
+                SELECT DISTINCT d.Customer_PK, d.사고번호 FROM Detail d
+                JOIN Customer c ON d.Customer_PK = c.Customer_PK
+                WHERE d.TxItem LIKE '%자동차보험%'
+                  AND {_date_range_sql('d.TxDate', 'month_start', 'month_end')}
+                  AND c.reg_date < %(month_start)s
+                  AND d.사고번호 IS NOT NULL AND d.사고번호 != ''
+            ),
+            PreviousAccidents AS (
+                SELECT DISTINCT d.Customer_PK, d.사고번호 FROM Detail d
+                WHERE d.TxItem LIKE '%자동차보험%' AND d.TxDate < %(month_start)s
+                  AND d.사고번호 IS NOT NULL AND d.사고번호 != ''
+            )
+            SELECT COUNT(DISTINCT pj.Customer_PK) as cnt FROM PeriodJabo pj
+            WHERE NOT EXISTS (SELECT 1 FROM PreviousAccidents pa
+                WHERE pa.Customer_PK = pj.Customer_PK AND pa.사고번호 = pj.사고번호)
+        """, params)
+        jabo_rechojin = cursor.fetchone()['cnt'] or 0
+
+        result[m] = {
+            "avg_daily": round(total_visits / work_days, 1),
+            "chim_total": chim_chojin + chim_rechojin,
+            "jabo_total": jabo_chojin + jabo_rechojin
+        }
+    return result
+
+
+def _trend_yak_chojin(cursor, months):
+    """약초진 추이: 6개월 내 약 구매 이력 없는 환자 (신규 = 등록월에 구입)"""
+    params = {'range_start': _month_range(months[0])[0], 'range_end': _month_range(months[-1])[1]}
+
+    def count_by_month(extra_condition):
+        mssql_db.execute(cursor, f"""
+            SELECT FORMAT(d.TxDate, 'yyyy-MM') as month, COUNT(DISTINCT d.Customer_PK) as cnt
+            FROM Detail d
+            JOIN Customer c ON d.Customer_PK = c.Customer_PK
+            WHERE {_date_range_sql('d.TxDate', 'range_start', 'range_end')}
+              AND d.InsuYes = 0 AND ISNULL(d.TxMoney, 0) > 0
+              AND {_YAK_PX_CONDITION.format(a='d')}
+              {extra_condition}
+              AND NOT EXISTS (
+                  SELECT 1 FROM Detail d2
+                  WHERE d2.Customer_PK = d.Customer_PK
+                    AND d2.TxDate >= DATEADD(MONTH, -6, CAST(d.TxDate AS DATE))
+                    AND d2.TxDate < CAST(d.TxDate AS DATE)
+                    AND d2.InsuYes = 0 AND ISNULL(d2.TxMoney, 0) > 0
+                    AND {_YAK_PX_CONDITION.format(a='d2')}
+              )
+            GROUP BY FORMAT(d.TxDate, 'yyyy-MM')
+        """, params)
+        return {row['month']: row['cnt'] for row in cursor.fetchall()}
+
+    total_by_month = count_by_month("")
+    # 약초진 신규 (등록월 = 구입월)
+    new_by_month = count_by_month("AND FORMAT(c.reg_date, 'yyyy-MM') = FORMAT(d.TxDate, 'yyyy-MM')")
+
+    result = {}
+    for m in months:
+        total = total_by_month.get(m, 0)
+        new_cnt = new_by_month.get(m, 0)
+        result[m] = {"new": new_cnt, "existing": total - new_cnt, "total": total}
+    return result
+
+
+def _trend_uncovered(cursor, months):
+    """비급여 추이: 카테고리별 매출"""
+    mssql_db.execute(cursor, f"""
+        SELECT FORMAT(d.TxDate, 'yyyy-MM') as month, d.PxName, SUM(ISNULL(d.TxMoney, 0)) as amount
+        FROM Detail d
+        WHERE d.InsuYes = 0 AND ISNULL(d.TxMoney, 0) > 0
+          AND {_date_range_sql('d.TxDate', 'range_start', 'range_end')}
+        GROUP BY FORMAT(d.TxDate, 'yyyy-MM'), d.PxName
+    """, {'range_start': _month_range(months[0])[0], 'range_end': _month_range(months[-1])[1]})
+
+    result = {m: {cat: 0 for cat in _UNCOVERED_CATEGORIES} for m in months}
+    for row in cursor.fetchall():
+        category = _categorize_uncovered(row['PxName'])
+        if row['month'] in result and category:
+            result[row['month']][category] += row['amount'] or 0
+    return result
+
+
+# 롤업 항목 -> 계산 함수 (cursor, 연속된 월 목록) -> {month: data}
+_TREND_METRICS = {
+    "revenue": _trend_revenue,
+    "visit_route": _trend_visit_route,
+    "chim_patient": _trend_chim_patient,
+    "yak_chojin": _trend_yak_chojin,
+    "uncovered": _trend_uncovered,
+}
+
+
+def _compute_trend_metric(metric, target_months):
+    """롤업 항목 하나를 전용 연결에서 계산 (병렬 실행용)
+
+    Returns:
+        ({month: data}, 소요 시간 ms)
+    """
+    started = time.perf_counter()
+    conn = mssql_db.get_connection()
+    if not conn:
+        raise ConnectionError("MSSQL 연결 실패")
+    try:
+        computed = _TREND_METRICS[metric](conn.cursor(as_dict=True), target_months)
+    finally:
+        conn.close()
+    return computed, round((time.perf_counter() - started) * 1000)
+
+
+def _monthly_trends(end_date, metrics):
+    """end_date가 속한 월까지 18개월 추이 (마감 월은 롤업, 나머지는 MSSQL 계산)
+
+    계산할 항목이 여러 개면 _TREND_MAX_WORKERS개까지 각각 별도 연결에서 동시에 실행한다.
+
+    Returns:
+        ({metric: [{"month": 'YYYY-MM', ...}, ...]},
+         {"saved": 새로 저장된 롤업 월 수, "timings_ms": {metric: ms}, "computed_months": {metric: 월 수}})
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    started = time.perf_counter()
+    months = _trend_month_list(end_date)
+    stored = {metric: stats_rollup.load(metric, months) for metric in metrics}
+    # 저장 안 된 첫 월부터 마지막 월까지 계산 (GROUP BY 월 쿼리를 한 번에 실행)
+    pending = {}
+    for metric in metrics:
+        missing = [m for m in months if m not in stored[metric]]
+        if missing:
+            pending[metric] = months[months.index(missing[0]):]
+
+    info = {"saved": 0, "timings_ms": {}, "computed_months": {m: len(t) for m, t in pending.items()}}
+    if len(pending) == 1:
+        metric, target_months = next(iter(pending.items()))
+        results = {metric: _compute_trend_metric(metric, target_months)}
+    elif pending:
+        workers = min(_TREND_MAX_WORKERS, len(pending))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="trend") as executor:
+            futures = {
+                metric: executor.submit(_compute_trend_metric, metric, target_months)
+                for metric, target_months in pending.items()
+            }
+            results = {metric: future.result() for metric, future in futures.items()}
+    else:
+        results = {}
+
+    for metric, (computed, elapsed_ms) in results.items():
+        info["saved"] += stats_rollup.save(metric, computed)
+        info["timings_ms"][metric] = elapsed_ms
+        stored[metric].update(computed)
+    info["timings_ms"]["total"] = round((time.perf_counter() - started) * 1000)
+
+    trends = {
+        metric: [{"month": m, **stored[metric][m]} for m in months]
+        for metric in metrics
+    }
+    return trends, info
+
+
+def _refresh_trend_rollup():
+    """롤업 백그라운드 갱신: 지난 달까지의 마감 월 집계를 채움 (이미 있으면 DB 조회 없음)"""
+    from datetime import timedelta
+
+    last_closed_day = datetime.now().replace(day=1) - timedelta(days=1)
+    _, info = _monthly_trends(last_closed_day, list(_TREND_METRICS))
+    return info["saved"]
+
+
+stats_rollup.register_refresh_job(_refresh_trend_rollup)
 
 
 @mssql_bp.route('/api/stats/revenue-trend')
+@_cached_stats('trend')
 def stats_revenue_trend():
     """최근 18개월/18주 매출 추이 API (최적화: 4개 쿼리로 한번에 조회)
 
@@ -3288,147 +3921,116 @@ def stats_revenue_trend():
     - end_date: 기준일 (YYYY-MM-DD, 기본값: 현재)
     - period: 'monthly' (기본값) 또는 'weekly' (18주 추이)
     """
+    conn = None
     try:
         from datetime import datetime as dt, timedelta
-        import calendar
-
-        def add_months(date, months):
-            """월 덧셈/뺄셈 함수 (dateutil 대체)"""
-            month = date.month - 1 + months
-            year = date.year + month // 12
-            month = month % 12 + 1
-            day = min(date.day, calendar.monthrange(year, month)[1])
-            return date.replace(year=year, month=month, day=day)
 
         end_date_str = request.args.get('end_date', dt.now().strftime('%Y-%m-%d'))
         period = request.args.get('period', 'monthly')
 
-        if period == 'weekly':
-            # 주간: end_date가 속한 주의 일요일까지
-            end_date = dt.strptime(end_date_str[:10], '%Y-%m-%d')
-            # 해당 주의 일요일로 이동 (일요일=6)
-            days_until_sunday = 6 - end_date.weekday()
-            end_sunday = end_date + timedelta(days=days_until_sunday)
-            # 18주 전 월요일
-            start_monday = end_sunday - timedelta(weeks=17, days=6)
-            range_start = start_monday.strftime('%Y-%m-%d')
-            range_end = end_sunday.strftime('%Y-%m-%d')
-        else:
-            # 월간: 기존 로직
+        if period != 'weekly':
+            # 월간: 마감 월은 롤업에서, 이번 달만 계산
             end_date = dt.strptime(end_date_str[:7] + '-01', '%Y-%m-%d')
-            start_month = add_months(end_date, -17)
-            range_start = start_month.strftime('%Y-%m-01')
-            next_month = add_months(end_date, 1)
-            range_end = (next_month - timedelta(days=1)).strftime('%Y-%m-%d')
+            trends, _ = _monthly_trends(end_date, ["revenue"])
+            return jsonify({
+                "end_date": end_date.strftime('%Y-%m'),
+                "period": period,
+                "data": trends["revenue"]
+            })
+
+        # 주간: end_date가 속한 주의 일요일까지
+        end_date = dt.strptime(end_date_str[:10], '%Y-%m-%d')
+        # 해당 주의 일요일로 이동 (일요일=6)
+        days_until_sunday = 6 - end_date.weekday()
+        end_sunday = end_date + timedelta(days=days_until_sunday)
+        # 18주 전 월요일
+        start_monday = end_sunday - timedelta(weeks=17, days=6)
+        range_start = start_monday.strftime('%Y-%m-%d')
+        range_end = end_sunday.strftime('%Y-%m-%d')
         conn = mssql_db.get_connection()
         if not conn:
             return jsonify({"error": "MSSQL 연결 실패"}), 500
 
         cursor = conn.cursor(as_dict=True)
 
-        # 주간/월간에 따라 GROUP BY 형식 결정
-        if period == 'weekly':
-            # ISO 주차: DATEPART(iso_week, date) + 연도
-            group_format = "CAST(YEAR(DATEADD(DAY, 26 - DATEPART(iso_week, r.TxDate), r.TxDate)) AS VARCHAR) + '-W' + RIGHT('0' + CAST(DATEPART(iso_week, r.TxDate) AS VARCHAR), 2)"
-            group_format_d = "CAST(YEAR(DATEADD(DAY, 26 - DATEPART(iso_week, d.TxDate), d.TxDate)) AS VARCHAR) + '-W' + RIGHT('0' + CAST(DATEPART(iso_week, d.TxDate) AS VARCHAR), 2)"
-        else:
-            group_format = "FORMAT(r.TxDate, 'yyyy-MM')"
-            group_format_d = "FORMAT(d.TxDate, 'yyyy-MM')"
+        # 기간 내 자보 방문 (#JaboVisits)
+        mssql_db.stage_visits(cursor, range_start, range_end)
+
+        # GROUP BY 형식 - ISO 주차: DATEPART(iso_week, date) + 연도
+        group_format = "CAST(YEAR(DATEADD(DAY, 26 - DATEPART(iso_week, r.TxDate), r.TxDate)) AS VARCHAR) + '-W' + RIGHT('0' + CAST(DATEPART(iso_week, r.TxDate) AS VARCHAR), 2)"
+        group_format_d = "CAST(YEAR(DATEADD(DAY, 26 - DATEPART(iso_week, d.TxDate), d.TxDate)) AS VARCHAR) + '-W' + RIGHT('0' + CAST(DATEPART(iso_week, d.TxDate) AS VARCHAR), 2)"
 
         # 1. 급여매출 (자보 제외)
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT {group_format} as period_key,
                    ISNULL(SUM(ISNULL(r.Bonin_Money, 0) + ISNULL(r.CheongGu_Money, 0)), 0) as insurance
             FROM Receipt r
-            WHERE CAST(r.TxDate AS DATE) BETWEEN '{range_start}' AND '{range_end}'
-              AND NOT EXISTS (SELECT 1 FROM Detail d WHERE d.Customer_PK = r.Customer_PK
-                AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE) AND d.TxItem LIKE '%자동차보험%')
+            WHERE {_date_range_sql('r.TxDate', 'range_start', 'range_end')}
+              AND NOT {mssql_db.jabo_visit_sql('r.Customer_PK', 'r.TxDate')}
             GROUP BY {group_format}
-        """)
+        """, {'range_start': range_start, 'range_end': range_end})
         insurance_by_period = {row['period_key']: int(row['insurance'] or 0) for row in cursor.fetchall()}
 
         # 2. 추나매출 (자보 제외)
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT {group_format_d} as period_key,
                    ISNULL(SUM(ISNULL(d.TxMoney, 0)), 0) as chuna
             FROM Detail d
-            WHERE CAST(d.TxDate AS DATE) BETWEEN '{range_start}' AND '{range_end}'
+            WHERE {_date_range_sql('d.TxDate', 'range_start', 'range_end')}
               AND d.PxName LIKE '%추나%'
-              AND NOT EXISTS (SELECT 1 FROM Detail d2 WHERE d2.Customer_PK = d.Customer_PK
-                AND CAST(d2.TxDate AS DATE) = CAST(d.TxDate AS DATE) AND d2.TxItem LIKE '%자동차보험%')
+              AND NOT {mssql_db.jabo_visit_sql('d.Customer_PK', 'd.TxDate')}
             GROUP BY {group_format_d}
-        """)
+        """, {'range_start': range_start, 'range_end': range_end})
         chuna_by_period = {row['period_key']: int(row['chuna'] or 0) for row in cursor.fetchall()}
 
         # 3. 자보매출
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT {group_format} as period_key,
                    ISNULL(SUM(ISNULL(r.Bonin_Money, 0) + ISNULL(r.CheongGu_Money, 0) + ISNULL(r.General_Money, 0)), 0) as jabo
             FROM Receipt r
-            WHERE CAST(r.TxDate AS DATE) BETWEEN '{range_start}' AND '{range_end}'
-              AND EXISTS (SELECT 1 FROM Detail d WHERE d.Customer_PK = r.Customer_PK
-                AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE) AND d.TxItem LIKE '%자동차보험%')
+            WHERE {_date_range_sql('r.TxDate', 'range_start', 'range_end')}
+              AND {mssql_db.jabo_visit_sql('r.Customer_PK', 'r.TxDate')}
             GROUP BY {group_format}
-        """)
+        """, {'range_start': range_start, 'range_end': range_end})
         jabo_by_period = {row['period_key']: int(row['jabo'] or 0) for row in cursor.fetchall()}
 
         # 4. 비급여매출 (자보 제외)
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT {group_format} as period_key,
                    ISNULL(SUM(ISNULL(r.General_Money, 0)), 0) as uncovered
             FROM Receipt r
-            WHERE CAST(r.TxDate AS DATE) BETWEEN '{range_start}' AND '{range_end}'
-              AND NOT EXISTS (SELECT 1 FROM Detail d WHERE d.Customer_PK = r.Customer_PK
-                AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE) AND d.TxItem LIKE '%자동차보험%')
+            WHERE {_date_range_sql('r.TxDate', 'range_start', 'range_end')}
+              AND NOT {mssql_db.jabo_visit_sql('r.Customer_PK', 'r.TxDate')}
             GROUP BY {group_format}
-        """)
+        """, {'range_start': range_start, 'range_end': range_end})
         uncovered_by_period = {row['period_key']: int(row['uncovered'] or 0) for row in cursor.fetchall()}
 
-        conn.close()
+        mssql_db.drop_staged_visits(cursor)
 
-        # 결과 조합 (과거 -> 현재 순서)
+        # 결과 조합 (과거 -> 현재 순서, 18주)
         result = []
-        if period == 'weekly':
-            # 18주 결과
-            for i in range(17, -1, -1):
-                week_sunday = end_sunday - timedelta(weeks=i)
-                week_monday = week_sunday - timedelta(days=6)
-                # ISO 주차 계산
-                iso_year, iso_week, _ = week_monday.isocalendar()
-                period_key = f"{iso_year}-W{iso_week:02d}"
-                week_label = week_monday.strftime('%m/%d')  # 해당 주의 월요일 날짜로 표시
-                insurance = insurance_by_period.get(period_key, 0)
-                chuna = chuna_by_period.get(period_key, 0)
-                jabo = jabo_by_period.get(period_key, 0)
-                uncovered = uncovered_by_period.get(period_key, 0)
-                result.append({
-                    "month": week_label,
-                    "insurance": insurance,
-                    "chuna": chuna,
-                    "jabo": jabo,
-                    "uncovered": uncovered,
-                    "total": insurance + jabo + uncovered
-                })
-        else:
-            # 18개월 결과
-            for i in range(17, -1, -1):
-                month_date = add_months(end_date, -i)
-                month_label = month_date.strftime('%Y-%m')
-                insurance = insurance_by_period.get(month_label, 0)
-                chuna = chuna_by_period.get(month_label, 0)
-                jabo = jabo_by_period.get(month_label, 0)
-                uncovered = uncovered_by_period.get(month_label, 0)
-                result.append({
-                    "month": month_label,
-                    "insurance": insurance,
-                    "chuna": chuna,
-                    "jabo": jabo,
-                    "uncovered": uncovered,
-                    "total": insurance + jabo + uncovered
-                })
+        for i in range(17, -1, -1):
+            week_sunday = end_sunday - timedelta(weeks=i)
+            week_monday = week_sunday - timedelta(days=6)
+            # ISO 주차 계산
+            iso_year, iso_week, _ = week_monday.isocalendar()
+            period_key = f"{iso_year}-W{iso_week:02d}"
+            week_label = week_monday.strftime('%m/%d')  # 해당 주의 월요일 날짜로 표시
+            insurance = insurance_by_period.get(period_key, 0)
+            chuna = chuna_by_period.get(period_key, 0)
+            jabo = jabo_by_period.get(period_key, 0)
+            uncovered = uncovered_by_period.get(period_key, 0)
+            result.append({
+                "month": week_label,
+                "insurance": insurance,
+                "chuna": chuna,
+                "jabo": jabo,
+                "uncovered": uncovered,
+                "total": insurance + jabo + uncovered
+            })
 
         return jsonify({
-            "end_date": end_date.strftime('%Y-%m-%d') if period == 'weekly' else end_date.strftime('%Y-%m'),
+            "end_date": end_date.strftime('%Y-%m-%d'),
             "period": period,
             "data": result
         })
@@ -3438,11 +4040,16 @@ def stats_revenue_trend():
         import traceback
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 @mssql_bp.route('/api/stats/all')
+@_cached_stats()
 def stats_all():
     """통합 통계 API - 임시 테이블 활용 최적화 버전"""
+    conn = None
     try:
         period = request.args.get('period', 'daily')
         target_date = request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
@@ -3461,65 +4068,8 @@ def stats_all():
         # 기존: 각 쿼리마다 NOT EXISTS로 자보 여부 확인 (매우 느림)
         # 개선: 한 번에 자보 여부를 계산하여 임시 테이블에 저장
 
-        # 1-1. 기간 내 Detail 데이터 + 자보 여부 임시 테이블
-        cursor.execute(f"""
-            -- 기존 임시 테이블 삭제
-            IF OBJECT_ID('tempdb..#TempDetail') IS NOT NULL DROP TABLE #TempDetail;
-            IF OBJECT_ID('tempdb..#TempReceipt') IS NOT NULL DROP TABLE #TempReceipt;
-            IF OBJECT_ID('tempdb..#JaboVisits') IS NOT NULL DROP TABLE #JaboVisits;
-
-            -- 1) 기간 내 자보 방문 (Customer_PK + 날짜) 미리 계산
-            SELECT DISTINCT d.Customer_PK, CAST(d.TxDate AS DATE) as TxDateOnly
-            INTO #JaboVisits
-            FROM Detail d
-            WHERE d.TxDate >= '{start_date}' AND d.TxDate < DATEADD(DAY, 1, '{end_date}')
-              AND d.TxItem LIKE '%자동차보험%';
-
-            CREATE INDEX IX_JaboVisits ON #JaboVisits(Customer_PK, TxDateOnly);
-
-            -- 2) 기간 내 Detail 데이터 + 자보 여부 플래그
-            SELECT
-                d.Detail_PK,
-                d.Customer_PK,
-                CAST(d.TxDate AS DATE) as TxDateOnly,
-                d.TxDoctor,
-                d.PxName,
-                d.TxItem,
-                d.TxMoney,
-                d.InsuYes,
-                d.사고번호,
-                CASE WHEN j.Customer_PK IS NOT NULL THEN 1 ELSE 0 END as IsJabo
-            INTO #TempDetail
-            FROM Detail d
-            LEFT JOIN #JaboVisits j ON d.Customer_PK = j.Customer_PK AND CAST(d.TxDate AS DATE) = j.TxDateOnly
-            WHERE d.TxDate >= '{start_date}' AND d.TxDate < DATEADD(DAY, 1, '{end_date}');
-
-            CREATE INDEX IX_TempDetail_Customer ON #TempDetail(Customer_PK, TxDateOnly);
-            CREATE INDEX IX_TempDetail_Doctor ON #TempDetail(TxDoctor);
-            CREATE INDEX IX_TempDetail_IsJabo ON #TempDetail(IsJabo);
-
-            -- 3) 기간 내 Receipt 데이터 + 자보 여부 + 대표 원장
-            SELECT
-                r.Receipt_PK,
-                r.Customer_PK,
-                CAST(r.TxDate AS DATE) as TxDateOnly,
-                ISNULL(r.Bonin_Money, 0) as Bonin_Money,
-                ISNULL(r.CheongGu_Money, 0) as CheongGu_Money,
-                ISNULL(r.General_Money, 0) as General_Money,
-                CASE WHEN j.Customer_PK IS NOT NULL THEN 1 ELSE 0 END as IsJabo,
-                (SELECT TOP 1 td.TxDoctor FROM #TempDetail td
-                 WHERE td.Customer_PK = r.Customer_PK AND td.TxDateOnly = CAST(r.TxDate AS DATE)
-                 AND td.TxDoctor IS NOT NULL AND td.TxDoctor != ''
-                 ORDER BY td.Detail_PK) as RepDoctor
-            INTO #TempReceipt
-            FROM Receipt r
-            LEFT JOIN #JaboVisits j ON r.Customer_PK = j.Customer_PK AND CAST(r.TxDate AS DATE) = j.TxDateOnly
-            WHERE r.TxDate >= '{start_date}' AND r.TxDate < DATEADD(DAY, 1, '{end_date}');
-
-            CREATE INDEX IX_TempReceipt_Customer ON #TempReceipt(Customer_PK, TxDateOnly);
-            CREATE INDEX IX_TempReceipt_IsJabo ON #TempReceipt(IsJabo);
-            CREATE INDEX IX_TempReceipt_RepDoctor ON #TempReceipt(RepDoctor);
-        """)
+        # #JaboVisits / #TempDetail / #TempReceipt (services.mssql_db 공용 엔진)
+        mssql_db.stage_visits(cursor, start_date, end_date, receipt=True)
 
         # 영업일 수
         cursor.execute(f"""
@@ -3549,41 +4099,41 @@ def stats_all():
         # ============ 2. 환자 통계 (임시 테이블 사용) ============
 
         # 침초진 (원장별) - 건보 환자 중 등록일 = 진료일
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT td.TxDoctor as doctor, COUNT(DISTINCT c.Customer_PK) as cnt
             FROM Customer c
             INNER JOIN #TempReceipt tr ON c.Customer_PK = tr.Customer_PK AND tr.TxDateOnly = CAST(c.reg_date AS DATE)
             INNER JOIN #TempDetail td ON c.Customer_PK = td.Customer_PK AND td.TxDateOnly = CAST(c.reg_date AS DATE)
-            WHERE c.reg_date >= '{start_date}' AND c.reg_date < DATEADD(DAY, 1, '{end_date}')
+            WHERE {_date_range_sql('c.reg_date')}
               AND tr.CheongGu_Money > 0
               AND tr.IsJabo = 0
             GROUP BY td.TxDoctor
-        """)
+        """, {'start_date': start_date, 'end_date': end_date})
         chim_chojin_by_doctor = {row['doctor']: row['cnt'] for row in cursor.fetchall()}
 
         # 자보초진 (원장별)
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT td.TxDoctor as doctor, COUNT(DISTINCT c.Customer_PK) as cnt
             FROM Customer c
             INNER JOIN #TempDetail td ON c.Customer_PK = td.Customer_PK AND td.TxDateOnly = CAST(c.reg_date AS DATE)
-            WHERE c.reg_date >= '{start_date}' AND c.reg_date < DATEADD(DAY, 1, '{end_date}')
+            WHERE {_date_range_sql('c.reg_date')}
               AND td.TxItem LIKE '%자동차보험%'
             GROUP BY td.TxDoctor
-        """)
+        """, {'start_date': start_date, 'end_date': end_date})
         jabo_chojin_by_doctor = {row['doctor']: row['cnt'] for row in cursor.fetchall()}
 
         # 약초진 (원장별)
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT td.TxDoctor as doctor, COUNT(DISTINCT c.Customer_PK) as cnt
             FROM Customer c
             INNER JOIN #TempReceipt tr ON c.Customer_PK = tr.Customer_PK AND tr.TxDateOnly = CAST(c.reg_date AS DATE)
             INNER JOIN #TempDetail td ON c.Customer_PK = td.Customer_PK AND td.TxDateOnly = CAST(c.reg_date AS DATE)
-            WHERE c.reg_date >= '{start_date}' AND c.reg_date < DATEADD(DAY, 1, '{end_date}')
+            WHERE {_date_range_sql('c.reg_date')}
               AND tr.CheongGu_Money = 0
               AND tr.General_Money > 0
               AND tr.IsJabo = 0
             GROUP BY td.TxDoctor
-        """)
+        """, {'start_date': start_date, 'end_date': end_date})
         yak_chojin_by_doctor = {row['doctor']: row['cnt'] for row in cursor.fetchall()}
 
         # 침환자 재초진 (원장별)
@@ -3592,7 +4142,7 @@ def stats_all():
             FROM #TempDetail td
             INNER JOIN Customer c ON td.Customer_PK = c.Customer_PK
             INNER JOIN #TempReceipt tr ON td.Customer_PK = tr.Customer_PK AND td.TxDateOnly = tr.TxDateOnly
-            WHERE CAST(c.reg_date AS DATE) < td.TxDateOnly
+            WHERE c.reg_date < td.TxDateOnly
               AND td.PxName = N'진찰료(초진)'
               AND tr.CheongGu_Money > 0
               AND td.IsJabo = 0
@@ -3601,41 +4151,41 @@ def stats_all():
         chim_rechojin_by_doctor = {row['doctor']: row['cnt'] for row in cursor.fetchall()}
 
         # 자보 재초진 (원장별)
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT td.TxDoctor as doctor, COUNT(DISTINCT td.Customer_PK) as cnt
             FROM #TempDetail td
             INNER JOIN Customer c ON td.Customer_PK = c.Customer_PK
             WHERE td.TxItem LIKE '%자동차보험%'
-              AND CAST(c.reg_date AS DATE) < '{start_date}'
+              AND c.reg_date < %(start_date)s
               AND td.사고번호 IS NOT NULL AND td.사고번호 != ''
               AND NOT EXISTS (
                 SELECT 1 FROM Detail d2
                 WHERE d2.Customer_PK = td.Customer_PK
                   AND d2.사고번호 = td.사고번호
                   AND d2.TxItem LIKE '%자동차보험%'
-                  AND d2.TxDate < '{start_date}'
+                  AND d2.TxDate < %(start_date)s
               )
             GROUP BY td.TxDoctor
-        """)
+        """, {'start_date': start_date})
         jabo_rechojin_by_doctor = {row['doctor']: row['cnt'] for row in cursor.fetchall()}
 
         # 약환자 재초진 (원장별)
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT td.TxDoctor as doctor, COUNT(DISTINCT tr.Customer_PK) as cnt
             FROM #TempReceipt tr
             INNER JOIN Customer c ON tr.Customer_PK = c.Customer_PK
             INNER JOIN #TempDetail td ON tr.Customer_PK = td.Customer_PK AND tr.TxDateOnly = td.TxDateOnly
-            WHERE CAST(c.reg_date AS DATE) < '{start_date}'
+            WHERE c.reg_date < %(start_date)s
               AND tr.CheongGu_Money = 0
               AND tr.General_Money > 0
               AND tr.IsJabo = 0
               AND NOT EXISTS (
                 SELECT 1 FROM Receipt r2 WHERE r2.Customer_PK = tr.Customer_PK
-                AND CAST(r2.TxDate AS DATE) < tr.TxDateOnly
-                AND CAST(r2.TxDate AS DATE) >= DATEADD(MONTH, -3, tr.TxDateOnly)
+                AND r2.TxDate < tr.TxDateOnly
+                AND r2.TxDate >= DATEADD(MONTH, -3, tr.TxDateOnly)
               )
             GROUP BY td.TxDoctor
-        """)
+        """, {'start_date': start_date})
         yak_rechojin_by_doctor = {row['doctor']: row['cnt'] for row in cursor.fetchall()}
 
         # 건보 침환자 총 방문수 (원장별)
@@ -3715,7 +4265,7 @@ def stats_all():
             INNER JOIN #TempDetail td ON tr.Customer_PK = td.Customer_PK AND tr.TxDateOnly = td.TxDateOnly
             WHERE (tr.CheongGu_Money > 0 OR tr.IsJabo = 1)
               AND EXISTS (SELECT 1 FROM Reservation_New res WHERE res.Res_Customer_PK = tr.Customer_PK
-                AND CAST(res.Res_Date AS DATE) = tr.TxDateOnly)
+                AND {_same_day_sql('res.Res_Date', 'tr.TxDateOnly')})
             GROUP BY td.TxDoctor
         """)
         res_reserved_by_doctor = {row['doctor']: row['cnt'] for row in cursor.fetchall()}
@@ -3727,8 +4277,8 @@ def stats_all():
             INNER JOIN #TempDetail td ON tr.Customer_PK = td.Customer_PK AND tr.TxDateOnly = td.TxDateOnly
             WHERE (tr.CheongGu_Money > 0 OR tr.IsJabo = 1)
               AND EXISTS (SELECT 1 FROM Reservation_New res WHERE res.Res_Customer_PK = tr.Customer_PK
-                AND CAST(res.Res_Date AS DATE) > tr.TxDateOnly
-                AND CAST(res.Res_updatetime AS DATE) = tr.TxDateOnly)
+                AND res.Res_Date >= DATEADD(DAY, 1, tr.TxDateOnly)
+                AND {_same_day_sql('res.Res_updatetime', 'tr.TxDateOnly')})
             GROUP BY td.TxDoctor
         """)
         res_onsite_by_doctor = {row['doctor']: row['cnt'] for row in cursor.fetchall()}
@@ -3772,13 +4322,8 @@ def stats_all():
         revenue_uncovered_by_doctor = {row['doctor']: int(row['amount'] or 0) for row in cursor.fetchall()}
 
         # 임시 테이블 정리
-        cursor.execute("""
-            DROP TABLE IF EXISTS #TempDetail;
-            DROP TABLE IF EXISTS #TempReceipt;
-            DROP TABLE IF EXISTS #JaboVisits;
-        """)
+        mssql_db.drop_staged_visits(cursor)
 
-        conn.close()
 
         # ============ 결과 조합 ============
 
@@ -3901,11 +4446,16 @@ def stats_all():
     except Exception as e:
         mssql_db.log(f"통합통계 오류: {str(e)}")
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 @mssql_bp.route('/api/stats/uncovered-detail')
+@_cached_stats()
 def stats_uncovered_detail():
     """비급여 상세 통계 API - 카테고리별 금액/건수"""
+    conn = None
     try:
         period = request.args.get('period', 'daily')
         target_date = request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
@@ -3920,55 +4470,47 @@ def stats_uncovered_detail():
 
         cursor = conn.cursor(as_dict=True)
 
-        # 자보 제외 비급여 항목 조회 (임시 테이블 활용)
-        cursor.execute(f"""
-            -- 자보 방문 계산
-            IF OBJECT_ID('tempdb..#JaboVisits2') IS NOT NULL DROP TABLE #JaboVisits2;
-            SELECT DISTINCT Customer_PK, CAST(TxDate AS DATE) as TxDateOnly
-            INTO #JaboVisits2
-            FROM Detail
-            WHERE TxDate >= '{start_date}' AND TxDate < DATEADD(DAY, 1, '{end_date}')
-              AND TxItem LIKE '%자동차보험%';
+        # 자보 방문 임시 테이블 (#JaboVisits)
+        mssql_db.stage_visits(cursor, start_date, end_date)
 
-            -- 비급여 항목 전체 조회
+        # 자보 제외 비급여 항목 전체 조회
+        mssql_db.execute(cursor, f"""
             SELECT
                 d.PxName,
                 COUNT(*) as cnt,
                 SUM(ISNULL(d.TxMoney, 0)) as amount
             FROM Detail d
-            LEFT JOIN #JaboVisits2 j ON d.Customer_PK = j.Customer_PK AND CAST(d.TxDate AS DATE) = j.TxDateOnly
-            WHERE d.TxDate >= '{start_date}' AND d.TxDate < DATEADD(DAY, 1, '{end_date}')
+            LEFT JOIN #JaboVisits j ON d.Customer_PK = j.Customer_PK AND CAST(d.TxDate AS DATE) = j.TxDateOnly
+            WHERE {_date_range_sql('d.TxDate')}
               AND d.InsuYes = 0
               AND ISNULL(d.TxMoney, 0) > 0
               AND j.Customer_PK IS NULL  -- 자보 제외
             GROUP BY d.PxName
             ORDER BY amount DESC;
-        """)
+        """, {'start_date': start_date, 'end_date': end_date})
 
         raw_items = cursor.fetchall()
 
         # 원장별-항목별 비급여 금액 조회 (자보 제외)
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT
                 ISNULL(d.TxDoctor, '미지정') as doctor,
                 d.PxName,
                 COUNT(*) as cnt,
                 SUM(ISNULL(d.TxMoney, 0)) as amount
             FROM Detail d
-            LEFT JOIN #JaboVisits2 j ON d.Customer_PK = j.Customer_PK AND CAST(d.TxDate AS DATE) = j.TxDateOnly
-            WHERE d.TxDate >= '{start_date}' AND d.TxDate < DATEADD(DAY, 1, '{end_date}')
+            LEFT JOIN #JaboVisits j ON d.Customer_PK = j.Customer_PK AND CAST(d.TxDate AS DATE) = j.TxDateOnly
+            WHERE {_date_range_sql('d.TxDate')}
               AND d.InsuYes = 0
               AND ISNULL(d.TxMoney, 0) > 0
               AND j.Customer_PK IS NULL
               AND d.TxDoctor IS NOT NULL AND d.TxDoctor != ''
             GROUP BY d.TxDoctor, d.PxName
             ORDER BY d.TxDoctor, amount DESC;
-
-            DROP TABLE IF EXISTS #JaboVisits2;
-        """)
+        """, {'start_date': start_date, 'end_date': end_date})
 
         by_doctor_items = cursor.fetchall()
-        conn.close()
+        mssql_db.drop_staged_visits(cursor)
 
         # 카테고리별 분류
         categories = {
@@ -4082,11 +4624,16 @@ def stats_uncovered_detail():
     except Exception as e:
         mssql_db.log(f"비급여상세 오류: {str(e)}")
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 @mssql_bp.route('/api/stats/visit-route')
+@_cached_stats()
 def stats_visit_route():
     """내원경로 통계 API - 신규 침환자의 내원경로 분석 (약환자+자보환자 제외)"""
+    conn = None
     try:
         period = request.args.get('period', 'daily')
         target_date = request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
@@ -4103,12 +4650,12 @@ def stats_visit_route():
 
         # 기간 내 신규 침환자의 내원경로 조회 (침환자현황 초진 기준과 동일)
         # 조건: 등록일에 CheongGu_Money > 0 (보험청구 있음), 자보환자 제외
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT c.SUGGEST, COUNT(DISTINCT c.Customer_PK) as cnt
             FROM Customer c
             JOIN Receipt r ON c.Customer_PK = r.Customer_PK
-            WHERE c.reg_date >= '{start_date}' AND c.reg_date < DATEADD(DAY, 1, '{end_date}')
-              AND CAST(r.TxDate AS DATE) = CAST(c.reg_date AS DATE)
+            WHERE {_date_range_sql('c.reg_date')}
+              AND {_same_day_sql('r.TxDate', 'CAST(c.reg_date AS DATE)')}
               AND r.CheongGu_Money > 0
               AND c.SUGGEST IS NOT NULL AND c.SUGGEST != ''
               AND NOT EXISTS (
@@ -4117,10 +4664,9 @@ def stats_visit_route():
               )
             GROUP BY c.SUGGEST
             ORDER BY cnt DESC
-        """)
+        """, {'start_date': start_date, 'end_date': end_date})
 
         raw_items = cursor.fetchall()
-        conn.close()
 
         # 카테고리별 분류
         categories = {
@@ -4168,11 +4714,16 @@ def stats_visit_route():
     except Exception as e:
         mssql_db.log(f"내원경로 오류: {str(e)}")
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 @mssql_bp.route('/api/stats/search-keywords')
+@_cached_stats()
 def stats_search_keywords():
     """검색어 상세 통계 API - 검색 유입 침환자의 CustURL(검색어) 분석 (약환자+자보환자 제외)"""
+    conn = None
     try:
         period = request.args.get('period', 'daily')
         target_date = request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
@@ -4193,12 +4744,12 @@ def stats_search_keywords():
 
         # 기간 내 검색 유입 침환자의 CustURL(검색어) 집계 (침환자현황 초진 기준과 동일)
         # 조건: 등록일에 CheongGu_Money > 0 (보험청구 있음), 자보환자 제외
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT c.CustURL, COUNT(DISTINCT c.Customer_PK) as cnt
             FROM Customer c
             JOIN Receipt r ON c.Customer_PK = r.Customer_PK
-            WHERE c.reg_date >= '{start_date}' AND c.reg_date < DATEADD(DAY, 1, '{end_date}')
-              AND CAST(r.TxDate AS DATE) = CAST(c.reg_date AS DATE)
+            WHERE {_date_range_sql('c.reg_date')}
+              AND {_same_day_sql('r.TxDate', 'CAST(c.reg_date AS DATE)')}
               AND r.CheongGu_Money > 0
               AND ({search_conditions})
               AND NOT EXISTS (
@@ -4207,7 +4758,7 @@ def stats_search_keywords():
               )
             GROUP BY c.CustURL
             ORDER BY cnt DESC
-        """)
+        """, {'start_date': start_date, 'end_date': end_date})
 
         raw_items = cursor.fetchall()
 
@@ -4265,7 +4816,6 @@ def stats_search_keywords():
         sorted_keywords = sorted(keyword_counts.items(), key=lambda x: x[1], reverse=True)
         keywords = [{"keyword": keyword_display[k], "cnt": v, "ratio": round(v / total * 100, 1) if total > 0 else 0} for k, v in sorted_keywords]
 
-        conn.close()
 
         return jsonify({
             "period": period,
@@ -4278,57 +4828,51 @@ def stats_search_keywords():
     except Exception as e:
         mssql_db.log(f"검색어상세 오류: {str(e)}")
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 @mssql_bp.route('/api/stats/visit-route-trend')
+@_cached_stats('trend')
 def stats_visit_route_trend():
     """침초진 18개월/18주 추이 API - 소개/검색/간판/기타 추이 (약환자+자보환자 제외)"""
+    conn = None
     try:
         from datetime import datetime as dt, timedelta
-        import calendar
-
-        def add_months(date, months):
-            month = date.month - 1 + months
-            year = date.year + month // 12
-            month = month % 12 + 1
-            day = min(date.day, calendar.monthrange(year, month)[1])
-            return date.replace(year=year, month=month, day=day)
 
         end_date_str = request.args.get('end_date', dt.now().strftime('%Y-%m-%d'))
         period = request.args.get('period', 'monthly')
 
-        if period == 'weekly':
-            end_date = dt.strptime(end_date_str[:10], '%Y-%m-%d')
-            days_until_sunday = 6 - end_date.weekday()
-            end_sunday = end_date + timedelta(days=days_until_sunday)
-            start_monday = end_sunday - timedelta(weeks=17, days=6)
-            range_start = start_monday.strftime('%Y-%m-%d')
-            range_end = end_sunday.strftime('%Y-%m-%d')
-            group_format = "CAST(YEAR(DATEADD(DAY, 26 - DATEPART(iso_week, c.reg_date), c.reg_date)) AS VARCHAR) + '-W' + RIGHT('0' + CAST(DATEPART(iso_week, c.reg_date) AS VARCHAR), 2)"
-        else:
+        if period != 'weekly':
+            # 월간: 마감 월은 롤업에서, 이번 달만 계산
             end_date = dt.strptime(end_date_str[:7] + '-01', '%Y-%m-%d')
-            start_month = add_months(end_date, -17)
-            range_start = start_month.strftime('%Y-%m-01')
-            next_month = add_months(end_date, 1)
-            range_end = (next_month - timedelta(days=1)).strftime('%Y-%m-%d')
-            group_format = "FORMAT(c.reg_date, 'yyyy-MM')"
+            trends, _ = _monthly_trends(end_date, ["visit_route"])
+            return jsonify({
+                "end_date": end_date.strftime('%Y-%m'),
+                "period": period,
+                "data": trends["visit_route"]
+            })
+
+        end_date = dt.strptime(end_date_str[:10], '%Y-%m-%d')
+        days_until_sunday = 6 - end_date.weekday()
+        end_sunday = end_date + timedelta(days=days_until_sunday)
+        start_monday = end_sunday - timedelta(weeks=17, days=6)
+        range_start = start_monday.strftime('%Y-%m-%d')
+        range_end = end_sunday.strftime('%Y-%m-%d')
+        group_format = "CAST(YEAR(DATEADD(DAY, 26 - DATEPART(iso_week, c.reg_date), c.reg_date)) AS VARCHAR) + '-W' + RIGHT('0' + CAST(DATEPART(iso_week, c.reg_date) AS VARCHAR), 2)"
         conn = mssql_db.get_connection()
         if not conn:
             return jsonify({"error": "MSSQL 연결 실패"}), 500
 
         cursor = conn.cursor(as_dict=True)
 
-        # 분류 키워드
-        intro_keywords = ['소개', '소문', '내원환자', '직원']
-        search_keywords = ['네이버', '지도', '인터넷', '홈페이지', '검색', '블로그']
-        signboard_keywords = ['간판', '현수막', '근처']
-
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT {group_format} as period_key, c.SUGGEST, COUNT(DISTINCT c.Customer_PK) as cnt
             FROM Customer c
             JOIN Receipt r ON c.Customer_PK = r.Customer_PK
-            WHERE c.reg_date >= '{range_start}' AND c.reg_date < DATEADD(DAY, 1, '{range_end}')
-              AND CAST(r.TxDate AS DATE) = CAST(c.reg_date AS DATE)
+            WHERE {_date_range_sql('c.reg_date', 'range_start', 'range_end')}
+              AND {_same_day_sql('r.TxDate', 'CAST(c.reg_date AS DATE)')}
               AND r.CheongGu_Money > 0
               AND c.SUGGEST IS NOT NULL AND c.SUGGEST != ''
               AND NOT EXISTS (
@@ -4337,77 +4881,45 @@ def stats_visit_route_trend():
               )
             GROUP BY {group_format}, c.SUGGEST
             ORDER BY period_key
-        """)
+        """, {'range_start': range_start, 'range_end': range_end})
 
         raw_data = cursor.fetchall()
-        conn.close()
 
-        # 기간별 카테고리 집계
+        # 주별 카테고리 집계
         period_data = {}
-        if period == 'weekly':
-            for i in range(17, -1, -1):
-                week_sunday = end_sunday - timedelta(weeks=i)
-                week_monday = week_sunday - timedelta(days=6)
-                iso_year, iso_week, _ = week_monday.isocalendar()
-                period_key = f"{iso_year}-W{iso_week:02d}"
-                period_data[period_key] = {"intro": 0, "search": 0, "signboard": 0, "other": 0}
-        else:
-            for i in range(17, -1, -1):
-                month_date = add_months(end_date, -i)
-                month_label = month_date.strftime('%Y-%m')
-                period_data[month_label] = {"intro": 0, "search": 0, "signboard": 0, "other": 0}
+        for i in range(17, -1, -1):
+            week_sunday = end_sunday - timedelta(weeks=i)
+            week_monday = week_sunday - timedelta(days=6)
+            iso_year, iso_week, _ = week_monday.isocalendar()
+            period_key = f"{iso_year}-W{iso_week:02d}"
+            period_data[period_key] = {"intro": 0, "search": 0, "signboard": 0, "other": 0}
 
         for item in raw_data:
             pk = item['period_key']
-            suggest = item['SUGGEST'] or ''
-            cnt = item['cnt'] or 0
-
             if pk not in period_data:
                 continue
-
-            if any(kw in suggest for kw in intro_keywords):
-                period_data[pk]["intro"] += cnt
-            elif any(kw in suggest for kw in search_keywords):
-                period_data[pk]["search"] += cnt
-            elif any(kw in suggest for kw in signboard_keywords):
-                period_data[pk]["signboard"] += cnt
-            else:
-                period_data[pk]["other"] += cnt
+            period_data[pk][_classify_visit_route(item['SUGGEST'])] += item['cnt'] or 0
 
         # 결과 배열 생성
         result = []
-        if period == 'weekly':
-            for i in range(17, -1, -1):
-                week_sunday = end_sunday - timedelta(weeks=i)
-                week_monday = week_sunday - timedelta(days=6)
-                iso_year, iso_week, _ = week_monday.isocalendar()
-                period_key = f"{iso_year}-W{iso_week:02d}"
-                week_label = week_monday.strftime('%m/%d')
-                data = period_data.get(period_key, {"intro": 0, "search": 0, "signboard": 0, "other": 0})
-                result.append({
-                    "month": week_label,
-                    "intro": data["intro"],
-                    "search": data["search"],
-                    "signboard": data["signboard"],
-                    "other": data["other"],
-                    "total": data["intro"] + data["search"] + data["signboard"] + data["other"]
-                })
-        else:
-            for i in range(17, -1, -1):
-                month_date = add_months(end_date, -i)
-                month_label = month_date.strftime('%Y-%m')
-                data = period_data.get(month_label, {"intro": 0, "search": 0, "signboard": 0, "other": 0})
-                result.append({
-                    "month": month_label,
-                    "intro": data["intro"],
-                    "search": data["search"],
-                    "signboard": data["signboard"],
-                    "other": data["other"],
-                    "total": data["intro"] + data["search"] + data["signboard"] + data["other"]
-                })
+        for i in range(17, -1, -1):
+            week_sunday = end_sunday - timedelta(weeks=i)
+            week_monday = week_sunday - timedelta(days=6)
+            iso_year, iso_week, _ = week_monday.isocalendar()
+            period_key = f"{iso_year}-W{iso_week:02d}"
+            week_label = week_monday.strftime('%m/%d')
+            data = period_data.get(period_key, {"intro": 0, "search": 0, "signboard": 0, "other": 0})
+            result.append({
+                "month": week_label,
+                "intro": data["intro"],
+                "search": data["search"],
+                "signboard": data["signboard"],
+                "other": data["other"],
+                "total": data["intro"] + data["search"] + data["signboard"] + data["other"]
+            })
 
         return jsonify({
-            "end_date": end_date.strftime('%Y-%m-%d') if period == 'weekly' else end_date.strftime('%Y-%m'),
+            "end_date": end_date.strftime('%Y-%m-%d'),
             "period": period,
             "data": result
         })
@@ -4415,11 +4927,16 @@ def stats_visit_route_trend():
     except Exception as e:
         mssql_db.log(f"침초진추이 오류: {str(e)}")
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 @mssql_bp.route('/api/stats/chim-patient-trend')
+@_cached_stats('trend')
 def stats_chim_patient_trend():
     """침환자 18개월/18주 추이 API - 평환/침초진+재초진/자보초진+재초진 추이"""
+    conn = None
     try:
         from datetime import datetime as dt, timedelta
         import calendar
@@ -4468,10 +4985,10 @@ def stats_chim_patient_trend():
                 before_period = (month_date - timedelta(days=1)).strftime('%Y-%m-%d')
 
             # 1. 평환 (일평균 침환자수)
-            cursor.execute(f"""
+            mssql_db.execute(cursor, f"""
                 SELECT COUNT(DISTINCT CONCAT(r.Customer_PK, '_', CAST(r.TxDate AS DATE))) as total_visits
                 FROM Receipt r
-                WHERE CAST(r.TxDate AS DATE) BETWEEN '{period_start}' AND '{period_end}'
+                WHERE {_date_range_sql('r.TxDate', 'period_start', 'period_end')}
                   AND (
                     ISNULL(r.CheongGu_Money, 0) > 0
                     OR EXISTS (
@@ -4479,78 +4996,78 @@ def stats_chim_patient_trend():
                       WHERE ci.custpk = r.Customer_PK
                     )
                   )
-            """)
+            """, {'period_start': period_start, 'period_end': period_end})
             total_visits = cursor.fetchone()['total_visits'] or 0
 
             # 해당 기간 영업일수
-            cursor.execute(f"""
+            mssql_db.execute(cursor, f"""
                 SELECT COUNT(DISTINCT CAST(TxDate AS DATE)) as work_days
                 FROM Receipt
-                WHERE CAST(TxDate AS DATE) BETWEEN '{period_start}' AND '{period_end}'
-            """)
+                WHERE {_date_range_sql('TxDate', 'period_start', 'period_end')}
+            """, {'period_start': period_start, 'period_end': period_end})
             work_days = cursor.fetchone()['work_days'] or 1
             avg_daily = round(total_visits / work_days, 1)
 
             # 2. 침 초진 (건보)
-            cursor.execute(f"""
+            mssql_db.execute(cursor, f"""
                 SELECT COUNT(DISTINCT c.Customer_PK) as cnt
                 FROM Customer c
                 JOIN Receipt r ON c.Customer_PK = r.Customer_PK
-                WHERE CAST(c.reg_date AS DATE) BETWEEN '{period_start}' AND '{period_end}'
-                  AND CAST(r.TxDate AS DATE) = CAST(c.reg_date AS DATE)
+                WHERE {_date_range_sql('c.reg_date', 'period_start', 'period_end')}
+                  AND {_same_day_sql('r.TxDate', 'CAST(c.reg_date AS DATE)')}
                   AND r.CheongGu_Money > 0
                   AND NOT EXISTS (
                       SELECT 1 FROM custcarinsuinfo ci
                       WHERE ci.custpk = c.Customer_PK
                   )
-            """)
+            """, {'period_start': period_start, 'period_end': period_end})
             chim_chojin = cursor.fetchone()['cnt'] or 0
 
             # 3. 침 재초진 (건보)
-            cursor.execute(f"""
+            mssql_db.execute(cursor, f"""
                 SELECT COUNT(DISTINCT d.Customer_PK) as cnt
                 FROM Detail d
                 JOIN Customer c ON d.Customer_PK = c.Customer_PK
                 JOIN Receipt r ON d.Customer_PK = r.Customer_PK AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE)
-                WHERE CAST(d.TxDate AS DATE) BETWEEN '{period_start}' AND '{period_end}'
-                  AND CAST(c.reg_date AS DATE) <= '{before_period}'
+                WHERE {_date_range_sql('d.TxDate', 'period_start', 'period_end')}
+                  AND c.reg_date < %(period_start)s
                   AND d.PxName = N'진찰료(초진)'
                   AND ISNULL(r.CheongGu_Money, 0) > 0
                   AND NOT EXISTS (
                     SELECT 1 FROM custcarinsuinfo ci
                     WHERE ci.custpk = d.Customer_PK
                   )
-            """)
+            """, {'period_start': period_start, 'period_end': period_end})
             chim_rechojin = cursor.fetchone()['cnt'] or 0
 
             # 4. 자보 초진
-            cursor.execute(f"""
+            mssql_db.execute(cursor, f"""
                 SELECT COUNT(DISTINCT c.Customer_PK) as cnt
                 FROM Customer c
-                WHERE CAST(c.reg_date AS DATE) BETWEEN '{period_start}' AND '{period_end}'
+                WHERE {_date_range_sql('c.reg_date', 'period_start', 'period_end')}
                   AND EXISTS (
                       SELECT 1 FROM custcarinsuinfo ci
                       WHERE ci.custpk = c.Customer_PK
                   )
-            """)
+            """, {'period_start': period_start, 'period_end': period_end})
             jabo_chojin = cursor.fetchone()['cnt'] or 0
 
             # 5. 자보 재초진
-            cursor.execute(f"""
+            mssql_db.execute(cursor, f"""
                 WITH PeriodJabo AS (
                     SELECT DISTINCT d.Customer_PK, d.사고번호
                     FROM Detail d
                     JOIN Customer c ON d.Customer_PK = c.Customer_PK
                     WHERE d.TxItem LIKE '%자동차보험%'
-                      AND CAST(d.TxDate AS DATE) BETWEEN '{period_start}' AND '{period_end}'
-                      AND CAST(c.reg_date AS DATE) <= '{before_period}'
+                      AND {_date_range_sql('d.TxDate', 'period_start', 'period_end')}
+                      AND c.reg_date < %(period_start)s
                       AND d.사고번호 IS NOT NULL AND d.사고번호 != ''
                 ),
                 PreviousAccidents AS (
                     SELECT DISTINCT d.Customer_PK, d.사고번호
                     FROM Detail d
                     WHERE d.TxItem LIKE '%자동차보험%'
-                      AND CAST(d.TxDate AS DATE) <= '{before_period}'
+                      AND d.TxDate < %(period_start)s
                       AND d.사고번호 IS NOT NULL AND d.사고번호 != ''
                 )
                 SELECT COUNT(DISTINCT pj.Customer_PK) as cnt
@@ -4559,7 +5076,7 @@ def stats_chim_patient_trend():
                     SELECT 1 FROM PreviousAccidents pa
                     WHERE pa.Customer_PK = pj.Customer_PK AND pa.사고번호 = pj.사고번호
                 )
-            """)
+            """, {'period_start': period_start, 'period_end': period_end})
             jabo_rechojin = cursor.fetchone()['cnt'] or 0
 
             result.append({
@@ -4573,7 +5090,6 @@ def stats_chim_patient_trend():
                 "jabo_total": jabo_chojin + jabo_rechojin
             })
 
-        conn.close()
 
         return jsonify({
             "end_date": end_date.strftime('%Y-%m-%d') if period == 'weekly' else end_date.strftime('%Y-%m'),
@@ -4584,9 +5100,13 @@ def stats_chim_patient_trend():
     except Exception as e:
         mssql_db.log(f"침환자추이 오류: {str(e)}")
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 @mssql_bp.route('/api/stats/yak-chojin-detail')
+@_cached_stats()
 def stats_yak_chojin_detail():
     """약초진 상세 통계 API - 원장별 약초진 분류
 
@@ -4597,6 +5117,7 @@ def stats_yak_chojin_detail():
     - 소개-담당: 신규환자 + 소개 + 소개자의 담당원장이 진료원장과 동일
     - 소개-다른: 신규환자 + 소개 + 소개자의 담당원장이 진료원장과 다름
     """
+    conn = None
     try:
         period = request.args.get('period', 'daily')
         target_date = request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
@@ -4615,7 +5136,7 @@ def stats_yak_chojin_detail():
         # 약 관련 PxName: 한약%, 공진단%, 경옥고%, 녹용추가%, 린다%, 슬림환%, 치료약, 종합진료비, 재처방, 내원상담
         # 제외: 상비약, 감기약, 자운고, 상용환, 보완처방 (약상담 불필요)
         # 분류: 약 구입일 기준 해당 원장에게 이전 진료 이력이 있으면 "기존", 없으면 "신규"
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT
                 c.Customer_PK,
                 c.sn as chart_no,
@@ -4635,7 +5156,7 @@ def stats_yak_chojin_detail():
                    AND d3.TxDoctor = d.TxDoctor) as first_visit_date
             FROM Customer c
             INNER JOIN Detail d ON c.Customer_PK = d.Customer_PK
-            WHERE CAST(d.TxDate AS DATE) >= '{start_date}' AND CAST(d.TxDate AS DATE) < DATEADD(DAY, 1, '{end_date}')
+            WHERE {_date_range_sql('d.TxDate')}
               AND d.TxItem NOT LIKE '%자동차보험%'
               AND d.TxDoctor IS NOT NULL AND d.TxDoctor != ''
               AND d.InsuYes = 0
@@ -4654,8 +5175,8 @@ def stats_yak_chojin_detail():
               AND NOT EXISTS (
                 SELECT 1 FROM Detail d2
                 WHERE d2.Customer_PK = c.Customer_PK
-                  AND CAST(d2.TxDate AS DATE) < '{start_date}'
-                  AND CAST(d2.TxDate AS DATE) >= DATEADD(MONTH, -6, '{start_date}')
+                  AND d2.TxDate < %(start_date)s
+                  AND d2.TxDate >= DATEADD(MONTH, -6, %(start_date)s)
                   AND d2.InsuYes = 0
                   AND (
                       d2.PxName LIKE '한약%'
@@ -4671,7 +5192,7 @@ def stats_yak_chojin_detail():
                   )
               )
             GROUP BY c.Customer_PK, c.sn, c.NAME, c.MAINDOCTOR, c.SUGGEST, c.suggcustPK, c.CustURL, c.regFamily, c.reg_date, d.TxDoctor
-        """)
+        """, {'start_date': start_date, 'end_date': end_date})
         all_yak_patients = cursor.fetchall()
 
         # 소개자 정보 수집을 위한 데이터 준비 (신규 환자 분류용)
@@ -4718,35 +5239,36 @@ def stats_yak_chojin_detail():
         # 소개자의 담당원장 조회 (Customer_PK로)
         referrer_main_doctors_by_pk = {}
         if referrer_pks:
-            pks_str = ','.join([str(pk) for pk in referrer_pks])
-            cursor.execute(f"SELECT Customer_PK, MAINDOCTOR FROM Customer WHERE Customer_PK IN ({pks_str})")
+            placeholders = ','.join(['%s'] * len(referrer_pks))
+            cursor.execute(f"SELECT Customer_PK, MAINDOCTOR FROM Customer WHERE Customer_PK IN ({placeholders})",
+                           tuple(referrer_pks))
             for row in cursor.fetchall():
                 referrer_main_doctors_by_pk[row['Customer_PK']] = row['MAINDOCTOR'] or ''
 
         # 소개자의 담당원장 조회 (차트번호로)
         referrer_main_doctors_by_sn = {}
         if referrer_charts:
-            charts_str = ','.join([f"'{c}'" for c in referrer_charts])
-            cursor.execute(f"SELECT sn, MAINDOCTOR FROM Customer WHERE sn IN ({charts_str})")
+            placeholders = ','.join(['%s'] * len(referrer_charts))
+            cursor.execute(f"SELECT sn, MAINDOCTOR FROM Customer WHERE sn IN ({placeholders})",
+                           tuple(referrer_charts))
             for row in cursor.fetchall():
                 referrer_main_doctors_by_sn[row['sn']] = row['MAINDOCTOR'] or ''
 
         # 가족 중 먼저 등록된 환자의 담당원장 조회 (regFamily로)
         family_main_doctors = {}
         if family_pks:
-            pks_str = ','.join([str(pk) for pk in family_pks])
+            placeholders = ','.join(['%s'] * len(family_pks))
             cursor.execute(f"""
                 SELECT regFamily, MAINDOCTOR, reg_date
                 FROM Customer
-                WHERE regFamily IN ({pks_str})
+                WHERE regFamily IN ({placeholders})
                 ORDER BY regFamily, reg_date ASC
-            """)
+            """, tuple(family_pks))
             for row in cursor.fetchall():
                 reg_fam = row['regFamily']
                 if reg_fam not in family_main_doctors:
                     family_main_doctors[reg_fam] = row['MAINDOCTOR'] or ''
 
-        conn.close()
 
         # 원장별 분류 집계
         doctors_set = set()
@@ -4863,9 +5385,13 @@ def stats_yak_chojin_detail():
         import traceback
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 @mssql_bp.route('/api/stats/yak-chojin-raw')
+@_cached_stats()
 def stats_yak_chojin_raw():
     """약초진 Raw Data API - 환자 목록 반환
 
@@ -4874,6 +5400,7 @@ def stats_yak_chojin_raw():
     - doctor: 원장명 (선택, 없으면 전체)
     - category: 분류 (existing_same, existing_other, new_direct, referral_same, referral_other)
     """
+    conn = None
     try:
         period = request.args.get('period', 'daily')
         target_date = request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
@@ -4896,7 +5423,7 @@ def stats_yak_chojin_raw():
         # 모든 약초진 환자 조회 (조회기간 내 약 구입 + 최근 6개월 내 약상담 이력 없음)
         # 분류: 약 구입일 기준 해당 원장에게 이전 진료 이력이 있으면 "기존", 없으면 "신규"
         # 같은 환자는 월 내 1회로만 카운트 (첫 번째 날짜 사용)
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT
                 c.Customer_PK,
                 c.sn as chart_no,
@@ -4918,7 +5445,7 @@ def stats_yak_chojin_raw():
                 STRING_AGG(d.PxName + '(' + CAST(d.TxMoney AS VARCHAR) + '원)', ', ') as items
             FROM Customer c
             INNER JOIN Detail d ON c.Customer_PK = d.Customer_PK
-            WHERE CAST(d.TxDate AS DATE) >= '{start_date}' AND CAST(d.TxDate AS DATE) < DATEADD(DAY, 1, '{end_date}')
+            WHERE {_date_range_sql('d.TxDate')}
               AND d.TxItem NOT LIKE '%자동차보험%'
               AND d.TxDoctor IS NOT NULL AND d.TxDoctor != ''
               AND d.InsuYes = 0
@@ -4937,8 +5464,8 @@ def stats_yak_chojin_raw():
               AND NOT EXISTS (
                 SELECT 1 FROM Detail d2
                 WHERE d2.Customer_PK = c.Customer_PK
-                  AND CAST(d2.TxDate AS DATE) < '{start_date}'
-                  AND CAST(d2.TxDate AS DATE) >= DATEADD(MONTH, -6, '{start_date}')
+                  AND d2.TxDate < %(start_date)s
+                  AND d2.TxDate >= DATEADD(MONTH, -6, %(start_date)s)
                   AND d2.InsuYes = 0
                   AND (
                       d2.PxName LIKE '한약%'
@@ -4955,7 +5482,7 @@ def stats_yak_chojin_raw():
               )
             GROUP BY c.Customer_PK, c.sn, c.NAME, c.MAINDOCTOR, c.SUGGEST, c.suggcustPK, c.suggcustnamesn, c.CustURL, c.regFamily, c.reg_date, d.TxDoctor
             ORDER BY MIN(d.TxDate), c.sn
-        """)
+        """, {'start_date': start_date, 'end_date': end_date})
         all_yak_patients = cursor.fetchall()
 
         # 기존/신규 판단을 위한 기준일 설정
@@ -5013,8 +5540,9 @@ def stats_yak_chojin_raw():
         # 소개자 정보 조회 (Customer_PK로)
         referrer_info_by_pk = {}
         if referrer_pks:
-            pks_str = ','.join([str(pk) for pk in referrer_pks])
-            cursor.execute(f"SELECT Customer_PK, sn, NAME, MAINDOCTOR FROM Customer WHERE Customer_PK IN ({pks_str})")
+            placeholders = ','.join(['%s'] * len(referrer_pks))
+            cursor.execute(f"SELECT Customer_PK, sn, NAME, MAINDOCTOR FROM Customer WHERE Customer_PK IN ({placeholders})",
+                           tuple(referrer_pks))
             for row in cursor.fetchall():
                 referrer_info_by_pk[row['Customer_PK']] = {
                     'name': row['NAME'] or '',
@@ -5025,8 +5553,9 @@ def stats_yak_chojin_raw():
         # 소개자 정보 조회 (차트번호로)
         referrer_info_by_sn = {}
         if referrer_charts:
-            charts_str = ','.join([f"'{c}'" for c in referrer_charts])
-            cursor.execute(f"SELECT sn, NAME, MAINDOCTOR FROM Customer WHERE sn IN ({charts_str})")
+            placeholders = ','.join(['%s'] * len(referrer_charts))
+            cursor.execute(f"SELECT sn, NAME, MAINDOCTOR FROM Customer WHERE sn IN ({placeholders})",
+                           tuple(referrer_charts))
             for row in cursor.fetchall():
                 referrer_info_by_sn[row['sn']] = {
                     'name': row['NAME'] or '',
@@ -5038,8 +5567,9 @@ def stats_yak_chojin_raw():
         referrer_info_by_name = {}
         if referrer_names:
             # 이름이 포함된 환자 검색 (LIKE 검색)
-            name_conditions = ' OR '.join([f"NAME LIKE '%{n}%'" for n in referrer_names])
-            cursor.execute(f"SELECT sn, NAME, MAINDOCTOR FROM Customer WHERE {name_conditions}")
+            name_conditions = ' OR '.join(['NAME LIKE %s'] * len(referrer_names))
+            cursor.execute(f"SELECT sn, NAME, MAINDOCTOR FROM Customer WHERE {name_conditions}",
+                           tuple(f"%{n}%" for n in referrer_names))
             for row in cursor.fetchall():
                 name = row['NAME'] or ''
                 if name not in referrer_info_by_name:
@@ -5052,14 +5582,14 @@ def stats_yak_chojin_raw():
         # 가족 중 먼저 등록된 환자 조회 (regFamily로)
         family_referrer_info = {}
         if family_pks:
-            pks_str = ','.join([str(pk) for pk in family_pks])
+            placeholders = ','.join(['%s'] * len(family_pks))
             # regFamily가 같은 환자 중 가장 먼저 등록된 환자 (본인 제외)
             cursor.execute(f"""
                 SELECT regFamily, sn, NAME, MAINDOCTOR, reg_date
                 FROM Customer
-                WHERE regFamily IN ({pks_str})
+                WHERE regFamily IN ({placeholders})
                 ORDER BY regFamily, reg_date ASC
-            """)
+            """, tuple(family_pks))
             for row in cursor.fetchall():
                 reg_fam = row['regFamily']
                 if reg_fam not in family_referrer_info:
@@ -5177,7 +5707,6 @@ def stats_yak_chojin_raw():
                     patient_data['referrer'] = {'name': '', 'chart_no': '', 'main_doctor': '', 'suggest': suggest, 'cust_url': cust_url}
                 patients.append(patient_data)
 
-        conn.close()
 
         return jsonify({
             "period": period,
@@ -5194,11 +5723,16 @@ def stats_yak_chojin_raw():
         import traceback
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 @mssql_bp.route('/api/stats/yak-chojin-trend')
+@_cached_stats('trend')
 def stats_yak_chojin_trend():
     """약초진 18개월/18주 추이 API - 신규/소개/기존 추이"""
+    conn = None
     try:
         from datetime import datetime as dt, timedelta
         import calendar
@@ -5242,7 +5776,7 @@ def stats_yak_chojin_trend():
         else:
             period_select = "FORMAT(MIN(CAST(d.TxDate AS DATE)), 'yyyy-MM') as period_key"
 
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT
                 c.Customer_PK,
                 c.SUGGEST as suggest,
@@ -5259,7 +5793,7 @@ def stats_yak_chojin_trend():
                    AND d3.TxDoctor = d.TxDoctor) as first_visit_date
             FROM Customer c
             INNER JOIN Detail d ON c.Customer_PK = d.Customer_PK
-            WHERE CAST(d.TxDate AS DATE) >= '{range_start}' AND CAST(d.TxDate AS DATE) <= '{range_end}'
+            WHERE {_date_range_sql('d.TxDate', 'range_start', 'range_end')}
               AND d.TxItem NOT LIKE '%자동차보험%'
               AND d.TxDoctor IS NOT NULL AND d.TxDoctor != ''
               AND d.InsuYes = 0
@@ -5278,8 +5812,8 @@ def stats_yak_chojin_trend():
               AND NOT EXISTS (
                 SELECT 1 FROM Detail d2
                 WHERE d2.Customer_PK = c.Customer_PK
-                  AND CAST(d2.TxDate AS DATE) < CAST(d.TxDate AS DATE)
-                  AND CAST(d2.TxDate AS DATE) >= DATEADD(MONTH, -6, CAST(d.TxDate AS DATE))
+                  AND d2.TxDate < CAST(d.TxDate AS DATE)
+                  AND d2.TxDate >= DATEADD(MONTH, -6, CAST(d.TxDate AS DATE))
                   AND d2.InsuYes = 0
                   AND (
                       d2.PxName LIKE '한약%'
@@ -5295,7 +5829,7 @@ def stats_yak_chojin_trend():
                   )
               )
             GROUP BY c.Customer_PK, c.SUGGEST, c.suggcustPK, c.CustURL, c.regFamily, c.reg_date, d.TxDoctor
-        """)
+        """, {'range_start': range_start, 'range_end': range_end})
         all_yak_patients = cursor.fetchall()
 
         # 소개자 정보 조회를 위한 PK 수집
@@ -5321,27 +5855,27 @@ def stats_yak_chojin_trend():
         referrer_doctors = {}
         if referrer_pks or referrer_charts or family_pks:
             conditions = []
+            lookup_params = []
             if referrer_pks:
-                pks_str = ','.join(str(pk) for pk in referrer_pks)
-                conditions.append(f"Customer_PK IN ({pks_str})")
+                conditions.append(f"Customer_PK IN ({','.join(['%s'] * len(referrer_pks))})")
+                lookup_params.extend(referrer_pks)
             if referrer_charts:
-                charts_str = ','.join(f"'{c}'" for c in referrer_charts)
-                conditions.append(f"sn IN ({charts_str})")
+                conditions.append(f"sn IN ({','.join(['%s'] * len(referrer_charts))})")
+                lookup_params.extend(referrer_charts)
             if family_pks:
-                fpks_str = ','.join(str(pk) for pk in family_pks)
-                conditions.append(f"Customer_PK IN ({fpks_str})")
+                conditions.append(f"Customer_PK IN ({','.join(['%s'] * len(family_pks))})")
+                lookup_params.extend(family_pks)
 
             cursor.execute(f"""
                 SELECT Customer_PK, sn, MAINDOCTOR
                 FROM Customer
                 WHERE {' OR '.join(conditions)}
-            """)
+            """, tuple(lookup_params))
             for row in cursor.fetchall():
                 referrer_doctors[row['Customer_PK']] = row['MAINDOCTOR']
                 if row['sn']:
                     referrer_doctors[f"sn_{row['sn']}"] = row['MAINDOCTOR']
 
-        conn.close()
 
         # 소개 키워드
         intro_keywords = ['소개', '소문', '내원환자', '직원', '가족']
@@ -5434,11 +5968,16 @@ def stats_yak_chojin_trend():
         import traceback
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 @mssql_bp.route('/api/stats/uncovered-trend')
+@_cached_stats('trend')
 def stats_uncovered_trend():
     """비급여 18개월/18주 추이 API - 카테고리별 매출 추이"""
+    conn = None
     try:
         from datetime import timedelta
 
@@ -5446,30 +5985,23 @@ def stats_uncovered_trend():
         period = request.args.get('period', 'monthly')
         end_date = datetime.strptime(end_date_str[:10], '%Y-%m-%d')
 
-        # 월 계산 헬퍼 함수
-        def add_months(date, months):
-            month = date.month - 1 + months
-            year = date.year + month // 12
-            month = month % 12 + 1
-            day = min(date.day, [31,29 if year%4==0 and (year%100!=0 or year%400==0) else 28,31,30,31,30,31,31,30,31,30,31][month-1])
-            return date.replace(year=year, month=month, day=day)
+        if period != 'weekly':
+            # 월간: 마감 월은 롤업에서, 이번 달만 계산
+            trends, _ = _monthly_trends(end_date, ["uncovered"])
+            return jsonify({
+                "end_date": end_date.strftime('%Y-%m'),
+                "period": period,
+                "data": trends["uncovered"]
+            })
 
-        if period == 'weekly':
-            # 해당 주의 일요일로 이동
-            days_until_sunday = 6 - end_date.weekday()
-            end_sunday = end_date + timedelta(days=days_until_sunday)
-            # 18주 전 월요일
-            start_monday = end_sunday - timedelta(weeks=17, days=6)
-            range_start = start_monday.strftime('%Y-%m-%d')
-            range_end = end_sunday.strftime('%Y-%m-%d')
-            group_format = "CAST(YEAR(DATEADD(DAY, 26 - DATEPART(iso_week, d.TxDate), d.TxDate)) AS VARCHAR) + '-W' + RIGHT('0' + CAST(DATEPART(iso_week, d.TxDate) AS VARCHAR), 2)"
-        else:
-            start_date = add_months(end_date, -17)
-            start_date = start_date.replace(day=1)
-            range_start = start_date.strftime('%Y-%m-%d')
-            next_month = add_months(end_date.replace(day=1), 1)
-            range_end = (next_month - timedelta(days=1)).strftime('%Y-%m-%d')
-            group_format = "FORMAT(d.TxDate, 'yyyy-MM')"
+        # 해당 주의 일요일로 이동
+        days_until_sunday = 6 - end_date.weekday()
+        end_sunday = end_date + timedelta(days=days_until_sunday)
+        # 18주 전 월요일
+        start_monday = end_sunday - timedelta(weeks=17, days=6)
+        range_start = start_monday.strftime('%Y-%m-%d')
+        range_end = end_sunday.strftime('%Y-%m-%d')
+        group_format = "CAST(YEAR(DATEADD(DAY, 26 - DATEPART(iso_week, d.TxDate), d.TxDate)) AS VARCHAR) + '-W' + RIGHT('0' + CAST(DATEPART(iso_week, d.TxDate) AS VARCHAR), 2)"
         conn = mssql_db.get_connection()
         if not conn:
             return jsonify({"error": "MSSQL 연결 실패"}), 500
@@ -5477,7 +6009,7 @@ def stats_uncovered_trend():
         cursor = conn.cursor(as_dict=True)
 
         # 비급여 매출 데이터 조회 (Detail 테이블에서 InsuYes=0)
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT
                 {group_format} as period_key,
                 d.PxName,
@@ -5485,118 +6017,46 @@ def stats_uncovered_trend():
             FROM Detail d
             WHERE d.InsuYes = 0
               AND ISNULL(d.TxMoney, 0) > 0
-              AND CAST(d.TxDate AS DATE) >= '{range_start}'
-              AND CAST(d.TxDate AS DATE) <= '{range_end}'
+              AND {_date_range_sql('d.TxDate', 'range_start', 'range_end')}
             GROUP BY {group_format}, d.PxName
             ORDER BY period_key
-        """)
+        """, {'range_start': range_start, 'range_end': range_end})
 
         rows = cursor.fetchall()
-        conn.close()
 
-        # 기간별 카테고리별 데이터 집계
+        # 주별 카테고리별 데이터 집계
         period_data = {}
-        if period == 'weekly':
-            for i in range(17, -1, -1):
-                week_sunday = end_sunday - timedelta(weeks=i)
-                week_monday = week_sunday - timedelta(days=6)
-                iso_year, iso_week, _ = week_monday.isocalendar()
-                period_key = f"{iso_year}-W{iso_week:02d}"
-                period_data[period_key] = {
-                    "맞춤한약": 0, "녹용": 0, "공진단": 0, "경옥고": 0,
-                    "상비한약": 0, "약침": 0, "다이어트": 0
-                }
-        else:
-            for i in range(17, -1, -1):
-                month_date = add_months(end_date, -i)
-                month_label = month_date.strftime('%Y-%m')
-                period_data[month_label] = {
-                    "맞춤한약": 0, "녹용": 0, "공진단": 0, "경옥고": 0,
-                    "상비한약": 0, "약침": 0, "다이어트": 0
-                }
-
-        # 카테고리 분류 함수
-        def categorize_uncovered(px_name):
-            if not px_name:
-                return None
-            name = px_name.strip()
-
-            # 경옥고 (경옥고, 경옥환, 녹용경옥고, 녹용경옥환) - 녹용보다 먼저 체크
-            if '경옥고' in name or '경옥환' in name:
-                return "경옥고"
-            # 녹용 (경옥고 제외 후)
-            if '녹용' in name:
-                return "녹용"
-            # 공진단
-            if '공진단' in name:
-                return "공진단"
-            # 약침
-            if '약침' in name or name in ['봉침', '자하거', '태반주사', '신바로']:
-                return "약침"
-            # 다이어트
-            if any(d in name for d in ['린다프리미엄', '린다스탠다드', '린다스페셜', '린다환', '린디톡스', '슬림환', '체감탕']):
-                return "다이어트"
-            # 상비한약 (상비약, 감기약, 치료약, 자운고, 상용환)
-            if any(kw in name for kw in ['상비약', '감기약', '치료약', '자운고', '상용환']):
-                return "상비한약"
-            # 맞춤한약 (탕약, 환, 처방 등)
-            if any(kw in name for kw in ['탕', '환', '고', '산', '처방', '첩', '제', '약']):
-                if '공진단' not in name and '경옥고' not in name and '경옥환' not in name:
-                    return "맞춤한약"
-
-            return None
+        for i in range(17, -1, -1):
+            week_sunday = end_sunday - timedelta(weeks=i)
+            week_monday = week_sunday - timedelta(days=6)
+            iso_year, iso_week, _ = week_monday.isocalendar()
+            period_key = f"{iso_year}-W{iso_week:02d}"
+            period_data[period_key] = {cat: 0 for cat in _UNCOVERED_CATEGORIES}
 
-        # 데이터 집계
         for row in rows:
             pk = row['period_key']
-            px_name = row['PxName']
-            amount = row['amount'] or 0
-
             if pk not in period_data:
                 continue
 
-            category = categorize_uncovered(px_name)
+            category = _categorize_uncovered(row['PxName'])
             if category and category in period_data[pk]:
-                period_data[pk][category] += amount
+                period_data[pk][category] += row['amount'] or 0
 
         # 결과 배열 생성
         result = []
-        if period == 'weekly':
-            for i in range(17, -1, -1):
-                week_sunday = end_sunday - timedelta(weeks=i)
-                week_monday = week_sunday - timedelta(days=6)
-                iso_year, iso_week, _ = week_monday.isocalendar()
-                period_key = f"{iso_year}-W{iso_week:02d}"
-                week_label = week_monday.strftime('%m/%d')
-                data = period_data.get(period_key, {})
-                result.append({
-                    "month": week_label,
-                    "맞춤한약": data.get("맞춤한약", 0),
-                    "녹용": data.get("녹용", 0),
-                    "공진단": data.get("공진단", 0),
-                    "경옥고": data.get("경옥고", 0),
-                    "상비한약": data.get("상비한약", 0),
-                    "약침": data.get("약침", 0),
-                    "다이어트": data.get("다이어트", 0)
-                })
-        else:
-            for i in range(17, -1, -1):
-                month_date = add_months(end_date, -i)
-                month_label = month_date.strftime('%Y-%m')
-                data = period_data.get(month_label, {})
-                result.append({
-                    "month": month_label,
-                    "맞춤한약": data.get("맞춤한약", 0),
-                    "녹용": data.get("녹용", 0),
-                    "공진단": data.get("공진단", 0),
-                    "경옥고": data.get("경옥고", 0),
-                    "상비한약": data.get("상비한약", 0),
-                    "약침": data.get("약침", 0),
-                    "다이어트": data.get("다이어트", 0)
-                })
+        for i in range(17, -1, -1):
+            week_sunday = end_sunday - timedelta(weeks=i)
+            week_monday = week_sunday - timedelta(days=6)
+            iso_year, iso_week, _ = week_monday.isocalendar()
+            period_key = f"{iso_year}-W{iso_week:02d}"
+            data = period_data.get(period_key, {})
+            result.append({
+                "month": week_monday.strftime('%m/%d'),
+                **{cat: data.get(cat, 0) for cat in _UNCOVERED_CATEGORIES}
+            })
 
         return jsonify({
-            "end_date": end_date.strftime('%Y-%m-%d') if period == 'weekly' else end_date.strftime('%Y-%m'),
+            "end_date": end_date.strftime('%Y-%m-%d'),
             "period": period,
             "data": result
         })
@@ -5606,369 +6066,42 @@ def stats_uncovered_trend():
         import traceback
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 @mssql_bp.route('/api/stats/all-trends')
+@_cached_stats('monthly')
 def stats_all_trends():
-    """통합 18개월 추이 API - 5개 추이 데이터를 하나의 DB 연결로 조회
+    """통합 18개월 추이 API - 5개 추이 데이터를 한번에 조회
+
+    마감된 월은 롤업 저장소(stats_rollup)에서 읽고 이번 달 등 저장되지 않은 월만 계산
+    (계산할 항목은 별도 연결에서 동시에 조회)
+
+    Query params:
+    - end_date: 기준일 (YYYY-MM-DD, 기본값: 현재)
+    - debug: 1이면 항목별 조회 시간(debug.timings_ms) 포함
 
     반환: revenue_trend, visit_route_trend, chim_patient_trend, yak_chojin_trend, uncovered_trend
     """
     try:
-        from datetime import datetime as dt, timedelta
-        import calendar
-
-        def add_months(date, months):
-            month = date.month - 1 + months
-            year = date.year + month // 12
-            month = month % 12 + 1
-            day = min(date.day, calendar.monthrange(year, month)[1])
-            return date.replace(year=year, month=month, day=day)
-
-        end_date_str = request.args.get('end_date', dt.now().strftime('%Y-%m-%d'))
-        end_date = dt.strptime(end_date_str[:7] + '-01', '%Y-%m-%d')
-
-        # 18개월 범위
-        start_month = add_months(end_date, -17)
-        range_start = start_month.strftime('%Y-%m-01')
-        next_month = add_months(end_date, 1)
-        range_end = (next_month - timedelta(days=1)).strftime('%Y-%m-%d')
-
-        conn = mssql_db.get_connection()
-        if not conn:
-            return jsonify({"error": "MSSQL 연결 실패"}), 500
-
-        cursor = conn.cursor(as_dict=True)
-
-        # ========== 1. 매출추이 (revenue_trend) ==========
-        # 1-1. 급여매출 (자보 제외)
-        cursor.execute(f"""
-            SELECT FORMAT(r.TxDate, 'yyyy-MM') as month,
-                   ISNULL(SUM(ISNULL(r.Bonin_Money, 0) + ISNULL(r.CheongGu_Money, 0)), 0) as insurance
-            FROM Receipt r
-            WHERE CAST(r.TxDate AS DATE) BETWEEN '{range_start}' AND '{range_end}'
-              AND NOT EXISTS (SELECT 1 FROM Detail d WHERE d.Customer_PK = r.Customer_PK
-                AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE) AND d.TxItem LIKE '%자동차보험%')
-            GROUP BY FORMAT(r.TxDate, 'yyyy-MM')
-        """)
-        insurance_by_month = {row['month']: int(row['insurance'] or 0) for row in cursor.fetchall()}
-
-        # 1-2. 추나매출 (자보 제외)
-        cursor.execute(f"""
-            SELECT FORMAT(d.TxDate, 'yyyy-MM') as month,
-                   ISNULL(SUM(ISNULL(d.TxMoney, 0)), 0) as chuna
-            FROM Detail d
-            WHERE CAST(d.TxDate AS DATE) BETWEEN '{range_start}' AND '{range_end}'
-              AND d.PxName LIKE '%추나%'
-              AND NOT EXISTS (SELECT 1 FROM Detail d2 WHERE d2.Customer_PK = d.Customer_PK
-                AND CAST(d2.TxDate AS DATE) = CAST(d.TxDate AS DATE) AND d2.TxItem LIKE '%자동차보험%')
-            GROUP BY FORMAT(d.TxDate, 'yyyy-MM')
-        """)
-        chuna_by_month = {row['month']: int(row['chuna'] or 0) for row in cursor.fetchall()}
-
-        # 1-3. 자보매출
-        cursor.execute(f"""
-            SELECT FORMAT(r.TxDate, 'yyyy-MM') as month,
-                   ISNULL(SUM(ISNULL(r.Bonin_Money, 0) + ISNULL(r.CheongGu_Money, 0) + ISNULL(r.General_Money, 0)), 0) as jabo
-            FROM Receipt r
-            WHERE CAST(r.TxDate AS DATE) BETWEEN '{range_start}' AND '{range_end}'
-              AND EXISTS (SELECT 1 FROM Detail d WHERE d.Customer_PK = r.Customer_PK
-                AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE) AND d.TxItem LIKE '%자동차보험%')
-            GROUP BY FORMAT(r.TxDate, 'yyyy-MM')
-        """)
-        jabo_by_month = {row['month']: int(row['jabo'] or 0) for row in cursor.fetchall()}
-
-        # 1-4. 비급여매출 (자보 제외)
-        cursor.execute(f"""
-            SELECT FORMAT(r.TxDate, 'yyyy-MM') as month,
-                   ISNULL(SUM(ISNULL(r.General_Money, 0)), 0) as uncovered
-            FROM Receipt r
-            WHERE CAST(r.TxDate AS DATE) BETWEEN '{range_start}' AND '{range_end}'
-              AND NOT EXISTS (SELECT 1 FROM Detail d WHERE d.Customer_PK = r.Customer_PK
-                AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE) AND d.TxItem LIKE '%자동차보험%')
-            GROUP BY FORMAT(r.TxDate, 'yyyy-MM')
-        """)
-        uncovered_by_month = {row['month']: int(row['uncovered'] or 0) for row in cursor.fetchall()}
-
-        # ========== 2. 침환자 유입추이 (visit_route_trend) ==========
-        intro_keywords = ['소개', '소문', '내원환자', '직원']
-        search_keywords = ['네이버', '지도', '인터넷', '홈페이지', '검색', '블로그']
-        signboard_keywords = ['간판', '현수막', '근처']
-
-        cursor.execute(f"""
-            SELECT FORMAT(c.reg_date, 'yyyy-MM') as month, c.SUGGEST, COUNT(DISTINCT c.Customer_PK) as cnt
-            FROM Customer c
-            JOIN Receipt r ON c.Customer_PK = r.Customer_PK
-            WHERE c.reg_date >= '{range_start}' AND c.reg_date < DATEADD(DAY, 1, '{range_end}')
-              AND CAST(r.TxDate AS DATE) = CAST(c.reg_date AS DATE)
-              AND r.CheongGu_Money > 0
-              AND c.SUGGEST IS NOT NULL AND c.SUGGEST != ''
-              AND NOT EXISTS (SELECT 1 FROM custcarinsuinfo ci WHERE ci.custpk = c.Customer_PK)
-            GROUP BY FORMAT(c.reg_date, 'yyyy-MM'), c.SUGGEST
-        """)
-        visit_route_raw = cursor.fetchall()
-
-        # ========== 3. 침환자현황 추이 (chim_patient_trend) ==========
-        # 월별 데이터 수집
-        chim_patient_data = {}
-        for i in range(17, -1, -1):
-            month_date = add_months(end_date, -i)
-            month_start = month_date.strftime('%Y-%m-01')
-            next_m = add_months(month_date, 1)
-            month_end = (next_m - timedelta(days=1)).strftime('%Y-%m-%d')
-            month_label = month_date.strftime('%Y-%m')
-
-            # 평환 (일평균)
-            cursor.execute(f"""
-                SELECT COUNT(DISTINCT CONCAT(r.Customer_PK, '_', CAST(r.TxDate AS DATE))) as total_visits
-                FROM Receipt r
-                WHERE CAST(r.TxDate AS DATE) BETWEEN '{month_start}' AND '{month_end}'
-                  AND (ISNULL(r.CheongGu_Money, 0) > 0
-                    OR EXISTS (SELECT 1 FROM custcarinsuinfo ci WHERE ci.custpk = r.Customer_PK))
-            """)
-            total_visits = cursor.fetchone()['total_visits'] or 0
-
-            cursor.execute(f"""
-                SELECT COUNT(DISTINCT CAST(TxDate AS DATE)) as work_days
-                FROM Receipt WHERE CAST(TxDate AS DATE) BETWEEN '{month_start}' AND '{month_end}'
-            """)
-            work_days = cursor.fetchone()['work_days'] or 1
-            avg_daily = round(total_visits / work_days, 1)
-
-            # 침 초진
-            cursor.execute(f"""
-                SELECT COUNT(DISTINCT c.Customer_PK) as cnt FROM Customer c
-                JOIN Receipt r ON c.Customer_PK = r.Customer_PK
-                WHERE CAST(c.reg_date AS DATE) BETWEEN '{month_start}' AND '{month_end}'
-                  AND CAST(r.TxDate AS DATE) = CAST(c.reg_date AS DATE) AND r.CheongGu_Money > 0
-                  AND NOT EXISTS (SELECT 1 FROM custcarinsuinfo ci WHERE ci.custpk = c.Customer_PK)
-            """)
-            chim_chojin = cursor.fetchone()['cnt'] or 0
-
-            # 침 재초진
-            cursor.execute(f"""
-                SELECT COUNT(DISTINCT d.Customer_PK) as cnt FROM Detail d
-                JOIN Customer c ON d.Customer_PK = c.Customer_PK
-                JOIN Receipt r ON d.Customer_PK = r.Customer_PK AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE)
-                WHERE CAST(d.TxDate AS DATE) BETWEEN '{month_start}' AND '{month_end}'
-                  AND CAST(c.reg_date AS DATE) < '{month_start}' AND d.PxName = N'진찰료(초진)'
-                  AND ISNULL(r.CheongGu_Money, 0) > 0
-                  AND NOT EXISTS (SELECT 1 FROM custcarinsuinfo ci WHERE ci.custpk = d.Customer_PK)
-            """)
-            chim_rechojin = cursor.fetchone()['cnt'] or 0
-
-            # 자보 초진
-            cursor.execute(f"""
-                SELECT COUNT(DISTINCT c.Customer_PK) as cnt FROM Customer c
-                WHERE CAST(c.reg_date AS DATE) BETWEEN '{month_start}' AND '{month_end}'
-                  AND EXISTS (SELECT 1 FROM custcarinsuinfo ci WHERE ci.custpk = c.Customer_PK)
-            """)
-            jabo_chojin = cursor.fetchone()['cnt'] or 0
-
-            # 자보 재초진
-            cursor.execute(f"""
-                WITH PeriodJabo AS (
-                    SELECT DISTINCT d.Customer_PK, d.사고번호 FROM Detail d
-                    JOIN Customer c ON d.Customer_PK = c.Customer_PK
-                    WHERE d.TxItem LIKE '%자동차보험%'
-                      AND CAST(d.TxDate AS DATE) BETWEEN '{month_start}' AND '{month_end}'
-                      AND CAST(c.reg_date AS DATE) < '{month_start}'
-                      AND d.사고번호 IS NOT NULL AND d.사고번호 != ''
-                ),
-                PreviousAccidents AS (
-                    SELECT DISTINCT d.Customer_PK, d.사고번호 FROM Detail d
-                    WHERE d.TxItem LIKE '%자동차보험%' AND CAST(d.TxDate AS DATE) < '{month_start}'
-                      AND d.사고번호 IS NOT NULL AND d.사고번호 != ''
-                )
-                SELECT COUNT(DISTINCT pj.Customer_PK) as cnt FROM PeriodJabo pj
-                WHERE NOT EXISTS (SELECT 1 FROM PreviousAccidents pa
-                    WHERE pa.Customer_PK = pj.Customer_PK AND pa.사고번호 = pj.사고번호)
-            """)
-            jabo_rechojin = cursor.fetchone()['cnt'] or 0
-
-            chim_patient_data[month_label] = {
-                "avg_daily": avg_daily,
-                "chim_total": chim_chojin + chim_rechojin,
-                "jabo_total": jabo_chojin + jabo_rechojin
-            }
-
-        # ========== 4. 약초진 추이 (yak_chojin_trend) ==========
-        cursor.execute(f"""
-            SELECT FORMAT(d.TxDate, 'yyyy-MM') as month,
-                   COUNT(DISTINCT d.Customer_PK) as cnt
-            FROM Detail d
-            JOIN Customer c ON d.Customer_PK = c.Customer_PK
-            WHERE CAST(d.TxDate AS DATE) BETWEEN '{range_start}' AND '{range_end}'
-              AND d.InsuYes = 0 AND ISNULL(d.TxMoney, 0) > 0
-              AND (d.PxName LIKE '한약%' OR d.PxName LIKE '공진단%' OR d.PxName LIKE '경옥고%'
-                   OR d.PxName LIKE '녹용추가%' OR d.PxName LIKE '린다%' OR d.PxName LIKE '슬림환%'
-                   OR d.PxName LIKE '%치료약%' OR d.PxName LIKE '%종합진료비%'
-                   OR d.PxName = '재처방' OR d.PxName = '내원상담')
-              AND NOT EXISTS (
-                  SELECT 1 FROM Detail d2
-                  WHERE d2.Customer_PK = d.Customer_PK
-                    AND CAST(d2.TxDate AS DATE) >= DATEADD(MONTH, -6, CAST(d.TxDate AS DATE))
-                    AND CAST(d2.TxDate AS DATE) < CAST(d.TxDate AS DATE)
-                    AND d2.InsuYes = 0 AND ISNULL(d2.TxMoney, 0) > 0
-                    AND (d2.PxName LIKE '한약%' OR d2.PxName LIKE '공진단%' OR d2.PxName LIKE '경옥고%'
-                         OR d2.PxName LIKE '녹용추가%' OR d2.PxName LIKE '린다%' OR d2.PxName LIKE '슬림환%'
-                         OR d2.PxName LIKE '%치료약%' OR d2.PxName LIKE '%종합진료비%'
-                         OR d2.PxName = '재처방' OR d2.PxName = '내원상담')
-              )
-            GROUP BY FORMAT(d.TxDate, 'yyyy-MM')
-        """)
-        yak_by_month_raw = cursor.fetchall()
-        yak_existing_by_month = {row['month']: row['cnt'] for row in yak_by_month_raw}
-
-        # 약초진 신규 (등록월 = 구입월)
-        cursor.execute(f"""
-            SELECT FORMAT(d.TxDate, 'yyyy-MM') as month, COUNT(DISTINCT d.Customer_PK) as cnt
-            FROM Detail d
-            JOIN Customer c ON d.Customer_PK = c.Customer_PK
-            WHERE CAST(d.TxDate AS DATE) BETWEEN '{range_start}' AND '{range_end}'
-              AND d.InsuYes = 0 AND ISNULL(d.TxMoney, 0) > 0
-              AND (d.PxName LIKE '한약%' OR d.PxName LIKE '공진단%' OR d.PxName LIKE '경옥고%'
-                   OR d.PxName LIKE '녹용추가%' OR d.PxName LIKE '린다%' OR d.PxName LIKE '슬림환%'
-                   OR d.PxName LIKE '%치료약%' OR d.PxName LIKE '%종합진료비%'
-                   OR d.PxName = '재처방' OR d.PxName = '내원상담')
-              AND FORMAT(c.reg_date, 'yyyy-MM') = FORMAT(d.TxDate, 'yyyy-MM')
-              AND NOT EXISTS (
-                  SELECT 1 FROM Detail d2
-                  WHERE d2.Customer_PK = d.Customer_PK
-                    AND CAST(d2.TxDate AS DATE) >= DATEADD(MONTH, -6, CAST(d.TxDate AS DATE))
-                    AND CAST(d2.TxDate AS DATE) < CAST(d.TxDate AS DATE)
-                    AND d2.InsuYes = 0 AND ISNULL(d2.TxMoney, 0) > 0
-                    AND (d2.PxName LIKE '한약%' OR d2.PxName LIKE '공진단%' OR d2.PxName LIKE '경옥고%'
-                         OR d2.PxName LIKE '녹용추가%' OR d2.PxName LIKE '린다%' OR d2.PxName LIKE '슬림환%'
-                         OR d2.PxName LIKE '%치료약%' OR d2.PxName LIKE '%종합진료비%'
-                         OR d2.PxName = '재처방' OR d2.PxName = '내원상담')
-              )
-            GROUP BY FORMAT(d.TxDate, 'yyyy-MM')
-        """)
-        yak_new_by_month = {row['month']: row['cnt'] for row in cursor.fetchall()}
-
-        # ========== 5. 비급여 추이 (uncovered_trend) ==========
-        cursor.execute(f"""
-            SELECT FORMAT(d.TxDate, 'yyyy-MM') as month, d.PxName, SUM(ISNULL(d.TxMoney, 0)) as amount
-            FROM Detail d
-            WHERE d.InsuYes = 0 AND ISNULL(d.TxMoney, 0) > 0
-              AND d.TxDate >= '{range_start}' AND d.TxDate < DATEADD(MONTH, 1, '{end_date.strftime('%Y-%m-01')}')
-            GROUP BY FORMAT(d.TxDate, 'yyyy-MM'), d.PxName
-        """)
-        uncovered_raw = cursor.fetchall()
-
-        conn.close()
-
-        # ========== 결과 조합 ==========
-        # 월별 초기화
-        months = []
-        for i in range(17, -1, -1):
-            month_date = add_months(end_date, -i)
-            months.append(month_date.strftime('%Y-%m'))
-
-        # 1. revenue_trend
-        revenue_trend = []
-        for m in months:
-            ins = insurance_by_month.get(m, 0)
-            chu = chuna_by_month.get(m, 0)
-            jab = jabo_by_month.get(m, 0)
-            unc = uncovered_by_month.get(m, 0)
-            revenue_trend.append({
-                "month": m, "insurance": ins, "chuna": chu, "jabo": jab,
-                "uncovered": unc, "total": ins + jab + unc
-            })
-
-        # 2. visit_route_trend
-        visit_route_monthly = {m: {"intro": 0, "search": 0, "signboard": 0, "other": 0} for m in months}
-        for item in visit_route_raw:
-            m = item['month']
-            suggest = item['SUGGEST'] or ''
-            cnt = item['cnt'] or 0
-            if m not in visit_route_monthly:
-                continue
-            if any(kw in suggest for kw in intro_keywords):
-                visit_route_monthly[m]["intro"] += cnt
-            elif any(kw in suggest for kw in search_keywords):
-                visit_route_monthly[m]["search"] += cnt
-            elif any(kw in suggest for kw in signboard_keywords):
-                visit_route_monthly[m]["signboard"] += cnt
-            else:
-                visit_route_monthly[m]["other"] += cnt
-
-        visit_route_trend = []
-        for m in months:
-            d = visit_route_monthly[m]
-            visit_route_trend.append({
-                "month": m, "intro": d["intro"], "search": d["search"],
-                "signboard": d["signboard"], "other": d["other"],
-                "total": d["intro"] + d["search"] + d["signboard"] + d["other"]
-            })
-
-        # 3. chim_patient_trend
-        chim_patient_trend = []
-        for m in months:
-            d = chim_patient_data.get(m, {"avg_daily": 0, "chim_total": 0, "jabo_total": 0})
-            chim_patient_trend.append({
-                "month": m, "avg_daily": d["avg_daily"],
-                "chim_total": d["chim_total"], "jabo_total": d["jabo_total"]
-            })
-
-        # 4. yak_chojin_trend
-        yak_chojin_trend = []
-        for m in months:
-            total = yak_existing_by_month.get(m, 0)
-            new_cnt = yak_new_by_month.get(m, 0)
-            yak_chojin_trend.append({
-                "month": m, "new": new_cnt, "existing": total - new_cnt, "total": total
-            })
+        end_date_str = request.args.get('end_date', datetime.now().strftime('%Y-%m-%d'))
+        end_date = datetime.strptime(end_date_str[:7] + '-01', '%Y-%m-%d')
 
-        # 5. uncovered_trend (카테고리 분류)
-        def categorize_uncovered(px_name):
-            if not px_name:
-                return None
-            name = px_name.strip()
-            if '경옥고' in name or '경옥환' in name:
-                return "경옥고"
-            if '녹용' in name:
-                return "녹용"
-            if '공진단' in name:
-                return "공진단"
-            if '약침' in name or name in ['봉침', '자하거', '태반주사', '신바로']:
-                return "약침"
-            if any(d in name for d in ['린다프리미엄', '린다스탠다드', '린다스페셜', '린다환', '린디톡스', '슬림환', '체감탕']):
-                return "다이어트"
-            if any(kw in name for kw in ['상비약', '감기약', '치료약', '자운고', '상용환']):
-                return "상비한약"
-            if any(kw in name for kw in ['탕', '환', '고', '산', '처방', '첩', '제', '약']):
-                if '공진단' not in name and '경옥고' not in name and '경옥환' not in name:
-                    return "맞춤한약"
-            return None
-
-        uncovered_monthly = {m: {"맞춤한약": 0, "녹용": 0, "공진단": 0, "경옥고": 0, "상비한약": 0, "약침": 0, "다이어트": 0} for m in months}
-        for row in uncovered_raw:
-            m = row['month']
-            if m not in uncovered_monthly:
-                continue
-            cat = categorize_uncovered(row['PxName'])
-            if cat and cat in uncovered_monthly[m]:
-                uncovered_monthly[m][cat] += row['amount'] or 0
-
-        uncovered_trend = []
-        for m in months:
-            d = uncovered_monthly[m]
-            uncovered_trend.append({
-                "month": m, "맞춤한약": d["맞춤한약"], "녹용": d["녹용"], "공진단": d["공진단"],
-                "경옥고": d["경옥고"], "상비한약": d["상비한약"], "약침": d["약침"], "다이어트": d["다이어트"]
-            })
+        trends, info = _monthly_trends(end_date, list(_TREND_METRICS))
 
-        return jsonify({
+        result = {
             "end_date": end_date.strftime('%Y-%m'),
-            "revenue_trend": revenue_trend,
-            "visit_route_trend": visit_route_trend,
-            "chim_patient_trend": chim_patient_trend,
-            "yak_chojin_trend": yak_chojin_trend,
-            "uncovered_trend": uncovered_trend
-        })
+            "revenue_trend": trends["revenue"],
+            "visit_route_trend": trends["visit_route"],
+            "chim_patient_trend": trends["chim_patient"],
+            "yak_chojin_trend": trends["yak_chojin"],
+            "uncovered_trend": trends["uncovered"]
+        }
+        if request.args.get('debug'):
+            result["debug"] = info
+        return jsonify(result)
 
     except Exception as e:
         mssql_db.log(f"통합추이 오류: {str(e)}")
@@ -5980,6 +6113,7 @@ def stats_all_trends():
 @mssql_bp.route('/api/execute', methods=['POST'])
 def execute():
     """MSSQL 쿼리 실행"""
+    conn = None
     try:
         data = request.get_json()
         sql_query = data.get('sql', '').strip()
@@ -5998,7 +6132,6 @@ def execute():
             columns = [desc[0] for desc in cursor.description] if cursor.description else []
             rows = cursor.fetchall()
             rows_list = [list(row) for row in rows]
-            conn.close()
             return jsonify({
                 "columns": columns,
                 "rows": rows_list,
@@ -6007,7 +6140,6 @@ def execute():
         else:
             conn.commit()
             affected = cursor.rowcount
-            conn.close()
             return jsonify({
                 "success": True,
                 "affected_rows": affected,
@@ -6015,6 +6147,9 @@ def execute():
             })
     except Exception as e:
         return jsonify({"error": str(e)}), 400
+    finally:
+        if conn:
+            conn.close()
 
 
 # ============ Self Update Webhook ============
@@ -6085,6 +6220,7 @@ def get_doctor_order():
         - name: 원장명
         - hire_date: 입사일 (근무기간시작)
     """
+    conn = None
     try:
         import pymssql
         # UserInfo DB에 직접 연결 (mssql_db.get_connection은 MasterDB만 지원)
@@ -6111,7 +6247,6 @@ def get_doctor_order():
         """)
 
         doctors = cursor.fetchall()
-        conn.close()
 
         result = []
         for doc in doctors:
@@ -6133,9 +6268,13 @@ def get_doctor_order():
     except Exception as e:
         mssql_db.log(f"원장순서 조회 오류: {str(e)}")
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
 
 
 @mssql_bp.route('/api/stats/doctor-revenue-trend')
+@_cached_stats('trend')
 def stats_doctor_revenue_trend():
     """원장별 매출 추이 API (최근 18개월/18주)
 
@@ -6151,6 +6290,7 @@ def stats_doctor_revenue_trend():
     - summary: 현재/이전 기간 매출 요약 및 변화율
     - data: 기간별 매출 데이터
     """
+    conn = None
     try:
         from datetime import datetime as dt, timedelta
         import calendar
@@ -6174,6 +6314,7 @@ def stats_doctor_revenue_trend():
 
         # 입사일 조회 (UserInfo DB)
         hire_date_str = None
+        user_conn = None
         try:
             user_conn = pymssql.connect(
                 server='192.168.0.173',
@@ -6192,9 +6333,11 @@ def stats_doctor_revenue_trend():
             row = user_cursor.fetchone()
             if row and row['hire_date']:
                 hire_date_str = row['hire_date'].strftime('%Y-%m-%d')
-            user_conn.close()
         except:
             pass  # 입사일 조회 실패해도 계속 진행
+        finally:
+            if user_conn:
+                user_conn.close()
 
         # 날짜 범위 계산
         if period == 'weekly':
@@ -6225,63 +6368,62 @@ def stats_doctor_revenue_trend():
             group_format_d = "FORMAT(d.TxDate, 'yyyy-MM')"
 
         # 원장 필터 조건: 해당 원장이 처방한 진료 내역이 있는 영수증만 포함
-        doctor_filter = f"EXISTS (SELECT 1 FROM Detail d2 WHERE d2.Customer_PK = r.Customer_PK AND CAST(d2.TxDate AS DATE) = CAST(r.TxDate AS DATE) AND d2.TxDoctor = N'{doctor}')"
-        doctor_filter_d = f"d.TxDoctor = N'{doctor}'"
+        doctor_filter = f"EXISTS (SELECT 1 FROM Detail d2 WHERE d2.Customer_PK = r.Customer_PK AND {_same_day_sql('d2.TxDate', 'CAST(r.TxDate AS DATE)')} AND d2.TxDoctor = %(doctor)s)"
+        doctor_filter_d = "d.TxDoctor = %(doctor)s"
 
         # 1. 급여매출 (자보 제외)
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT {group_format} as period_key,
                    ISNULL(SUM(ISNULL(r.Bonin_Money, 0) + ISNULL(r.CheongGu_Money, 0)), 0) as insurance
             FROM Receipt r
-            WHERE CAST(r.TxDate AS DATE) BETWEEN '{range_start}' AND '{range_end}'
+            WHERE {_date_range_sql('r.TxDate', 'range_start', 'range_end')}
               AND {doctor_filter}
               AND NOT EXISTS (SELECT 1 FROM Detail d WHERE d.Customer_PK = r.Customer_PK
-                AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE) AND d.TxItem LIKE '%자동차보험%')
+                AND {_same_day_sql('d.TxDate', 'CAST(r.TxDate AS DATE)')} AND d.TxItem LIKE '%자동차보험%')
             GROUP BY {group_format}
-        """)
+        """, {'range_start': range_start, 'range_end': range_end, 'doctor': doctor})
         insurance_by_period = {row['period_key']: int(row['insurance'] or 0) for row in cursor.fetchall()}
 
         # 2. 추나매출 (자보 제외)
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT {group_format_d} as period_key,
                    ISNULL(SUM(ISNULL(d.TxMoney, 0)), 0) as chuna
             FROM Detail d
-            WHERE CAST(d.TxDate AS DATE) BETWEEN '{range_start}' AND '{range_end}'
+            WHERE {_date_range_sql('d.TxDate', 'range_start', 'range_end')}
               AND {doctor_filter_d}
               AND d.PxName LIKE '%추나%'
               AND NOT EXISTS (SELECT 1 FROM Detail d2 WHERE d2.Customer_PK = d.Customer_PK
-                AND CAST(d2.TxDate AS DATE) = CAST(d.TxDate AS DATE) AND d2.TxItem LIKE '%자동차보험%')
+                AND {_same_day_sql('d2.TxDate', 'CAST(d.TxDate AS DATE)')} AND d2.TxItem LIKE '%자동차보험%')
             GROUP BY {group_format_d}
-        """)
+        """, {'range_start': range_start, 'range_end': range_end, 'doctor': doctor})
         chuna_by_period = {row['period_key']: int(row['chuna'] or 0) for row in cursor.fetchall()}
 
         # 3. 자보매출
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT {group_format} as period_key,
                    ISNULL(SUM(ISNULL(r.Bonin_Money, 0) + ISNULL(r.CheongGu_Money, 0) + ISNULL(r.General_Money, 0)), 0) as jabo
             FROM Receipt r
-            WHERE CAST(r.TxDate AS DATE) BETWEEN '{range_start}' AND '{range_end}'
+            WHERE {_date_range_sql('r.TxDate', 'range_start', 'range_end')}
               AND {doctor_filter}
               AND EXISTS (SELECT 1 FROM Detail d WHERE d.Customer_PK = r.Customer_PK
-                AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE) AND d.TxItem LIKE '%자동차보험%')
+                AND {_same_day_sql('d.TxDate', 'CAST(r.TxDate AS DATE)')} AND d.TxItem LIKE '%자동차보험%')
             GROUP BY {group_format}
-        """)
+        """, {'range_start': range_start, 'range_end': range_end, 'doctor': doctor})
         jabo_by_period = {row['period_key']: int(row['jabo'] or 0) for row in cursor.fetchall()}
 
         # 4. 비급여매출 (자보 제외)
-        cursor.execute(f"""
+        mssql_db.execute(cursor, f"""
             SELECT {group_format} as period_key,
                    ISNULL(SUM(ISNULL(r.General_Money, 0)), 0) as uncovered
             FROM Receipt r
-            WHERE CAST(r.TxDate AS DATE) BETWEEN '{range_start}' AND '{range_end}'
+            WHERE {_date_range_sql('r.TxDate', 'range_start', 'range_end')}
               AND {doctor_filter}
               AND NOT EXISTS (SELECT 1 FROM Detail d WHERE d.Customer_PK = r.Customer_PK
-                AND CAST(d.TxDate AS DATE) = CAST(r.TxDate AS DATE) AND d.TxItem LIKE '%자동차보험%')
+                AND {_same_day_sql('d.TxDate', 'CAST(r.TxDate AS DATE)')} AND d.TxItem LIKE '%자동차보험%')
             GROUP BY {group_format}
-        """)
+        """, {'range_start': range_start, 'range_end': range_end, 'doctor': doctor})
         uncovered_by_period = {row['period_key']: int(row['uncovered'] or 0) for row in cursor.fetchall()}
 
-        conn.close()
 
         # 결과 조합 (과거 -> 현재 순서)
         result = []
@@ -6365,3 +6507,6 @@ def stats_doctor_revenue_trend():
         import traceback
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
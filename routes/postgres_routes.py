@@ -5,11 +5,18 @@ PostgreSQL API 라우트
 - CRUD 헬퍼
 """
 
+import base64
+import json
+import threading
 import time
-import psycopg2
-from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from itertools import chain
+from urllib.parse import urlsplit
 from flask import Blueprint, request, jsonify, Response, make_response, stream_with_context
+from flask import json as flask_json
 from services import postgres_db
+from services import change_feed
+from services import sse_server
+from services import treatment_sync
 from config import VERSION, load_config
 
 postgres_bp = Blueprint('postgres', __name__)
@@ -21,7 +28,7 @@ def add_cors_headers(response):
     """응답에 CORS 헤더 추가"""
     response.headers['Access-Control-Allow-Origin'] = '*'
     response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, PATCH, DELETE, OPTIONS'
-    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, X-Requested-With'
+    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, X-Requested-With, Last-Event-ID'
     response.headers['Access-Control-Max-Age'] = '3600'
     # 브라우저 캐싱 방지 (실시간 데이터 API용)
     response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
@@ -35,7 +42,7 @@ def cors_preflight_response():
     response = make_response()
     response.headers['Access-Control-Allow-Origin'] = '*'
     response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, PATCH, DELETE, OPTIONS'
-    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, X-Requested-With'
+    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, X-Requested-With, Last-Event-ID'
     response.headers['Access-Control-Max-Age'] = '3600'
     return response
 
@@ -250,7 +257,14 @@ def health_check():
         pg_ok = result.get('success', False)
     except:
         pass
-    return json_response({"status": "ok", "postgres_connected": pg_ok})
+    return json_response({
+        "status": "ok",
+        "postgres_connected": pg_ok,
+        "pool": postgres_db.get_pool_stats(),
+        "treatment_sync": treatment_sync.get_stats(),
+        "change_feed": change_feed.get_stats(),
+        "sse_server": sse_server.get_stats()
+    })
 
 
 @postgres_bp.route('/api/tables', methods=['GET', 'OPTIONS'])
@@ -280,41 +294,241 @@ def get_table_schema(name):
         return json_response({"error": str(e)}, 400)
 
 
+COUNT_CACHE_TTL = 30  # count=cached 정확한 개수 캐시 유지 시간 (초)
+
+_count_cache = {}  # table -> (count, expires_at)
+_count_cache_lock = threading.Lock()
+
+
+def _table_total(s, name, count_mode):
+    """전체 행 수 -> (total, estimated)
+
+    count_mode:
+        exact    - SELECT COUNT(*) (기본값, 테이블 전체 스캔)
+        cached   - 정확한 개수를 COUNT_CACHE_TTL 동안 재사용
+        estimate - pg_class.reltuples 추정치 (통계가 없으면 cached)
+        none     - 세지 않음 (total: None)
+    """
+    if count_mode == 'none':
+        return None, False
+
+    if count_mode == 'estimate':
+        row = s.query_one("SELECT reltuples::bigint AS estimate FROM pg_class WHERE oid = to_regclass(%s)",
+                          (f'"{name}"',))
+        # reltuples < 0: 한 번도 VACUUM/ANALYZE 되지 않은 테이블
+        if row and row['estimate'] is not None and row['estimate'] >= 0:
+            return row['estimate'], True
+        count_mode = 'cached'
+
+    if count_mode == 'cached':
+        with _count_cache_lock:
+            cached = _count_cache.get(name)
+        if cached and cached[1] > time.time():
+            return cached[0], False
+
+    count_result = s.query_one(f'SELECT COUNT(*) as cnt FROM "{name}"')
+    total = count_result['cnt'] if count_result else 0
+    with _count_cache_lock:
+        _count_cache[name] = (total, time.time() + COUNT_CACHE_TTL)
+    return total, False
+
+
+def _keyset_columns(s, name):
+    """테이블 컬럼 목록 + 단일 컬럼 기본키 (없으면 None) + 키셋 정렬에 쓸 수 있는 컬럼
+
+    NULL은 행 비교 ((a, b) > (x, y))에서 참도 거짓도 아니어서 페이지가 건너뛰어지므로 NOT NULL 컬럼만,
+    기본키가 없으면 동순위를 구분할 수 없으므로 단일 컬럼 유니크 인덱스가 있는 컬럼만 허용.
+    """
+    rows = s.query("""
+        SELECT a.attname AS name,
+               a.attnotnull AS not_null,
+               EXISTS (
+                   SELECT 1 FROM pg_index i
+                   WHERE i.indrelid = a.attrelid AND i.indisprimary
+                     AND i.indnatts = 1 AND i.indkey[0] = a.attnum
+               ) AS is_pk,
+               EXISTS (
+                   SELECT 1 FROM pg_index i
+                   WHERE i.indrelid = a.attrelid AND i.indisunique AND i.indpred IS NULL
+                     AND i.indnatts = 1 AND i.indkey[0] = a.attnum
+               ) AS is_unique
+        FROM pg_attribute a
+        WHERE a.attrelid = to_regclass(%s) AND a.attnum > 0 AND NOT a.attisdropped
+        ORDER BY a.attnum
+    """, (f'"{name}"',))
+    columns = [row['name'] for row in rows]
+    primary_key = next((row['name'] for row in rows if row['is_pk']), None)
+    sortable = {row['name'] for row in rows if row['not_null'] and (primary_key or row['is_unique'])}
+    return columns, primary_key, sortable
+
+
+def _encode_cursor(values):
+    raw = json.dumps(values, default=str, ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    values = json.loads(raw.decode('utf-8'))
+    if not isinstance(values, list):
+        raise ValueError("cursor")
+    return values
+
+
+def _keyset_page(s, name, limit, cursor, sort, order):
+    """키셋 페이지 조회 (정렬 컬럼 + 기본키 기준, OFFSET 없음 - 깊은 페이지도 첫 페이지와 같은 비용)"""
+    columns, primary_key, sortable = _keyset_columns(s, name)
+    if not columns:
+        raise ValueError(f"Table not found: {name}")
+
+    sort = sort or primary_key
+    if not sort:
+        raise ValueError("Keyset pagination requires a primary key or sort column")
+    if sort not in columns:
+        raise ValueError(f"Unknown sort column: {sort}")
+    if sort not in sortable:
+        required = "NOT NULL" if primary_key else "NOT NULL with a unique index (table has no primary key)"
+        raise ValueError(f"Sort column must be {required}: {sort}")
+
+    # 정렬 컬럼이 기본키가 아니면 기본키로 동순위 구분 (기본키가 없으면 정렬 컬럼이 유니크 인덱스)
+    keys = [sort] if primary_key in (None, sort) else [sort, primary_key]
+    key_sql = ', '.join(f'"{key}"' for key in keys)
+    direction = 'DESC' if order == 'desc' else 'ASC'
+
+    where = ''
+    params = []
+    if cursor:
+        values = _decode_cursor(cursor)
+        if len(values) != len(keys):
+            raise ValueError("Invalid cursor")
+        placeholders = ', '.join(['%s'] * len(keys))
+        where = f"WHERE ({key_sql}) {'<' if direction == 'DESC' else '>'} ({placeholders})"
+        params.extend(values)
+
+    order_sql = ', '.join(f'"{key}" {direction}' for key in keys)
+    # 한 행 더 읽어 다음 페이지 여부 확인
+    rows = s.query(f'SELECT * FROM "{name}" {where} ORDER BY {order_sql} LIMIT %s', (*params, limit + 1))
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = _encode_cursor([rows[-1][key] for key in keys]) if has_more else None
+    return rows, s.columns, sort, next_cursor
+
+
 @postgres_bp.route('/api/tables/<name>', methods=['GET', 'OPTIONS'])
 def get_table_data(name):
-    """테이블 데이터 조회"""
+    """테이블 데이터 조회
+
+    Query:
+        limit, offset: OFFSET 페이지 (기본)
+        cursor: 키셋 페이지 - 빈 값이면 첫 페이지, 이후 응답의 next_cursor 전달
+        sort, order: 키셋 정렬 컬럼 (기본: 기본키, NOT NULL 컬럼만), asc/desc
+        count: exact(기본) / cached / estimate / none
+    """
     if request.method == 'OPTIONS':
         return cors_preflight_response()
 
     try:
         limit = int(request.args.get('limit', 100))
-        offset = int(request.args.get('offset', 0))
-
-        # 데이터 조회
-        query = f'SELECT * FROM "{name}" LIMIT %s OFFSET %s'
-        rows = postgres_db.execute_query(query, (limit, offset))
-
-        # 컬럼명 추출
-        columns = list(rows[0].keys()) if rows else []
+        count_mode = request.args.get('count', 'exact')
+
+        with postgres_db.session() as s:
+            if 'cursor' in request.args:
+                rows, columns, sort, next_cursor = _keyset_page(
+                    s, name, limit,
+                    request.args.get('cursor'),
+                    request.args.get('sort'),
+                    request.args.get('order', 'asc').lower()
+                )
+                page = {"sort": sort, "next_cursor": next_cursor}
+            else:
+                offset = int(request.args.get('offset', 0))
+                # 데이터 조회
+                rows = s.query(f'SELECT * FROM "{name}" LIMIT %s OFFSET %s', (limit, offset))
+                columns = s.columns
+                page = {"offset": offset}
 
-        # 전체 개수
-        count_result = postgres_db.execute_query(f'SELECT COUNT(*) as cnt FROM "{name}"')
-        total = count_result[0]['cnt'] if count_result else 0
+            # 전체 개수
+            total, estimated = _table_total(s, name, count_mode)
 
         return json_response({
             "columns": columns,
             "rows": rows,
             "total": total,
+            "total_estimated": estimated,
             "limit": limit,
-            "offset": offset
+            **page
         })
     except Exception as e:
         return json_response({"error": str(e)}, 400)
 
 
+STREAM_MAX_ROWS = 100000  # 스트리밍 조회 최대 행 수 (요청의 max_rows도 이 값을 넘지 못함)
+STREAM_MAX_BYTES = 64 * 1024 * 1024  # 스트리밍 응답 크기 상한
+
+
+def _ndjson(obj):
+    return flask_json.dumps(obj) + '\n'
+
+
+def _stream_query(sql_query, max_rows):
+    """SELECT 결과를 NDJSON으로 스트리밍 (서버 측 커서, 행 수/응답 크기 상한)
+
+    첫 줄 {"columns": [...]}, 이후 한 줄에 한 행, 마지막 줄
+    {"done": true, "row_count", "truncated", "reason"} (중간 오류 시 {"error", "row_count"})
+    """
+    def generate():
+        with postgres_db.session() as s:
+            batches = s.stream(sql_query)
+            try:
+                first = next(batches, [])
+                yield _ndjson({"columns": s.columns})
+
+                row_count = 0
+                sent = 0
+                reason = None
+                try:
+                    for batch in chain([first], batches):
+                        lines = []
+                        for row in batch:
+                            if row_count >= max_rows:
+                                reason = 'max_rows'
+                                break
+                            line = _ndjson(row)
+                            sent += len(line)
+                            if sent > STREAM_MAX_BYTES:
+                                reason = 'max_bytes'
+                                break
+                            lines.append(line)
+                            row_count += 1
+                        if lines:
+                            yield ''.join(lines)
+                        if reason:
+                            break
+                    trailer = {"done": True, "row_count": row_count, "truncated": reason is not None, "reason": reason}
+                except Exception as e:
+                    trailer = {"error": str(e), "row_count": row_count}
+                yield _ndjson(trailer)
+            finally:
+                batches.close()
+
+    # 첫 줄(DECLARE + 첫 batch)까지는 응답 전에 실행 - SQL 오류는 400으로 반환
+    stream = generate()
+    header = next(stream)
+    response = Response(stream_with_context(chain([header], stream)), mimetype='application/x-ndjson')
+    response.headers['X-Accel-Buffering'] = 'no'
+    return add_cors_headers(response)
+
+
 @postgres_bp.route('/api/execute', methods=['POST', 'OPTIONS'])
 def execute():
-    """PostgreSQL SQL 명령어 실행"""
+    """PostgreSQL SQL 명령어 실행
+
+    Body:
+        sql: SQL 문
+        stream: true면 SELECT/WITH 결과를 NDJSON으로 스트리밍 (전체 결과를 메모리에 올리지 않음)
+            데이터 변경 CTE(WITH ... INSERT/UPDATE/DELETE)는 커서로 선언할 수 없으므로 stream 없이 실행
+        max_rows: 스트리밍 최대 행 수 (기본/최대 STREAM_MAX_ROWS, 최소 1)
+    """
     if request.method == 'OPTIONS':
         return cors_preflight_response()
 
@@ -329,6 +543,12 @@ def execute():
         upper_sql = sql_query.upper()
         is_select = upper_sql.startswith('SELECT') or upper_sql.startswith('WITH')
 
+        if data.get('stream'):
+            if not is_select:
+                return json_response({"error": "Streaming is only available for SELECT/WITH queries"}, 400)
+            max_rows = min(max(int(data.get('max_rows') or STREAM_MAX_ROWS), 1), STREAM_MAX_ROWS)
+            return _stream_query(sql_query, max_rows)
+
         if is_select:
             rows = postgres_db.execute_query(sql_query)
             columns = list(rows[0].keys()) if rows else []
@@ -457,167 +677,56 @@ def sse_test():
     return add_cors_headers(response)
 
 
+def _sse_redirect():
+    """SSE 구독은 비동기 SSE 서버(services/sse_server.py)에서 처리 - 같은 경로로 307 리다이렉트
+
+    스트림이 Waitress 작업 스레드를 잡지 않으므로 CRUD 요청은 스레드 풀 전체를 사용한다.
+    SSE 서버는 평문 HTTP이므로 요청이 HTTPS(프록시 뒤)여도 http://로 보낸다.
+    프록시로 SSE 서버를 따로 노출했으면 config의 postgres_sse_url(예: https://host/sse)을 기준 URL로 사용.
+    """
+    if not sse_server.start():
+        error = sse_server.get_stats().get("error") or "SSE server not running"
+        postgres_db.log(f"[SSE] SSE 서버 시작 실패: {error}", force=True)
+        return json_response({"error": f"SSE server unavailable: {error}"}, 503)
+
+    base_url = (load_config().get("postgres_sse_url") or "").rstrip('/')
+    if not base_url:
+        host = urlsplit(request.host_url).hostname
+        if ':' in host:
+            host = f"[{host}]"  # IPv6 주소는 대괄호로 감싸야 포트와 구분됨
+        base_url = f"http://{host}:{sse_server.get_stats()['port']}"
+    location = base_url + request.path
+    if request.query_string:
+        location += '?' + request.query_string.decode('latin-1')
+    response = make_response('', 307)
+    response.headers['Location'] = location
+    response.headers['Cache-Control'] = 'no-cache'
+    return add_cors_headers(response)
+
+
 @postgres_bp.route('/api/subscribe', methods=['GET', 'OPTIONS'])
 def subscribe_all():
     """모든 테이블 변경사항 구독 (SSE)"""
     if request.method == 'OPTIONS':
         return cors_preflight_response()
-
-    # DB 연결을 먼저 테스트
-    config = postgres_db.get_db_config()
-    postgres_db.log(f"[SSE] 연결 시도: {config.get('host')}:{config.get('port')}", force=True)
-
-    try:
-        test_conn = psycopg2.connect(
-            host=config.get('host', 'localhost'),
-            port=config.get('port', 5432),
-            user=config.get('user', ''),
-            password=config.get('password', ''),
-            database=config.get('database', ''),
-            connect_timeout=5
-        )
-        test_conn.close()
-        postgres_db.log("[SSE] DB 연결 테스트 성공", force=True)
-    except Exception as e:
-        postgres_db.log(f"[SSE] DB 연결 테스트 실패: {str(e)}", force=True)
-        return json_response({"error": f"DB connection failed: {str(e)}"}, 500)
-
-    def event_stream():
-        # 즉시 첫 메시지 전송 (Waitress 호환)
-        yield f": SSE stream started\n\n"
-
-        conn = None
-        cur = None
-        try:
-            conn = psycopg2.connect(
-                host=config.get('host', 'localhost'),
-                port=config.get('port', 5432),
-                user=config.get('user', ''),
-                password=config.get('password', ''),
-                database=config.get('database', ''),
-            )
-            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
-            cur = conn.cursor()
-            cur.execute("LISTEN table_change")
-            postgres_db.log("[SSE] LISTEN 성공", force=True)
-
-            # 연결 성공 알림
-            yield f"data: {{\"type\": \"connected\", \"message\": \"SSE connected\"}}\n\n"
-
-            last_keepalive = time.time()
-            while True:
-                conn.poll()
-                while conn.notifies:
-                    notify = conn.notifies.pop(0)
-                    yield f"data: {notify.payload}\n\n"
-
-                if time.time() - last_keepalive >= 5:
-                    yield f": keepalive\n\n"
-                    last_keepalive = time.time()
-
-                time.sleep(0.1)
-        except GeneratorExit:
-            postgres_db.log("[SSE] 클라이언트 연결 종료", force=True)
-        except Exception as e:
-            postgres_db.log(f"[SSE] 에러: {str(e)}", force=True)
-            yield f"data: {{\"type\": \"error\", \"message\": \"{str(e)}\"}}\n\n"
-        finally:
-            if cur:
-                cur.close()
-            if conn:
-                conn.close()
-
-    postgres_db.log("[SSE] Response 생성 중", force=True)
-    response = Response(event_stream(), mimetype='text/event-stream')
-    response.headers['Cache-Control'] = 'no-cache'
-    response.headers['X-Accel-Buffering'] = 'no'
-    postgres_db.log("[SSE] Response 반환", force=True)
-    return add_cors_headers(response)
+    return _sse_redirect()
 
 
 @postgres_bp.route('/api/subscribe/<table>', methods=['GET', 'OPTIONS'])
 def subscribe_table(table):
     """특정 테이블 변경사항만 구독 (SSE)"""
-    import json as json_lib
-
     if request.method == 'OPTIONS':
         return cors_preflight_response()
+    return _sse_redirect()
 
-    # DB 연결을 먼저 테스트
-    config = postgres_db.get_db_config()
-    try:
-        test_conn = psycopg2.connect(
-            host=config.get('host', 'localhost'),
-            port=config.get('port', 5432),
-            user=config.get('user', ''),
-            password=config.get('password', ''),
-            database=config.get('database', ''),
-            connect_timeout=5
-        )
-        test_conn.close()
-    except Exception as e:
-        postgres_db.log(f"[SSE] DB 연결 테스트 실패: {str(e)}", force=True)
-        return json_response({"error": f"DB connection failed: {str(e)}"}, 500)
 
-    def event_stream():
-        conn = None
-        cur = None
-        try:
-            conn = psycopg2.connect(
-                host=config.get('host', 'localhost'),
-                port=config.get('port', 5432),
-                user=config.get('user', ''),
-                password=config.get('password', ''),
-                database=config.get('database', ''),
-            )
-            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
-            cur = conn.cursor()
-            cur.execute("LISTEN table_change")
-
-            yield f"data: {{\"type\": \"connected\", \"table\": \"{table}\"}}\n\n"
-
-            last_keepalive = time.time()
-            while True:
-                # Windows 호환: select 대신 poll + sleep 사용
-                conn.poll()
-                while conn.notifies:
-                    notify = conn.notifies.pop(0)
-                    try:
-                        payload = json_lib.loads(notify.payload)
-                        # 해당 테이블만 필터링
-                        if payload.get('table') == table:
-                            yield f"data: {notify.payload}\n\n"
-                    except:
-                        pass
-
-                # 5초마다 keepalive 전송
-                if time.time() - last_keepalive >= 5:
-                    yield f": keepalive\n\n"
-                    last_keepalive = time.time()
-
-                time.sleep(0.1)  # 100ms 간격으로 확인
-        except GeneratorExit:
-            postgres_db.log("[SSE] 클라이언트 연결 종료", force=True)
-        except Exception as e:
-            postgres_db.log(f"[SSE] 에러: {str(e)}", force=True)
-            yield f"data: {{\"type\": \"error\", \"message\": \"{str(e)}\"}}\n\n"
-        finally:
-            if cur:
-                cur.close()
-            if conn:
-                conn.close()
-
-    response = Response(stream_with_context(event_stream()), mimetype='text/event-stream')
-    response.headers['Cache-Control'] = 'no-cache'
-    response.headers['Connection'] = 'keep-alive'
-    response.headers['X-Accel-Buffering'] = 'no'
-    return add_cors_headers(response)
+# ============ MSSQL -> PostgreSQL 동기화 ============
 
+_schema_ready = False  # init_schema 완료 여부 (실패하면 다음 동기화 요청에서 다시 시도)
 
-# ============ MSSQL -> PostgreSQL 동기화 ============
 
 def _ensure_waiting_queue_table():
-    """waiting_queue 테이블 존재 확인 및 생성"""
+    """waiting_queue 테이블 존재 확인 및 생성 (성공 시 True)"""
     try:
         sql = """
         CREATE TABLE IF NOT EXISTS waiting_queue (
@@ -639,8 +748,18 @@ def _ensure_waiting_queue_table():
         )
         """
         postgres_db.execute_query(sql, fetch=False)
+        return True
     except Exception as e:
         postgres_db.log(f"waiting_queue 테이블 생성 오류: {e}")
+        return False
+
+
+def init_schema():
+    """동기화용 테이블/인덱스 준비 (프로세스당 1회 - 서버 시작 시 또는 첫 동기화 요청 시)"""
+    global _schema_ready
+    if not _schema_ready:
+        _schema_ready = _ensure_waiting_queue_table()
+        treatment_sync.ensure_index()
 
 
 @postgres_bp.route('/api/waiting-queue/sync', methods=['POST', 'OPTIONS'])
@@ -659,8 +778,8 @@ def sync_waiting_queue():
         return cors_preflight_response()
 
     try:
-        # 테이블 확인/생성
-        _ensure_waiting_queue_table()
+        # GUI 외 경로로 시작한 서버도 빈 DB에서 동작하도록 첫 요청에서 준비
+        init_schema()
 
         data = request.get_json() or {}
         mssql_waiting = data.get('waiting', [])
@@ -672,66 +791,62 @@ def sync_waiting_queue():
                 "message": "No waiting data provided"
             })
 
-        # 현재 waiting_queue에 있는 patient_id 조회 (중복 방지)
-        existing = postgres_db.execute_query("""
-            SELECT patient_id FROM waiting_queue
-            WHERE queue_type = 'treatment'
-        """)
-        existing_patient_ids = {row['patient_id'] for row in existing}
-
-        # 현재 최대 position 조회
-        max_pos_result = postgres_db.execute_query(
-            "SELECT COALESCE(MAX(position), -1) as max_pos FROM waiting_queue WHERE queue_type = 'treatment'"
-        )
-        next_position = (max_pos_result[0]['max_pos'] if max_pos_result else -1) + 1
-
-        added = 0
-        skipped_duplicate = 0
-
         from datetime import datetime
         now = datetime.now().isoformat()
 
+        # 환자별 첫 항목만 사용 (순서 = 대기열 position 순서)
+        rows = []
+        seen = set()
+        payload_duplicate = 0
         for patient in mssql_waiting:
             patient_id = patient.get('patient_id')
-            intotime = patient.get('waiting_since') or patient.get('intotime')
-
             if not patient_id:
                 continue
-
-            # 이미 있으면 스킵
-            if patient_id in existing_patient_ids:
-                skipped_duplicate += 1
+            if patient_id in seen:
+                payload_duplicate += 1
                 continue
-
-            # INSERT (ON CONFLICT DO NOTHING)
-            try:
-                postgres_db.execute_query("""
-                    INSERT INTO waiting_queue
-                    (patient_id, queue_type, details, position, doctor,
-                     mssql_waiting_pk, mssql_intotime, synced_at,
-                     chart_number, patient_name, age, sex)
-                    VALUES (%s, 'treatment', %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (patient_id, queue_type) DO NOTHING
-                """, (
-                    patient_id,
-                    patient.get('status') or '',
-                    next_position,
-                    patient.get('doctor') or '',
-                    patient.get('id'),  # mssql_waiting_pk
-                    intotime,
-                    now,
-                    patient.get('chart_no') or '',
-                    patient.get('patient_name') or '',
-                    patient.get('age'),
-                    patient.get('sex') or ''
-                ), fetch=False)
-
-                next_position += 1
-                added += 1
-                existing_patient_ids.add(patient_id)
-            except Exception as insert_error:
-                postgres_db.log(f"Insert error for patient_id {patient_id}: {insert_error}")
-                skipped_duplicate += 1
+            seen.add(patient_id)
+            rows.append((
+                len(rows),
+                patient_id,
+                patient.get('status') or '',
+                patient.get('doctor') or '',
+                patient.get('id'),  # mssql_waiting_pk
+                patient.get('waiting_since') or patient.get('intotime'),
+                now,
+                patient.get('chart_no') or '',
+                patient.get('patient_name') or '',
+                patient.get('age'),
+                patient.get('sex') or ''
+            ))
+
+        # 이미 있는 환자는 제외하고 한 문장으로 INSERT (position은 서버에서 현재 최대값 뒤로 부여)
+        with postgres_db.session() as s:
+            added = s.execute_values("""
+                INSERT INTO waiting_queue
+                (patient_id, queue_type, details, position, doctor,
+                 mssql_waiting_pk, mssql_intotime, synced_at,
+                 chart_number, patient_name, age, sex)
+                SELECT v.patient_id, 'treatment', v.details,
+                       base.max_pos + ROW_NUMBER() OVER (ORDER BY v.ord),
+                       v.doctor, v.mssql_waiting_pk, v.mssql_intotime, v.synced_at,
+                       v.chart_number, v.patient_name, v.age, v.sex
+                FROM (VALUES %s) AS v (ord, patient_id, details, doctor,
+                                       mssql_waiting_pk, mssql_intotime, synced_at,
+                                       chart_number, patient_name, age, sex)
+                CROSS JOIN (
+                    SELECT COALESCE(MAX(position), -1) AS max_pos
+                    FROM waiting_queue WHERE queue_type = 'treatment'
+                ) base
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM waiting_queue w
+                    WHERE w.queue_type = 'treatment' AND w.patient_id = v.patient_id
+                )
+                ORDER BY v.ord
+                ON CONFLICT (patient_id, queue_type) DO NOTHING
+            """, rows, template="(%s, %s::integer, %s, %s, %s::integer, %s, %s::timestamp, %s, %s, %s::integer, %s)")
+
+        skipped_duplicate = payload_duplicate + len(rows) - added
 
         return json_response({
             "success": True,
@@ -792,6 +907,7 @@ def sync_treatments():
     - 새 환자: INSERT with status='waiting'
     - 기존 환자(waiting): synced_at 업데이트
     - 기존 환자(treating/complete): 스킵
+    - 환자 수와 관계없이 한 트랜잭션에서 쿼리 3개로 처리 (treatment_sync.upsert_treatments)
     """
     if request.method == 'OPTIONS':
         return cors_preflight_response()
@@ -808,66 +924,8 @@ def sync_treatments():
                 "message": "No data to sync"
             })
 
-        from datetime import datetime
-        today = datetime.now().strftime('%Y-%m-%d')
-        now = datetime.now().isoformat()
-
-        added = 0
-        updated = 0
-        skipped = 0
-
-        for patient in mssql_patients:
-            patient_id = patient.get('patient_id')
-            if not patient_id:
-                continue
-
-            # 오늘 해당 환자 기록 확인
-            existing = postgres_db.execute_query("""
-                SELECT id, status FROM daily_treatment_records
-                WHERE patient_id = %s AND treatment_date = %s
-                ORDER BY visit_number DESC LIMIT 1
-            """, (patient_id, today))
-
-            if existing:
-                current_status = existing[0].get('status', 'waiting')
-                record_id = existing[0].get('id')
-
-                if current_status in ('treating', 'complete'):
-                    # 이미 치료중이거나 완료된 환자는 스킵
-                    skipped += 1
-                else:
-                    # waiting 상태면 synced_at만 업데이트
-                    postgres_db.execute_query("""
-                        UPDATE daily_treatment_records
-                        SET synced_at = %s
-                        WHERE id = %s
-                    """, (now, record_id), fetch=False)
-                    updated += 1
-            else:
-                # 새 환자 INSERT
-                intotime = patient.get('waiting_since') or patient.get('treating_since')
-
-                postgres_db.execute_query("""
-                    INSERT INTO daily_treatment_records
-                    (patient_id, patient_name, chart_number, treatment_date,
-                     status, doctor_name, reception_time,
-                     mssql_waiting_pk, mssql_intotime, synced_at,
-                     patient_age, patient_sex, visit_number)
-                    VALUES (%s, %s, %s, %s, 'waiting', %s, %s, %s, %s, %s, %s, %s, 1)
-                """, (
-                    patient_id,
-                    patient.get('patient_name') or '',
-                    patient.get('chart_no') or '',
-                    today,
-                    patient.get('doctor') or '',
-                    intotime,
-                    patient.get('id'),  # mssql_waiting_pk
-                    intotime,
-                    now,
-                    patient.get('age'),
-                    patient.get('sex') or ''
-                ), fetch=False)
-                added += 1
+        result = treatment_sync.upsert_treatments(mssql_patients)
+        added, updated, skipped = result["added"], result["updated"], result["skipped"]
 
         return json_response({
             "success": True,
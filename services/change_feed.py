@@ -0,0 +1,318 @@
+"""
+PostgreSQL table_change 알림 공유 수신기 (SSE 구독자 fan-out)
+- LISTEN 연결 하나를 백그라운드 스레드가 유지 (끊기면 재연결)
+- 알림은 구독자별 크기 제한 큐로 전달, 테이블 필터는 여기서 처리
+- SSE 스트림은 DB 연결을 잡지 않고 자기 큐만 기다림
+- 알림마다 증가하는 이벤트 id, 최근 알림 링 버퍼 (Last-Event-ID 재연결 시 재전송)
+
+    sub = change_feed.subscribe("daily_treatment_records", last_event_id=1234)
+    try:
+        if sub.take_reset():
+            ...  # 버퍼보다 오래된 공백 - 클라이언트가 전체 다시 로드
+        event = sub.get(timeout=5)  # Event(id, table, row_id, payload) 또는 None
+    finally:
+        change_feed.unsubscribe(sub)
+
+라우트 모듈이 재로드되어도 연결/구독자는 services 쪽에 유지된다.
+"""
+
+import json
+import threading
+import time
+from collections import deque, namedtuple
+from datetime import datetime
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from services import postgres_db
+
+# 수신기 설정
+CHANNEL = "table_change"
+SUBSCRIBER_QUEUE_SIZE = 1000  # 구독자별 최대 대기 알림 수 (넘치면 오래된 것부터 버림)
+POLL_INTERVAL = 0.1  # 알림 확인 간격 (초) - Windows 호환: select 대신 poll + sleep
+RECONNECT_DELAY = 5  # 연결 끊김 후 재연결 대기 (초)
+CONNECT_TIMEOUT = 5
+REPLAY_BUFFER_SIZE = 5000  # 재전송용으로 보관하는 최근 알림 수
+
+# 로그 콜백 (GUI에서 설정)
+log_callback = None
+
+_lock = threading.Lock()
+_subscribers = set()
+_thread = None
+_connected = threading.Event()
+_history = deque(maxlen=REPLAY_BUFFER_SIZE)  # Event
+# 이벤트 id - 프로세스 시작 시각(ms)부터 시작해 서버 재시작 후에도 증가
+_last_id = int(time.time() * 1000)
+_stats = {
+    "received": 0,
+    "delivered": 0,
+    "dropped": 0,
+    "reconnects": 0,
+    "resumes": 0,  # Last-Event-ID로 재연결한 구독
+    "resets": 0,  # 재전송할 수 없어 전체 다시 로드가 필요했던 구독
+    "last_notify": None,
+    "last_error": None,
+}
+
+
+def log(message):
+    """수신기 로그 출력"""
+    timestamp = datetime.now().strftime("%H:%M:%S")
+    log_msg = f"[{timestamp}] [SSE] {message}"
+    print(log_msg)
+    if log_callback:
+        log_callback(log_msg)
+
+
+# 알림 1건 - payload는 NOTIFY로 받은 JSON 문자열 그대로, table/row_id는 수신 시 한 번 파싱한 값
+Event = namedtuple("Event", ["id", "table", "row_id", "payload"])
+
+
+class Subscriber:
+    """구독자 1명의 알림 큐 (크기 제한, 넘치면 가장 오래된 알림 삭제)"""
+
+    def __init__(self, table=None, maxsize=SUBSCRIBER_QUEUE_SIZE):
+        self.table = table  # None이면 전체 테이블
+        self.dropped = 0
+        self.reset = False  # 놓친 알림이 있음 (재전송 불가 또는 큐 넘침)
+        self.cursor = None  # 구독 시점의 마지막 이벤트 id
+        self.on_push = None  # 알림 도착 시 호출 (asyncio 스트림 깨우기용, 수신 스레드에서 호출됨)
+        self._queue = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+
+    def wants(self, table):
+        return self.table is None or self.table == table
+
+    def push(self, event):
+        """알림 추가 (수신 스레드에서 호출). 넘쳐서 버렸으면 False"""
+        with self._cond:
+            overflow = len(self._queue) == self._queue.maxlen
+            if overflow:
+                self.dropped += 1
+                self.reset = True
+            self._queue.append(event)
+            self._cond.notify()
+        if self.on_push:
+            try:
+                self.on_push()
+            except Exception:
+                pass
+        return not overflow
+
+    def mark_reset(self):
+        """놓친 알림 표시 + 대기 중인 스트림 깨우기"""
+        with self._cond:
+            self.reset = True
+            self._cond.notify()
+        if self.on_push:
+            try:
+                self.on_push()
+            except Exception:
+                pass
+
+    def take_reset(self):
+        """놓친 알림이 있었는지 확인 후 플래그 해제"""
+        with self._cond:
+            reset, self.reset = self.reset, False
+            return reset
+
+    def get(self, timeout=None):
+        """다음 알림 Event (timeout 동안 없으면 None)"""
+        with self._cond:
+            if not self._queue:
+                self._cond.wait(timeout)
+            return self._queue.popleft() if self._queue else None
+
+    def drain(self):
+        """대기 중인 알림 전부 (기다리지 않음)"""
+        with self._cond:
+            items = list(self._queue)
+            self._queue.clear()
+            return items
+
+    def pending(self):
+        with self._cond:
+            return len(self._queue)
+
+
+# ============ 구독 ============
+
+def subscribe(table=None, maxsize=SUBSCRIBER_QUEUE_SIZE, last_event_id=None):
+    """구독 등록 (수신 스레드가 없으면 시작)
+
+    Args:
+        last_event_id: 클라이언트가 마지막으로 받은 이벤트 id - 이후 알림을 링 버퍼에서 먼저 큐에 넣음.
+            버퍼에 없는 구간이면 sub.reset = True (클라이언트가 전체 다시 로드)
+    """
+    sub = Subscriber(table, maxsize)
+    with _lock:
+        # 구독 등록과 재전송 목록 계산을 같은 락 안에서 - 사이에 온 알림이 빠지거나 중복되지 않음
+        if last_event_id is not None:
+            oldest = _history[0].id if _history else _last_id + 1
+            if oldest - 1 <= last_event_id <= _last_id:
+                replay = [event for event in _history
+                          if event.id > last_event_id and sub.wants(event.table)]
+                if len(replay) <= maxsize:
+                    sub._queue.extend(replay)
+                else:
+                    sub.reset = True
+            else:
+                sub.reset = True
+            _stats["resumes"] += 1
+            if sub.reset:
+                _stats["resets"] += 1
+        sub.cursor = _last_id
+        _subscribers.add(sub)
+    start()
+    return sub
+
+
+def unsubscribe(sub):
+    """구독 해제"""
+    with _lock:
+        _subscribers.discard(sub)
+
+
+def wait_connected(timeout=CONNECT_TIMEOUT):
+    """LISTEN 연결이 준비될 때까지 대기 (준비되면 True)"""
+    start()
+    return _connected.wait(timeout)
+
+
+def is_connected():
+    return _connected.is_set()
+
+
+def last_error():
+    return _stats["last_error"]
+
+
+def get_stats():
+    """수신기 상태 조회"""
+    with _lock:
+        subscribers = list(_subscribers)
+        stats = dict(_stats)
+    stats.update({
+        "channel": CHANNEL,
+        "connected": _connected.is_set(),
+        "subscribers": len(subscribers),
+        "pending": sum(sub.pending() for sub in subscribers),
+        "last_event_id": _last_id,
+        "replay_buffer": len(_history),
+        "replay_buffer_size": REPLAY_BUFFER_SIZE,
+    })
+    return stats
+
+
+# ============ 수신 스레드 ============
+
+def start():
+    """수신 스레드 시작 (이미 실행 중이면 무시)"""
+    global _thread
+    with _lock:
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=_listen_loop, daemon=True, name="pg-change-feed")
+            _thread.start()
+
+
+def _connect():
+    config = postgres_db.get_db_config()
+    conn = psycopg2.connect(
+        host=config.get('host', 'localhost'),
+        port=config.get('port', 5432),
+        user=config.get('user', ''),
+        password=config.get('password', ''),
+        database=config.get('database', ''),
+        connect_timeout=CONNECT_TIMEOUT
+    )
+    conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+    cur = conn.cursor()
+    cur.execute(f"LISTEN {CHANNEL}")
+    cur.close()
+    return conn
+
+
+def _parse(payload):
+    """알림 payload -> (table, row_id). row_id는 id 또는 data/record/new/old 안의 id (없으면 None)"""
+    try:
+        data = json.loads(payload)
+    except Exception:
+        return None, None
+    if not isinstance(data, dict):
+        return None, None
+
+    row_id = data.get('id')
+    if row_id is None:
+        for key in ('data', 'record', 'new', 'old'):
+            row = data.get(key)
+            if isinstance(row, dict) and row.get('id') is not None:
+                row_id = row['id']
+                break
+    if not isinstance(row_id, (int, str)):
+        row_id = None
+    return data.get('table'), row_id
+
+
+def _dispatch(payload):
+    """알림 1건에 이벤트 id를 붙여 링 버퍼에 보관하고 테이블이 맞는 구독자에게 전달 (JSON은 한 번만 파싱)"""
+    global _last_id
+    table, row_id = _parse(payload)
+
+    with _lock:
+        _last_id += 1
+        event = Event(_last_id, table, row_id, payload)
+        _history.append(event)
+        targets = [sub for sub in _subscribers if sub.wants(table)]
+    dropped = sum(1 for sub in targets if not sub.push(event))
+
+    with _lock:
+        _stats["received"] += 1
+        _stats["delivered"] += len(targets)
+        _stats["dropped"] += dropped
+        _stats["last_notify"] = datetime.now().isoformat(timespec='seconds')
+
+
+def _mark_gap():
+    """LISTEN 연결이 끊겼던 동안의 알림은 알 수 없음 - 버퍼를 비우고 현재 구독자에게 다시 로드 요청
+
+    이벤트 id를 하나 건너뛰어 공백 경계로 삼는다 - 공백 이전 id로 재연결하면 재전송 범위 밖이 되어 reset.
+    """
+    global _last_id
+    with _lock:
+        _history.clear()
+        _last_id += 1
+        subscribers = list(_subscribers)
+    for sub in subscribers:
+        sub.mark_reset()
+
+
+def _listen_loop():
+    first = True
+    while True:
+        conn = None
+        try:
+            conn = _connect()
+            if not first:
+                _mark_gap()
+            first = False
+            _connected.set()
+            _stats["last_error"] = None
+            log(f"LISTEN {CHANNEL} 연결")
+            while True:
+                conn.poll()
+                while conn.notifies:
+                    _dispatch(conn.notifies.pop(0).payload)
+                time.sleep(POLL_INTERVAL)
+        except Exception as e:
+            _stats["last_error"] = str(e)
+            log(f"LISTEN 연결 오류: {e}")
+        finally:
+            if _connected.is_set():
+                _stats["reconnects"] += 1
+            _connected.clear()
+            if conn:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+        time.sleep(RECONNECT_DELAY)
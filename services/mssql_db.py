@@ -2,14 +2,19 @@
 MSSQL 데이터베이스 연결 모듈
 - Connection Pool 지원
 - 자동 재연결
-- 연결 상태 모니터링
+- 연결 상태 모니터링 (백그라운드 유지보수 스레드: 최소 연결 유지, 만료 전 교체, 주기 점검)
 - 기존 코드 호환 (conn.close() 호출 시 풀에 반환)
+- 반환 누락 안전장치 (close() 없이 버려진 연결, 너무 오래 잡힌 연결은 유지보수 스레드가 회수)
+- 파라미터 쿼리 빌더 (sp_executesql, 실행 계획 재사용)
+- 통계용 자보 방문 임시 테이블 (#JaboVisits/#TempDetail/#TempReceipt)
 """
 
+import re
 import threading
-import queue
 import time
-from datetime import datetime
+import weakref
+from collections import deque
+from datetime import datetime, date
 from config import load_config
 
 # 로그 콜백 (GUI에서 설정)
@@ -17,9 +22,18 @@ log_callback = None
 
 # Connection Pool 설정
 POOL_SIZE = 5
+POOL_MIN_SIZE = 2  # 유지보수 스레드가 미리 열어 두는 최소 연결 수
+MAX_OVERFLOW = 5  # 모두 사용 중일 때 추가로 열 수 있는 임시 연결 수
 POOL_TIMEOUT = 30  # 연결 대기 시간 (초)
+WAIT_SAMPLE_SIZE = 1000  # 대기 시간 백분위 계산용 샘플 수
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30)  # 대기 시간 히스토그램 구간 (초)
+RATE_WINDOW = 60  # 초당 체크아웃 계산 구간 (초)
 CONNECTION_MAX_AGE = 300  # 연결 최대 수명 (5분)
+IDLE_VALIDATE_AFTER = 30  # 이 시간(초) 이상 놀던 연결만 체크아웃 시 SELECT 1 점검
 HEALTH_CHECK_INTERVAL = 60  # 상태 체크 간격 (초)
+MAINTENANCE_TICK = 10  # 유지보수 스레드 실행 간격 (초)
+RECYCLE_BEFORE = 30  # 수명 만료 이 시간(초) 전에 유휴 연결을 새 연결로 교체
+MAX_CHECKOUT_SECONDS = 600  # 이 시간(초) 넘게 반환되지 않은 연결은 강제로 닫고 슬롯 회수
 
 
 class PooledConnection:
@@ -36,11 +50,17 @@ class PooledConnection:
         self._last_used = time.time()
         self._use_count = 0
         self._closed = False
+        self._generation = 0
+        self._untested = False  # 점검 없이 내준 연결 (첫 쿼리 실패 시 재연결 후 재시도)
+        self._checkout = None  # 사용 중이면 현재 _Checkout 핸들의 weakref.finalize
+        self._checked_out_at = None
 
     def cursor(self, as_dict=False):
         """커서 생성"""
         self._last_used = time.time()
         self._use_count += 1
+        if self._untested:
+            return _RetryCursor(self, as_dict)
         return self._conn.cursor(as_dict=as_dict)
 
     def commit(self):
@@ -67,15 +87,32 @@ class PooledConnection:
 
     def _force_close(self):
         """강제 연결 종료 (풀에서 제거할 때)"""
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        if self._pool:
+            self._pool._record_closed(self)
         try:
-            self._conn.close()
+            conn.close()
         except:
             pass
 
+    def _reconnect(self):
+        """끊어진 연결을 새 연결로 교체 (같은 풀 슬롯 유지)"""
+        self._force_close()
+        self._conn = self._pool._connect()
+        self._created_at = time.time()
+        self._use_count = 1
+        self._pool._track(self)
+
     def is_expired(self):
         """연결 수명 초과 여부"""
         return time.time() - self._created_at > CONNECTION_MAX_AGE
 
+    def idle_seconds(self):
+        """마지막 사용(반환) 이후 경과 시간 (초)"""
+        return time.time() - self._last_used
+
     def is_valid(self):
         """연결 유효성 검사"""
         if self._conn is None or self._closed:
@@ -97,15 +134,169 @@ class PooledConnection:
         return False
 
 
+class _Checkout:
+    """
+    체크아웃 1회분 연결 핸들 (get_connection 반환값)
+    - PooledConnection은 체크아웃마다 재사용되므로 요청별 핸들로 감싸서 close()는 한 번만 반영
+      (이미 닫은 핸들을 다시 닫아도 다른 요청이 쓰는 연결은 그대로)
+    - close() 없이 버려지면(GC) 풀이 회수, 반환된 뒤 사용하면 오류
+    """
+
+    def __init__(self, pooled):
+        self._pooled = pooled
+        self._finalizer = None  # ConnectionPool._check_out에서 설정
+
+    def _live(self):
+        if self._pooled is None or not self._finalizer.alive:
+            raise RuntimeError("이미 풀에 반환된 연결입니다.")
+        return self._pooled
+
+    def cursor(self, as_dict=False):
+        """커서 생성"""
+        return self._live().cursor(as_dict=as_dict)
+
+    def commit(self):
+        """커밋"""
+        return self._live().commit()
+
+    def rollback(self):
+        """롤백"""
+        return self._live().rollback()
+
+    def close(self):
+        """풀에 반환 (핸들당 한 번만)"""
+        pooled, self._pooled = self._pooled, None
+        if pooled is not None and self._finalizer.detach():
+            pooled.close()
+
+    def __getattr__(self, name):
+        return getattr(self._live(), name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+
+def _is_connection_error(error):
+    """연결이 끊어져서 난 오류인지 (재연결 후 재시도해도 되는 오류)"""
+    try:
+        import pymssql
+    except ImportError:
+        return False
+    if isinstance(error, pymssql.InterfaceError):
+        return True
+    if isinstance(error, pymssql.OperationalError):
+        message = str(error)
+        return any(marker in message for marker in (
+            'DBPROCESS is dead', 'not connected', 'Write to the server failed',
+            'Read from the server failed', 'Unexpected EOF from the server',
+            'Adaptive Server connection failed', 'Connection reset'
+        ))
+    return False
+
+
+class _RetryCursor:
+    """점검 없이 내준 연결의 커서
+
+    첫 쿼리가 연결 오류로 실패하면 재연결 후 한 번만 다시 실행한다.
+    (끊어진 연결에서는 아무것도 커밋되지 않았으므로 재실행해도 안전)
+    첫 쿼리가 성공하면 이후로는 일반 커서와 동일하게 동작한다.
+    """
+
+    def __init__(self, pooled, as_dict):
+        self._pooled = pooled
+        self._as_dict = as_dict
+        try:
+            self._cursor = pooled._conn.cursor(as_dict=as_dict)
+        except Exception as e:
+            if not _is_connection_error(e):
+                raise
+            self._retry_connect(e)
+
+    def _retry_connect(self, error):
+        self._pooled._pool._record_retry()
+        log(f"끊어진 연결 재연결 후 재시도: {error}")
+        self._pooled._reconnect()
+        self._cursor = self._pooled._conn.cursor(as_dict=self._as_dict)
+
+    def execute(self, *args, **kwargs):
+        if not self._pooled._untested:
+            return self._cursor.execute(*args, **kwargs)
+        try:
+            result = self._cursor.execute(*args, **kwargs)
+        except Exception as e:
+            if not _is_connection_error(e):
+                self._pooled._untested = False
+                raise
+            self._retry_connect(e)
+            result = self._cursor.execute(*args, **kwargs)
+        self._pooled._untested = False
+        return result
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class _Waiter:
+    """연결 대기 요청 (FIFO 순서로 연결 또는 생성 슬롯을 넘겨받음)"""
+
+    __slots__ = ('event', 'pooled', 'may_create')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.pooled = None  # 넘겨받은 유휴 연결
+        self.may_create = False  # 넘겨받은 생성 슬롯 (폐기된 연결 자리)
+
+
 class ConnectionPool:
-    """MSSQL Connection Pool"""
+    """MSSQL Connection Pool
+
+    - 최대 size + max_overflow 개까지만 연결 생성
+    - 모두 사용 중이면 POOL_TIMEOUT까지 대기 (먼저 기다린 요청부터 FIFO로 배정)
+    - overflow 연결은 반환 시 대기자가 없으면 닫음
+    - 유지보수 스레드가 최소 연결 유지, 만료 전 교체, 유휴 연결 점검을 요청 경로 밖에서 수행
+    - close() 없이 버려졌거나 max_checkout 초 넘게 잡힌 연결은 닫고 슬롯 회수 (반환 누락으로 풀이 막히지 않도록)
+    """
 
-    def __init__(self, size=POOL_SIZE):
+    def __init__(self, size=POOL_SIZE, max_overflow=MAX_OVERFLOW, timeout=POOL_TIMEOUT,
+                 min_size=POOL_MIN_SIZE):
         self.size = size
-        self.pool = queue.Queue(maxsize=size)
+        self.min_size = min(min_size, size)
+        self.max_overflow = max_overflow
+        self.timeout = timeout
         self.lock = threading.Lock()
+        self._idle = deque()  # 반환된 유휴 연결
+        self._waiters = deque()  # 대기 중인 요청 (FIFO)
+        self._open_count = 0  # 열려 있는 연결 수 (유휴 + 사용 중 + 생성 중)
+        self._generation = 0  # initialize() 때마다 증가 (이전 설정의 연결은 반환 시 폐기)
+        self.validate_after = IDLE_VALIDATE_AFTER
+        self.max_checkout = MAX_CHECKOUT_SECONDS
         self.created_count = 0
-        self.active_count = 0
+        self.timeout_count = 0
+        self.validation_count = 0
+        self.validation_failures = 0
+        self.retry_count = 0
+        self.recycled_count = 0
+        self.checkout_count = 0
+        self.closed_count = 0
+        self.reclaimed_count = 0
+        self._leaked = deque()  # close() 없이 GC된 핸들의 연결 (GC 중에는 락을 잡지 않고 여기에만 넣음)
+        self._connections = set()  # 열려 있는 PooledConnection (유휴 + 사용 중)
+        self._checkout_times = deque(maxlen=WAIT_SAMPLE_SIZE * 10)  # 최근 체크아웃 시각 (초당 체크아웃)
+        self._wait_buckets = [0] * (len(WAIT_BUCKETS) + 1)  # 구간별 대기 횟수 (마지막은 +Inf)
+        self._wait_sum = 0.0
+        self._lifetime_sum = 0.0  # 닫힌 연결의 수명 합계 (초)
+        self._lifetime_max = 0.0
+        self._lifetime_uses = 0  # 닫힌 연결이 처리한 커서 수 합계
+        self._last_health = None  # 유지보수 스레드의 마지막 점검 결과 (time, healthy, message)
+        self._maintenance_thread = None
+        self._wait_times = deque(maxlen=WAIT_SAMPLE_SIZE)  # 대기 시간 샘플 (초)
         self._initialized = False
         self._config = None
 
@@ -116,123 +307,299 @@ class ConnectionPool:
         else:
             full_config = load_config()
             self._config = full_config.get('mssql', {})
+        self.validate_after = self._config.get('idle_validate_seconds', IDLE_VALIDATE_AFTER)
+        self.max_checkout = self._config.get('max_checkout_seconds', MAX_CHECKOUT_SECONDS)
+        self.min_size = min(self._config.get('pool_min_size', POOL_MIN_SIZE), self.size)
 
         # 기존 연결 정리
         self._clear_pool()
+        self._last_health = None
 
-        # 초기 연결 생성 (지연 로딩으로 변경 - 첫 요청 시 생성)
+        # 초기 연결은 유지보수 스레드가 바로 생성 (서버 시작을 막지 않음)
         self._initialized = True
-        log(f"Connection Pool 초기화 완료 (size={self.size}, lazy loading)")
+        self._start_maintenance()
+        log(f"Connection Pool 초기화 완료 (size={self.size}, min={self.min_size}, "
+            f"max_overflow={self.max_overflow})")
 
     def _clear_pool(self):
-        """풀 비우기"""
-        while not self.pool.empty():
-            try:
-                pooled = self.pool.get_nowait()
-                if pooled:
-                    pooled._force_close()
-            except queue.Empty:
+        """유휴 연결 닫기 (사용 중인 연결은 반환될 때 닫힘)"""
+        with self.lock:
+            self._generation += 1
+            idle = list(self._idle)
+            self._idle.clear()
+            self._open_count -= len(idle)
+        for pooled in idle:
+            pooled._force_close()
+
+    def _connect(self):
+        """pymssql 연결 생성 (실패 시 예외)"""
+        import pymssql
+        conn = pymssql.connect(
+            server=self._config.get('server', '192.168.0.173'),
+            user=self._config.get('user', 'members'),
+            password=self._config.get('password', 'msp1234'),
+            port=self._config.get('port', 55555),
+            database=self._config.get('database', 'MasterDB'),
+            charset='utf8',
+            login_timeout=10,
+            timeout=30
+        )
+        with self.lock:
+            self.created_count += 1
+        return conn
+
+    def _record_retry(self):
+        with self.lock:
+            self.retry_count += 1
+
+    def _record_wait(self, seconds):
+        """체크아웃 대기 시간 기록 (lock 안에서 호출)"""
+        self.checkout_count += 1
+        self._checkout_times.append(time.time())
+        self._wait_times.append(seconds)
+        self._wait_sum += seconds
+        for i, bound in enumerate(WAIT_BUCKETS):
+            if seconds <= bound:
+                self._wait_buckets[i] += 1
                 break
-        self.created_count = 0
-        self.active_count = 0
+        else:
+            self._wait_buckets[-1] += 1
+
+    def _track(self, pooled):
+        with self.lock:
+            self._connections.add(pooled)
+
+    def _record_closed(self, pooled):
+        """닫힌 연결의 수명/사용 횟수 기록 (PooledConnection._force_close에서 호출)"""
+        lifetime = time.time() - pooled._created_at
+        with self.lock:
+            self._connections.discard(pooled)
+            self.closed_count += 1
+            self._lifetime_sum += lifetime
+            self._lifetime_max = max(self._lifetime_max, lifetime)
+            self._lifetime_uses += pooled._use_count
 
     def _create_connection(self):
         """새 연결 생성"""
         try:
-            import pymssql
-            conn = pymssql.connect(
-                server=self._config.get('server', '192.168.0.173'),
-                user=self._config.get('user', 'members'),
-                password=self._config.get('password', 'msp1234'),
-                port=self._config.get('port', 55555),
-                database=self._config.get('database', 'MasterDB'),
-                charset='utf8',
-                login_timeout=10,
-                timeout=30
-            )
-            self.created_count += 1
-            return PooledConnection(conn, self)
+            pooled = PooledConnection(self._connect(), self)
+            pooled._generation = self._generation
+            self._track(pooled)
+            return pooled
         except Exception as e:
             log(f"연결 생성 실패: {e}")
             return None
 
-    def get_connection(self, database=None):
-        """풀에서 연결 획득"""
-        if not self._initialized:
-            self.initialize()
+    def _acquire(self):
+        """유휴 연결 또는 생성 슬롯 확보 (없으면 FIFO 대기)
 
-        pooled = None
+        Returns:
+            (PooledConnection 또는 None, 생성 슬롯 확보 여부)
+            둘 다 없으면 타임아웃
+        """
+        started = time.time()
+        with self.lock:
+            if not self._waiters:
+                if self._idle:
+                    self._record_wait(0.0)
+                    return self._idle.pop(), False
+                if self._open_count < self.size + self.max_overflow:
+                    self._open_count += 1
+                    self._record_wait(0.0)
+                    return None, True
+            waiter = _Waiter()
+            self._waiters.append(waiter)
 
-        # 1. 풀에서 기존 연결 시도
-        try:
-            pooled = self.pool.get_nowait()
+        waiter.event.wait(self.timeout)
 
-            # 만료되었거나 유효하지 않은 연결은 폐기
-            if pooled.is_expired() or not pooled.is_valid():
-                pooled._force_close()
-                pooled = None
-        except queue.Empty:
-            pass
+        with self.lock:
+            if not waiter.event.is_set():
+                # 타임아웃 - 대기열에서 제거
+                self._waiters.remove(waiter)
+                self.timeout_count += 1
+                return None, False
+            self._record_wait(time.time() - started)
+            return waiter.pooled, waiter.may_create
 
-        # 2. 새 연결 생성
-        if pooled is None:
-            with self.lock:
-                pooled = self._create_connection()
+    def _release_slot(self):
+        """연결 슬롯 반납 (닫힌 연결 자리) - 대기자가 있으면 생성 슬롯으로 넘김 (lock 안에서 호출)"""
+        if self._waiters:
+            waiter = self._waiters.popleft()
+            waiter.may_create = True
+            waiter.event.set()
+        else:
+            self._open_count -= 1
+
+    def get_connection(self):
+        """풀에서 연결 획득 (모두 사용 중이면 POOL_TIMEOUT까지 대기)"""
+        if not self._initialized:
+            self.initialize()
+        self._reclaim_leaked()
+
+        pooled, may_create = self._acquire()
+        if pooled is not None:
+            pooled._closed = False
+            pooled._untested = False
+            if pooled._conn is None or pooled.is_expired():
+                pooled._force_close()
+                pooled, may_create = None, True
+            elif pooled.idle_seconds() > self.validate_after:
+                # 오래 놀던 연결만 SELECT 1 점검 (끊겼으면 같은 슬롯에 새로 생성)
+                valid = pooled.is_valid()
+                with self.lock:
+                    self.validation_count += 1
+                    if not valid:
+                        self.validation_failures += 1
+                if not valid:
+                    pooled._force_close()
+                    pooled, may_create = None, True
+            else:
+                # 최근에 쓰던 연결은 점검 생략 - 첫 쿼리가 연결 오류면 재연결 후 재시도
+                pooled._untested = True
 
         if pooled is None:
-            log("연결 획득 실패: 연결 생성 실패")
-            return None
+            if not may_create:
+                log(f"연결 획득 실패: {self.timeout}초 동안 사용 가능한 연결 없음")
+                return None
+            pooled = self._create_connection()
+            if pooled is None:
+                with self.lock:
+                    self._release_slot()
+                log(f"연결 획득 실패: 연결 생성 실패")
+                return None
 
         # 연결 상태 리셋
         pooled._closed = False
         pooled._last_used = time.time()
+        return self._check_out(pooled)
 
-        # 데이터베이스 변경 필요 시
-        if database and database != self._config.get('database', 'MasterDB'):
-            try:
-                cursor = pooled._conn.cursor()
-                cursor.execute(f"USE [{database}]")
-                cursor.close()
-            except Exception as e:
-                log(f"데이터베이스 변경 실패: {e}")
-
-        self.active_count += 1
-        return pooled
+    def _check_out(self, pooled):
+        """요청별 핸들 생성 - 핸들이 close() 없이 GC되면 연결을 _leaked에 넣음"""
+        handle = _Checkout(pooled)
+        handle._finalizer = weakref.finalize(handle, self._leaked.append, pooled)
+        with self.lock:
+            pooled._checkout = handle._finalizer
+            pooled._checked_out_at = time.time()
+        return handle
 
     def _return_connection(self, pooled):
         """연결을 풀에 반환 (PooledConnection.close()에서 호출)"""
         if pooled is None:
             return
 
-        self.active_count = max(0, self.active_count - 1)
+        with self.lock:
+            pooled._checkout = None
+            # 이전 설정의 연결, 만료된 연결, 대기자 없는 overflow 연결은 폐기
+            discard = (
+                pooled._generation != self._generation
+                or pooled._conn is None
+                or pooled.is_expired()
+                or (not self._waiters and self._open_count > self.size)
+            )
+            pooled._last_used = time.time()
+            if discard:
+                self._release_slot()
+            elif self._waiters:
+                waiter = self._waiters.popleft()
+                waiter.pooled = pooled
+                waiter.event.set()
+            else:
+                self._idle.append(pooled)
 
-        # 만료된 연결은 폐기
-        if pooled.is_expired():
+        if discard:
             pooled._force_close()
-            return
 
-        # 풀에 반환
-        try:
-            pooled._closed = False  # 재사용 가능하도록
-            self.pool.put_nowait(pooled)
-        except queue.Full:
-            # 풀이 가득 차면 연결 폐기
-            pooled._force_close()
+    def _wait_percentiles(self):
+        """대기 시간 백분위 (ms, lock 안에서 호출)"""
+        samples = sorted(self._wait_times)
+        if not samples:
+            return {"p50": 0, "p90": 0, "p99": 0, "max": 0, "samples": 0}
 
-    def get_stats(self):
-        """풀 상태 반환"""
+        def pick(q):
+            return round(samples[min(len(samples) - 1, int(len(samples) * q))] * 1000, 1)
+
+        return {
+            "p50": pick(0.5),
+            "p90": pick(0.9),
+            "p99": pick(0.99),
+            "max": round(samples[-1] * 1000, 1),
+            "samples": len(samples)
+        }
+
+    def _wait_histogram(self):
+        """대기 시간 누적 히스토그램 (Prometheus 형식 구간, lock 안에서 호출)"""
+        buckets = []
+        cumulative = 0
+        for bound, count in zip(WAIT_BUCKETS + ("+Inf",), self._wait_buckets):
+            cumulative += count
+            buckets.append([bound, cumulative])
+        return {"buckets": buckets, "sum_s": round(self._wait_sum, 6), "count": cumulative}
+
+    def _lifetime_stats(self):
+        """닫힌 연결 수명 / 열린 연결 상태 (lock 안에서 호출)"""
+        now = time.time()
+        idle = set(map(id, self._idle))
+        closed = self.closed_count
         return {
-            "pool_size": self.size,
-            "available": self.pool.qsize(),
-            "active": self.active_count,
-            "total_created": self.created_count,
-            "initialized": self._initialized
+            "closed": closed,
+            "sum_s": round(self._lifetime_sum, 3),
+            "avg_s": round(self._lifetime_sum / closed, 1) if closed else 0,
+            "max_s": round(self._lifetime_max, 1),
+            "avg_uses": round(self._lifetime_uses / closed, 1) if closed else 0,
+            "open_connections": [
+                {
+                    "age_s": round(now - pooled._created_at, 1),
+                    "idle_s": round(now - pooled._last_used, 1),
+                    "uses": pooled._use_count,
+                    "in_use": id(pooled) not in idle
+                }
+                for pooled in sorted(self._connections, key=lambda p: p._created_at)
+            ]
         }
 
+    def get_stats(self):
+        """풀 상태 반환"""
+        with self.lock:
+            now = time.time()
+            recent = sum(1 for t in self._checkout_times if now - t <= RATE_WINDOW)
+            return {
+                "pool_size": self.size,
+                "max_overflow": self.max_overflow,
+                "timeout": self.timeout,
+                "available": len(self._idle),
+                "active": self._open_count - len(self._idle),
+                "open": self._open_count,
+                "waiting": len(self._waiters),
+                "total_created": self.created_count,
+                "timeouts": self.timeout_count,
+                "idle_validate_seconds": self.validate_after,
+                "validations": self.validation_count,
+                "validation_failures": self.validation_failures,
+                "retries": self.retry_count,
+                "min_size": self.min_size,
+                "recycled": self.recycled_count,
+                "reclaimed": self.reclaimed_count,
+                "max_checkout_seconds": self.max_checkout,
+                "last_health_check": (datetime.fromtimestamp(self._last_health[0]).isoformat(timespec='seconds')
+                                      if self._last_health else None),
+                "checkouts": self.checkout_count,
+                "checkouts_per_sec": round(recent / RATE_WINDOW, 2),
+                "wait_ms": self._wait_percentiles(),
+                "wait_histogram": self._wait_histogram(),
+                "lifetime": self._lifetime_stats(),
+                "initialized": self._initialized
+            }
+
     def health_check(self):
-        """풀 상태 점검"""
+        """풀 상태 점검 (유지보수 스레드의 최근 점검 결과가 있으면 그대로 사용)"""
         stats = self.get_stats()
 
+        last_health = self._last_health
+        if last_health and time.time() - last_health[0] < HEALTH_CHECK_INTERVAL * 2:
+            stats["healthy"] = last_health[1]
+            stats["message"] = last_health[2]
+            return stats
+
         # 테스트 연결
         try:
             pooled = self.get_connection()
@@ -241,6 +608,8 @@ class ConnectionPool:
                 stats["healthy"] = True
                 stats["message"] = "OK"
             else:
+                if pooled:
+                    pooled.close()
                 stats["healthy"] = False
                 stats["message"] = "연결 테스트 실패"
         except Exception as e:
@@ -249,6 +618,139 @@ class ConnectionPool:
 
         return stats
 
+    # ============ 유지보수 스레드 ============
+
+    def _start_maintenance(self):
+        """유지보수 스레드 시작 (이미 실행 중이면 그대로 사용)"""
+        if self._maintenance_thread is None or not self._maintenance_thread.is_alive():
+            self._maintenance_thread = threading.Thread(
+                target=self._maintenance_loop, daemon=True, name="mssql-pool"
+            )
+            self._maintenance_thread.start()
+
+    def _maintenance_loop(self):
+        last_check = 0
+        while True:
+            try:
+                if time.time() - last_check >= HEALTH_CHECK_INTERVAL:
+                    # 유휴 연결 점검 후 최소 연결 수 채움 (시작 직후 첫 회차는 채우기만)
+                    last_check = time.time()
+                    self._check_idle()
+                else:
+                    self._recycle_aging()
+                self._reclaim_leaked()
+                self._reclaim_stale()
+            except Exception as e:
+                log(f"풀 유지보수 오류: {e}")
+            time.sleep(MAINTENANCE_TICK)
+
+    def _take_idle(self, predicate):
+        """조건에 맞는 유휴 연결 하나를 꺼냄 (슬롯은 유지, 처리 후 반환하거나 슬롯 반납)"""
+        with self.lock:
+            for pooled in self._idle:
+                if predicate(pooled):
+                    self._idle.remove(pooled)
+                    return pooled
+        return None
+
+    def _discard_checkout(self, pooled, reason):
+        """사용 중으로 남은 연결을 닫고 슬롯 반납 (대기자가 있으면 생성 슬롯으로 넘김)"""
+        with self.lock:
+            pooled._checkout = None
+            self.reclaimed_count += 1
+            self._release_slot()
+        pooled._force_close()
+        log(f"{reason} 연결 회수")
+
+    def _reclaim_leaked(self):
+        """close() 없이 버려진 핸들의 연결 회수 (트랜잭션 상태를 알 수 없으므로 재사용하지 않고 닫음)"""
+        while True:
+            try:
+                pooled = self._leaked.popleft()
+            except IndexError:
+                return
+            self._discard_checkout(pooled, "close() 없이 버려진")
+
+    def _reclaim_stale(self):
+        """max_checkout 초 넘게 반환되지 않은 연결 강제 회수 (이후 그 핸들을 쓰면 오류)"""
+        limit = time.time() - self.max_checkout
+        with self.lock:
+            stale = [pooled for pooled in self._connections
+                     if pooled._checkout is not None and pooled._checked_out_at < limit]
+        for pooled in stale:
+            finalizer = pooled._checkout
+            # detach 성공한 쪽만 처리 - 그 사이 close()로 반환됐으면 건너뜀
+            if finalizer is not None and finalizer.detach():
+                self._discard_checkout(pooled, f"{self.max_checkout}초 넘게 반환되지 않은")
+
+    def _fill_min(self):
+        """열린 연결이 min_size가 될 때까지 생성. 생성 실패 시 False"""
+        while True:
+            with self.lock:
+                if self._waiters or self._open_count >= self.min_size:
+                    return True
+                self._open_count += 1
+            pooled = self._create_connection()
+            if pooled is None:
+                with self.lock:
+                    self._release_slot()
+                return False
+            self._return_connection(pooled)
+
+    def _recycle_aging(self):
+        """수명 만료가 가까운 유휴 연결을 새 연결로 교체 (요청이 만료 연결을 만나지 않도록)"""
+        threshold = CONNECTION_MAX_AGE - RECYCLE_BEFORE
+        while True:
+            old = self._take_idle(lambda p: time.time() - p._created_at > threshold)
+            if old is None:
+                return
+            fresh = self._create_connection()
+            if fresh is None:
+                # 새 연결 실패 - 기존 연결은 만료 전까지 계속 사용
+                self._return_connection(old)
+                return
+            old._force_close()
+            with self.lock:
+                self.recycled_count += 1
+            self._return_connection(fresh)
+
+    def _check_idle(self):
+        """유휴 연결 SELECT 1 점검 (끊긴 연결은 닫고 최소 연결 수 다시 채움)"""
+        started = time.time()
+        checked = failed = 0
+        while True:
+            pooled = self._take_idle(lambda p: p._last_used < started)
+            if pooled is None:
+                break
+            pooled._closed = False
+            valid = pooled.is_valid()
+            pooled._closed = True
+            checked += 1
+            with self.lock:
+                self.validation_count += 1
+                if not valid:
+                    self.validation_failures += 1
+            if valid:
+                self._return_connection(pooled)  # _last_used 갱신 -> 체크아웃 시 재점검 생략
+            else:
+                failed += 1
+                pooled._force_close()
+                with self.lock:
+                    self._release_slot()
+
+        if failed:
+            log(f"풀 점검: 끊긴 연결 {failed}/{checked}개 폐기")
+        filled = self._fill_min()
+        self._recycle_aging()
+
+        # 점검한 연결도, 새로 연 연결도 없으면 결과를 남기지 않음 (health_check가 직접 테스트)
+        if not filled:
+            self._last_health = (time.time(), False, "연결 생성 실패")
+        elif checked > failed or self.min_size:
+            self._last_health = (time.time(), True, "OK")
+        elif checked:
+            self._last_health = (time.time(), False, "연결 테스트 실패")
+
 
 # 전역 Connection Pool 인스턴스
 _pool = ConnectionPool()
@@ -268,16 +770,13 @@ def initialize_pool(config=None):
     _pool.initialize(config)
 
 
-def get_connection(database=None):
-    """MSSQL 연결 획득 (풀 사용)
-
-    Args:
-        database: 데이터베이스 이름 (기본값: config의 database 또는 MasterDB)
+def get_connection():
+    """MSSQL 연결 획득 (풀 사용, config의 database 또는 MasterDB)
 
     Returns:
-        PooledConnection (pymssql 연결처럼 사용 가능, close() 호출 시 풀에 반환)
+        연결 핸들 (pymssql 연결처럼 사용 가능, close() 호출 시 풀에 반환) - 실패 시 None
     """
-    return _pool.get_connection(database)
+    return _pool.get_connection()
 
 
 def get_pool_stats():
@@ -285,6 +784,57 @@ def get_pool_stats():
     return _pool.get_stats()
 
 
+def get_prometheus_metrics():
+    """풀 지표 (Prometheus text exposition 형식, /metrics 엔드포인트용)"""
+    gauges = (
+        ("open", "mssql_pool_connections_open", "열린 연결 수"),
+        ("available", "mssql_pool_connections_idle", "유휴 연결 수"),
+        ("active", "mssql_pool_connections_active", "사용 중 연결 수"),
+        ("waiting", "mssql_pool_waiting", "연결 대기 중 요청 수"),
+        ("pool_size", "mssql_pool_size", "풀 크기"),
+        ("checkouts_per_sec", "mssql_pool_checkouts_per_second", f"최근 {RATE_WINDOW}초 초당 체크아웃"),
+    )
+    counters = (
+        ("checkouts", "mssql_pool_checkouts_total", "체크아웃 횟수"),
+        ("timeouts", "mssql_pool_checkout_timeouts_total", "체크아웃 타임아웃 횟수"),
+        ("total_created", "mssql_pool_connections_created_total", "생성된 연결 수"),
+        ("recycled", "mssql_pool_connections_recycled_total", "만료 전 교체된 연결 수"),
+        ("reclaimed", "mssql_pool_connections_reclaimed_total", "반환되지 않아 회수한 연결 수"),
+        ("validations", "mssql_pool_validations_total", "SELECT 1 점검 횟수"),
+        ("validation_failures", "mssql_pool_validation_failures_total", "점검 실패 횟수"),
+        ("retries", "mssql_pool_retries_total", "재연결 후 재시도 횟수"),
+    )
+
+    stats_list = [((_pool._config or {}).get('database', 'MasterDB'), _pool.get_stats())]
+
+    lines = []
+    for key, name, help_text in gauges + counters:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {'counter' if name.endswith('_total') else 'gauge'}")
+        for label, stats in stats_list:
+            lines.append(f'{name}{{database="{label}"}} {stats[key]}')
+
+    name = "mssql_pool_checkout_wait_seconds"
+    lines.append(f"# HELP {name} 체크아웃 대기 시간")
+    lines.append(f"# TYPE {name} histogram")
+    for label, stats in stats_list:
+        histogram = stats["wait_histogram"]
+        for bound, count in histogram["buckets"]:
+            lines.append(f'{name}_bucket{{database="{label}",le="{bound}"}} {count}')
+        lines.append(f'{name}_sum{{database="{label}"}} {histogram["sum_s"]}')
+        lines.append(f'{name}_count{{database="{label}"}} {histogram["count"]}')
+
+    name = "mssql_pool_connection_lifetime_seconds"
+    lines.append(f"# HELP {name} 닫힌 연결의 수명")
+    lines.append(f"# TYPE {name} summary")
+    for label, stats in stats_list:
+        lifetime = stats["lifetime"]
+        lines.append(f'{name}_sum{{database="{label}"}} {lifetime["sum_s"]}')
+        lines.append(f'{name}_count{{database="{label}"}} {lifetime["closed"]}')
+
+    return "\n".join(lines) + "\n"
+
+
 def health_check():
     """상태 점검"""
     return _pool.health_check()
@@ -309,6 +859,205 @@ def test_connection():
             conn.close()  # 풀에 반환
 
 
+# ============ 쿼리 빌더 ============
+# pymssql은 파라미터를 클라이언트에서 SQL 문자열에 직접 치환하므로
+# 날짜/원장이 바뀔 때마다 SQL Server가 새 ad-hoc 실행 계획을 만든다.
+# sp_executesql로 감싸면 본문 SQL이 항상 같아져 실행 계획이 재사용된다.
+
+_PARAM_PATTERN = re.compile(r"%\((\w+)\)s|%%")
+_DATE_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+def _sql_type(value):
+    """파라미터 값 -> sp_executesql 선언 타입"""
+    if isinstance(value, bool):
+        return "bit"
+    if isinstance(value, int):
+        return "bigint"
+    if isinstance(value, float):
+        return "float"
+    if isinstance(value, datetime):
+        return "datetime"
+    if isinstance(value, date):
+        return "date"
+    if isinstance(value, str) and _DATE_PATTERN.match(value):
+        return "date"
+    return "nvarchar(4000)"
+
+
+def build_query(sql, params=None):
+    """named 파라미터 SQL을 sp_executesql 호출문으로 변환
+
+    Args:
+        sql: %(name)s 형식 파라미터를 사용하는 SQL.
+             그 외의 %는 리터럴로 취급 (LIKE '%자동차보험%' 그대로 사용 가능, %%도 허용)
+        params: 파라미터 dict (SQL에서 참조하지 않는 키는 무시)
+                'YYYY-MM-DD' 문자열은 date 타입으로 선언
+
+    Returns:
+        tuple: (cursor.execute에 넘길 SQL, 파라미터 dict 또는 None)
+    """
+    params = params or {}
+    names = []
+
+    def replace(match):
+        name = match.group(1)
+        if name is None:
+            return "%"
+        if name not in params:
+            raise KeyError(f"SQL 파라미터 누락: {name}")
+        if name not in names:
+            names.append(name)
+        return f"@{name}"
+
+    body = _PARAM_PATTERN.sub(replace, sql)
+    if not names:
+        return body, None
+
+    declarations = ", ".join(f"@{name} {_sql_type(params[name])}" for name in names)
+    assignments = ", ".join(f"@{name} = %({name})s" for name in names)
+    body = body.replace("'", "''").replace("%", "%%")
+    statement = f"EXEC sp_executesql N'{body}', N'{declarations}', {assignments}"
+    return statement, {name: params[name] for name in names}
+
+
+def execute(cursor, sql, params=None):
+    """파라미터 쿼리 실행 (sp_executesql, 실행 계획 재사용)
+
+    주의: sp_executesql 안에서 만든 #임시테이블은 호출이 끝나면 사라진다.
+    여러 번 조회할 임시 테이블은 바깥 배치에서 먼저 만들고 INSERT만 이 함수로 실행한다.
+    """
+    statement, args = build_query(sql, params)
+    if args is None:
+        cursor.execute(statement)
+    else:
+        cursor.execute(statement, args)
+
+
+# ============ 자보 방문 임시 테이블 (통계 공용) ============
+# 자보 여부 = 같은 환자·같은 날 Detail에 '자동차보험' 항목이 있는지.
+# 행마다 EXISTS 서브쿼리로 Detail을 다시 뒤지지 않도록 기간 내 자보 방문을
+# #JaboVisits에 한 번만 계산해 두고 통계 쿼리는 이 테이블을 조회한다.
+# 임시 테이블은 연결(세션) 단위이므로 같은 연결의 커서에서만 사용할 수 있다.
+
+_STAGE_JABO_COLUMNS = """
+        d.Customer_PK,
+        CAST(d.TxDate AS DATE) as TxDateOnly
+"""
+_STAGE_DETAIL_COLUMNS = """
+        d.Detail_PK,
+        d.Customer_PK,
+        CAST(d.TxDate AS DATE) as TxDateOnly,
+        d.TxDoctor,
+        d.PxName,
+        d.TxItem,
+        d.TxMoney,
+        d.InsuYes,
+        d.사고번호,
+        CASE WHEN j.Customer_PK IS NOT NULL THEN 1 ELSE 0 END as IsJabo
+"""
+_STAGE_DETAIL_FROM = """
+    FROM Detail d
+    LEFT JOIN #JaboVisits j ON d.Customer_PK = j.Customer_PK AND CAST(d.TxDate AS DATE) = j.TxDateOnly
+"""
+_STAGE_RECEIPT_COLUMNS = """
+        r.Receipt_PK,
+        r.Customer_PK,
+        CAST(r.TxDate AS DATE) as TxDateOnly,
+        ISNULL(r.Bonin_Money, 0) as Bonin_Money,
+        ISNULL(r.CheongGu_Money, 0) as CheongGu_Money,
+        ISNULL(r.General_Money, 0) as General_Money,
+        CASE WHEN j.Customer_PK IS NOT NULL THEN 1 ELSE 0 END as IsJabo,
+        (SELECT TOP 1 td.TxDoctor FROM #TempDetail td
+         WHERE td.Customer_PK = r.Customer_PK AND td.TxDateOnly = CAST(r.TxDate AS DATE)
+         AND td.TxDoctor IS NOT NULL AND td.TxDoctor != ''
+         ORDER BY td.Detail_PK) as RepDoctor
+"""
+_STAGE_RECEIPT_FROM = """
+    FROM Receipt r
+    LEFT JOIN #JaboVisits j ON r.Customer_PK = j.Customer_PK AND CAST(r.TxDate AS DATE) = j.TxDateOnly
+"""
+
+_DROP_STAGED_SQL = """
+        IF OBJECT_ID('tempdb..#TempReceipt') IS NOT NULL DROP TABLE #TempReceipt;
+        IF OBJECT_ID('tempdb..#TempDetail') IS NOT NULL DROP TABLE #TempDetail;
+        IF OBJECT_ID('tempdb..#JaboVisits') IS NOT NULL DROP TABLE #JaboVisits;
+"""
+
+
+def stage_visits(cursor, start_date, end_date, detail=False, receipt=False):
+    """기간 내 자보 방문 임시 테이블 생성 및 적재
+
+    Args:
+        cursor: 이후 통계 쿼리를 실행할 연결의 커서
+        start_date, end_date: 'YYYY-MM-DD' (종료일 포함)
+        detail: True면 #TempDetail (기간 내 Detail + IsJabo)도 생성
+        receipt: True면 #TempReceipt (기간 내 Receipt + IsJabo + RepDoctor)도 생성 (#TempDetail 필요)
+
+    생성 테이블:
+        #JaboVisits(Customer_PK, TxDateOnly) - 항상 생성
+    """
+    detail = detail or receipt
+
+    # 빈 구조 + 인덱스는 바깥 배치에서 생성 (sp_executesql 안에서 만들면 호출 종료 시 삭제됨)
+    create_sql = f"""
+        {_DROP_STAGED_SQL}
+
+        SELECT {_STAGE_JABO_COLUMNS} INTO #JaboVisits FROM Detail d WHERE 1 = 0;
+        CREATE INDEX IX_JaboVisits ON #JaboVisits(Customer_PK, TxDateOnly);
+    """
+    load_sql = f"""
+        INSERT INTO #JaboVisits
+        SELECT DISTINCT {_STAGE_JABO_COLUMNS}
+        FROM Detail d
+        WHERE d.TxDate >= %(start_date)s AND d.TxDate < DATEADD(DAY, 1, %(end_date)s)
+          AND d.TxItem LIKE '%자동차보험%';
+    """
+    if detail:
+        create_sql += f"""
+        SELECT {_STAGE_DETAIL_COLUMNS} INTO #TempDetail {_STAGE_DETAIL_FROM} WHERE 1 = 0;
+        CREATE INDEX IX_TempDetail_Customer ON #TempDetail(Customer_PK, TxDateOnly);
+        CREATE INDEX IX_TempDetail_Doctor ON #TempDetail(TxDoctor);
+        CREATE INDEX IX_TempDetail_IsJabo ON #TempDetail(IsJabo);
+        """
+        load_sql += f"""
+        INSERT INTO #TempDetail
+        SELECT {_STAGE_DETAIL_COLUMNS}
+        {_STAGE_DETAIL_FROM}
+        WHERE d.TxDate >= %(start_date)s AND d.TxDate < DATEADD(DAY, 1, %(end_date)s);
+        """
+    if receipt:
+        create_sql += f"""
+        SELECT {_STAGE_RECEIPT_COLUMNS} INTO #TempReceipt {_STAGE_RECEIPT_FROM} WHERE 1 = 0;
+        CREATE INDEX IX_TempReceipt_Customer ON #TempReceipt(Customer_PK, TxDateOnly);
+        CREATE INDEX IX_TempReceipt_IsJabo ON #TempReceipt(IsJabo);
+        CREATE INDEX IX_TempReceipt_RepDoctor ON #TempReceipt(RepDoctor);
+        """
+        load_sql += f"""
+        INSERT INTO #TempReceipt
+        SELECT {_STAGE_RECEIPT_COLUMNS}
+        {_STAGE_RECEIPT_FROM}
+        WHERE r.TxDate >= %(start_date)s AND r.TxDate < DATEADD(DAY, 1, %(end_date)s);
+        """
+
+    cursor.execute(create_sql)
+    execute(cursor, load_sql, {'start_date': start_date, 'end_date': end_date})
+
+
+def drop_staged_visits(cursor):
+    """stage_visits()로 만든 임시 테이블 삭제 (풀에 반환하기 전에 호출)"""
+    cursor.execute(_DROP_STAGED_SQL)
+
+
+def jabo_visit_sql(customer_col, date_col):
+    """(환자, 날짜) 방문이 자보 방문인지 검사하는 조건 (stage_visits() 이후 사용)
+
+    예: "NOT " + jabo_visit_sql('r.Customer_PK', 'r.TxDate')
+    """
+    return (f"EXISTS (SELECT 1 FROM #JaboVisits jv WHERE jv.Customer_PK = {customer_col} "
+            f"AND jv.TxDateOnly = CAST({date_col} AS DATE))")
+
+
 def format_referral_source(suggest, cust_url, suggcustnamesn):
     """유입경로 조합"""
     if not suggest:
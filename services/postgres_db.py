@@ -1,14 +1,37 @@
 """
 PostgreSQL 데이터베이스 연결 모듈 (Connection Pooling 지원)
+- 풀이 가득 차면 POOL_TIMEOUT까지 대기 (풀 밖 직접 연결을 만들지 않음)
+- 풀 크기는 Waitress 작업 스레드 수에 맞춤
+- session(): 연결 하나/트랜잭션 하나로 여러 쿼리 실행
+
+    with postgres_db.session() as s:
+        rows = s.query("SELECT ...", (a,))
+        s.execute("UPDATE ...", (b,))
 """
 
 import psycopg2
 from psycopg2 import pool
-from psycopg2.extras import RealDictCursor
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN
+from psycopg2.extras import execute_values
 import threading
+import time
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime
 from config import load_config
 
+# Waitress 작업 스레드 수 (gui.py에서 serve(threads=...)로 사용)
+SERVER_THREADS = 64
+
+# Connection Pool 설정
+POOL_MIN_CONN = 5  # 초기화 시 미리 여는 연결 수
+POOL_MAX_CONN = SERVER_THREADS  # 작업 스레드마다 연결 하나 (스레드 수보다 많이 열 필요 없음)
+POOL_TIMEOUT = 30  # 풀이 가득 찼을 때 연결 대기 시간 (초)
+WAIT_SAMPLE_SIZE = 1000  # 대기 시간 백분위 계산용 샘플 수
+
+# 서버 측 커서 스트리밍 (Session.stream)
+STREAM_BATCH_SIZE = 500  # 한 번에 가져오는 행 수
+
 # 전역 변수
 _config = None
 _connection_pool = None
@@ -63,8 +86,181 @@ def reload_config():
     return get_db_config()
 
 
-def init_pool(min_conn=5, max_conn=20):
-    """연결 풀 초기화"""
+class BlockingConnectionPool:
+    """최대 max_conn개까지만 여는 psycopg2 연결 풀
+
+    - 모두 사용 중이면 timeout까지 대기 후 pool.PoolError
+    - 반환된 연결은 닫지 않고 재사용 (ThreadedConnectionPool은 min_conn 초과분을 닫음)
+    - 이 풀에서 나가지 않은 연결이 반환되면 닫기만 함
+    """
+
+    def __init__(self, min_conn, max_conn, timeout=POOL_TIMEOUT, **connect_kwargs):
+        self.min_conn = min(min_conn, max_conn)
+        self.max_conn = max_conn
+        self.timeout = timeout
+        self._connect_kwargs = connect_kwargs
+        self._cond = threading.Condition()
+        self._idle = []  # 유휴 연결 (LIFO)
+        self._in_use = set()  # 사용 중 연결 id
+        self._opening = 0  # 생성 중인 연결 수
+        self._waiting = 0
+        self._closed = False
+        self.created_count = 0
+        self.checkout_count = 0
+        self.wait_count = 0  # 대기가 필요했던 체크아웃 수
+        self.timeout_count = 0  # 풀 고갈로 실패한 체크아웃 수
+        self.discarded_count = 0  # 끊어져서 버린 연결 수
+        self.peak_in_use = 0
+        self._wait_times = deque(maxlen=WAIT_SAMPLE_SIZE)  # 대기 시간 샘플 (초)
+
+        for _ in range(self.min_conn):
+            self._idle.append(self._connect())
+
+    def _connect(self):
+        conn = psycopg2.connect(**self._connect_kwargs)
+        with self._cond:
+            self.created_count += 1
+        return conn
+
+    def _open_count(self):
+        """열린 연결 수 (lock 안에서 호출)"""
+        return len(self._idle) + len(self._in_use) + self._opening
+
+    def getconn(self):
+        """연결 가져오기 (유휴 연결 -> 새 연결 -> 대기)"""
+        started = time.time()
+        deadline = started + self.timeout
+        with self._cond:
+            waited = False
+            while True:
+                if self._closed:
+                    raise pool.PoolError("connection pool is closed")
+                # 대기자가 있으면 새로 온 요청은 줄을 섬 (반환 직후 재요청이 대기자를 계속 앞지르지 않도록)
+                if waited or not self._waiting:
+                    if self._idle:
+                        conn = self._idle.pop()
+                        break
+                    if self._open_count() < self.max_conn:
+                        conn = None
+                        self._opening += 1
+                        break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    self.timeout_count += 1
+                    raise pool.PoolError(
+                        f"connection pool exhausted ({self.max_conn}개 모두 사용 중, {self.timeout}초 대기)"
+                    )
+                waited = True
+                self._waiting += 1
+                self._cond.wait(remaining)
+                self._waiting -= 1
+
+            if self._waiting and (self._idle or self._open_count() < self.max_conn):
+                self._cond.notify()  # 남은 여유분은 다음 대기자에게
+            if conn is not None:
+                self._checked_out(conn, started, waited)
+                return conn
+
+        # 새 연결은 lock 밖에서 생성 (자리는 _opening으로 확보)
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._opening -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._opening -= 1
+            self._checked_out(conn, started, waited)
+        return conn
+
+    def _checked_out(self, conn, started, waited):
+        """체크아웃 기록 (lock 안에서 호출)"""
+        self._in_use.add(id(conn))
+        self.checkout_count += 1
+        if waited:
+            self.wait_count += 1
+        self._wait_times.append(time.time() - started)
+        self.peak_in_use = max(self.peak_in_use, len(self._in_use))
+
+    def putconn(self, conn):
+        """연결 반환 (진행 중 트랜잭션은 롤백, 끊어진 연결은 버림)"""
+        with self._cond:
+            known = id(conn) in self._in_use
+            self._in_use.discard(id(conn))
+
+        keep = known and not self._closed and not conn.closed
+        if keep:
+            try:
+                status = conn.info.transaction_status
+                if status == TRANSACTION_STATUS_UNKNOWN:
+                    keep = False
+                elif status != TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                keep = False
+
+        if not keep:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+        with self._cond:
+            if keep:
+                self._idle.append(conn)
+            elif known:
+                self.discarded_count += 1
+            self._cond.notify()
+
+    def closeall(self):
+        """유휴 연결 닫기 (사용 중인 연결은 반환될 때 닫힘)"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for conn in idle:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def get_stats(self):
+        """풀 상태 반환"""
+        with self._cond:
+            samples = sorted(self._wait_times)
+
+            def pick(q):
+                if not samples:
+                    return 0
+                return round(samples[min(len(samples) - 1, int(len(samples) * q))] * 1000, 1)
+
+            return {
+                "min_conn": self.min_conn,
+                "max_conn": self.max_conn,
+                "timeout": self.timeout,
+                "open": self._open_count(),
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+                "peak_in_use": self.peak_in_use,
+                "waiting": self._waiting,
+                "total_created": self.created_count,
+                "checkouts": self.checkout_count,
+                "waited_checkouts": self.wait_count,
+                "exhausted": self.timeout_count,
+                "discarded": self.discarded_count,
+                "wait_ms": {
+                    "p50": pick(0.5),
+                    "p90": pick(0.9),
+                    "p99": pick(0.99),
+                    "max": round(samples[-1] * 1000, 1) if samples else 0,
+                    "samples": len(samples)
+                }
+            }
+
+
+def init_pool(min_conn=None, max_conn=None):
+    """연결 풀 초기화 (기본 크기: postgres 설정의 pool_min/pool_max 또는 POOL_MIN_CONN/POOL_MAX_CONN)"""
     global _connection_pool
 
     with _pool_lock:
@@ -75,10 +271,13 @@ def init_pool(min_conn=5, max_conn=20):
         if not config:
             raise Exception("PostgreSQL config not found")
 
+        min_conn = min_conn or config.get('pool_min', POOL_MIN_CONN)
+        max_conn = max_conn or config.get('pool_max', POOL_MAX_CONN)
         try:
-            _connection_pool = pool.ThreadedConnectionPool(
+            _connection_pool = BlockingConnectionPool(
                 min_conn,
                 max_conn,
+                timeout=config.get('pool_timeout', POOL_TIMEOUT),
                 host=config.get('host', 'localhost'),
                 port=config.get('port', 5432),
                 user=config.get('user', ''),
@@ -86,7 +285,8 @@ def init_pool(min_conn=5, max_conn=20):
                 database=config.get('database', ''),
                 connect_timeout=10
             )
-            log(f"연결 풀 초기화 완료 (min={min_conn}, max={max_conn})", force=True)
+            log(f"연결 풀 초기화 완료 (min={_connection_pool.min_conn}, max={max_conn}, "
+                f"timeout={_connection_pool.timeout}s)", force=True)
             return _connection_pool
         except Exception as e:
             log(f"연결 풀 초기화 실패: {e}", force=True)
@@ -114,29 +314,22 @@ def get_pool():
 
 
 def get_connection():
-    """연결 풀에서 연결 가져오기"""
+    """연결 풀에서 연결 가져오기 (풀이 가득 차면 POOL_TIMEOUT까지 대기, 실패 시 예외)"""
     try:
         p = get_pool()
-        conn = p.getconn()
-        return conn
+        return p.getconn()
     except Exception as e:
         log(f"연결 풀에서 연결 가져오기 실패: {e}", force=True)
-        # 풀 실패 시 직접 연결 시도
-        config = get_db_config()
-        return psycopg2.connect(
-            host=config.get('host', 'localhost'),
-            port=config.get('port', 5432),
-            user=config.get('user', ''),
-            password=config.get('password', ''),
-            database=config.get('database', ''),
-            connect_timeout=10
-        )
+        raise
 
 
 def put_connection(conn):
-    """연결을 풀에 반환"""
+    """연결을 풀에 반환 (풀이 없으면 닫기만 함)"""
     try:
-        p = get_pool()
+        p = _connection_pool
+        if p is None:
+            conn.close()
+            return
         p.putconn(conn)
     except Exception as e:
         log(f"연결 반환 실패: {e}")
@@ -146,6 +339,12 @@ def put_connection(conn):
             pass
 
 
+def get_pool_stats():
+    """풀 상태 조회 (초기화 전이면 None)"""
+    p = _connection_pool
+    return p.get_stats() if p is not None else None
+
+
 def get_dict_connection():
     """딕셔너리 형태로 결과 반환하는 연결 (풀 사용)"""
     conn = get_connection()
@@ -171,8 +370,127 @@ def test_connection():
         return {"success": False, "error": str(e)}
 
 
+def _fetch_dicts(cur):
+    """결과를 dict 리스트로 변환 (튜플 커서 + zip, RealDictRow 생성/복사 없음)"""
+    columns = [col[0] for col in cur.description]
+    return columns, [dict(zip(columns, row)) for row in cur.fetchall()]
+
+
+class Session:
+    """연결 하나에서 여러 쿼리 실행 (session()으로 생성, 커서 하나를 재사용)
+
+    columns: 마지막 query()의 컬럼명 (결과가 0행이어도 채워짐)
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.columns = []
+        self._cursor = conn.cursor()
+
+    def _execute(self, query, params):
+        if sql_logging_enabled:
+            log(f"Query: {query[:100]}...")
+            if params:
+                log(f"Params: {params}")
+        self._cursor.execute(query, params)
+        return self._cursor
+
+    def query(self, query, params=None):
+        """조회 - dict 리스트 반환"""
+        cur = self._execute(query, params)
+        self.columns, rows = _fetch_dicts(cur)
+        if sql_logging_enabled:
+            log(f"Results: {len(rows)} rows")
+        return rows
+
+    def query_one(self, query, params=None):
+        """조회 - 첫 행 dict (없으면 None)"""
+        cur = self._execute(query, params)
+        self.columns = [col[0] for col in cur.description]
+        row = cur.fetchone()
+        return dict(zip(self.columns, row)) if row is not None else None
+
+    def stream(self, query, params=None, batch_size=STREAM_BATCH_SIZE):
+        """조회 결과를 서버 측(named) 커서로 batch_size행씩 dict 리스트로 yield
+
+        전체 결과를 메모리에 올리지 않음. columns는 첫 batch를 가져온 뒤 채워진다.
+        session 안에서만 사용 (named 커서는 트랜잭션 안에서만 유효)
+        """
+        if sql_logging_enabled:
+            log(f"Stream: {query[:100]}...")
+        cur = self.conn.cursor(name=f"stream_{id(self):x}_{time.monotonic_ns():x}")
+        try:
+            cur.itersize = batch_size
+            self.columns = []
+            cur.execute(query, params)
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if cur.description is not None and not self.columns:
+                    self.columns = [col[0] for col in cur.description]
+                if not rows:
+                    break
+                yield [dict(zip(self.columns, row)) for row in rows]
+        finally:
+            try:
+                cur.close()
+            except Exception:
+                pass
+
+    def execute(self, query, params=None):
+        """INSERT/UPDATE/DELETE - affected rows 수 반환 (커밋은 session 종료 시)"""
+        affected = self._execute(query, params).rowcount
+        if sql_logging_enabled:
+            log(f"Affected rows: {affected}")
+        return affected
+
+    def execute_many(self, query, params_list):
+        """여러 행 삽입/업데이트 - affected rows 수 반환"""
+        if sql_logging_enabled:
+            log(f"Execute many: {query[:100]}... ({len(params_list)} rows)")
+        self._cursor.executemany(query, params_list)
+        return self._cursor.rowcount
+
+    def execute_values(self, query, rows, template=None):
+        """여러 행을 한 문장으로 실행 (query의 VALUES %s 자리에 rows 전개) - affected rows 수 반환"""
+        if not rows:
+            return 0
+        if sql_logging_enabled:
+            log(f"Execute values: {query[:100]}... ({len(rows)} rows)")
+        execute_values(self._cursor, query, rows, template=template, page_size=len(rows))
+        return self._cursor.rowcount
+
+    def commit(self):
+        """중간 커밋 (session 종료 시 자동 커밋되므로 보통 불필요)"""
+        self.conn.commit()
+
+    def close(self):
+        try:
+            self._cursor.close()
+        except Exception:
+            pass
+
+
+@contextmanager
+def session():
+    """풀 연결 하나로 트랜잭션 실행 (정상 종료 시 커밋, 예외 시 롤백 후 재발생)"""
+    conn = get_connection()
+    s = Session(conn)
+    try:
+        yield s
+        conn.commit()
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        raise
+    finally:
+        s.close()
+        put_connection(conn)
+
+
 def execute_query(query, params=None, fetch=True):
-    """쿼리 실행
+    """쿼리 실행 (단일 쿼리용, 여러 쿼리는 session() 사용)
 
     Args:
         query: SQL 쿼리
@@ -183,38 +501,13 @@ def execute_query(query, params=None, fetch=True):
         fetch=True: 결과 리스트 (딕셔너리)
         fetch=False: affected rows 수
     """
-    conn = None
     try:
-        conn = get_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-
-        log(f"Query: {query[:100]}...")
-        if params:
-            log(f"Params: {params}")
-
-        cur.execute(query, params)
-
-        if fetch:
-            results = cur.fetchall()
-            # RealDictRow를 일반 dict로 변환
-            results = [dict(row) for row in results]
-            cur.close()
-            put_connection(conn)
-            log(f"Results: {len(results)} rows")
-            return results
-        else:
-            affected = cur.rowcount
-            conn.commit()
-            cur.close()
-            put_connection(conn)
-            log(f"Affected rows: {affected}")
-            return affected
-
+        with session() as s:
+            if fetch:
+                return s.query(query, params)
+            return s.execute(query, params)
     except Exception as e:
         log(f"Query error: {e}", force=True)
-        if conn:
-            conn.rollback()
-            put_connection(conn)
         raise e
 
 
@@ -228,27 +521,13 @@ def execute_many(query, params_list):
     Returns:
         affected rows 수
     """
-    conn = None
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-
-        log(f"Execute many: {query[:100]}... ({len(params_list)} rows)")
-
-        cur.executemany(query, params_list)
-        affected = cur.rowcount
-        conn.commit()
-        cur.close()
-        put_connection(conn)
-
+        with session() as s:
+            affected = s.execute_many(query, params_list)
         log(f"Affected rows: {affected}")
         return affected
-
     except Exception as e:
         log(f"Execute many error: {e}", force=True)
-        if conn:
-            conn.rollback()
-            put_connection(conn)
         raise e
 
 
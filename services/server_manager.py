@@ -113,6 +113,8 @@ class HealthMonitor:
         self._restart_callbacks = {}  # name -> restart_function
         self._log_callback = None
         self._scheduler_thread = None
+        self._restart_job = None
+        self._jobs = {}  # name -> schedule.Job (주기 작업)
 
     def set_log_callback(self, callback: Callable):
         """로그 콜백 설정"""
@@ -137,6 +139,29 @@ class HealthMonitor:
         self._restart_time = time_str
         self._log(f"자동 재시작 시간: {time_str}")
 
+    def register_job(self, name: str, interval_seconds: int, job: Callable):
+        """주기 작업 등록 (스케줄러 스레드에서 interval_seconds마다 실행, 같은 이름은 교체)
+
+        모니터링(start) 여부와 관계없이 실행된다.
+        """
+        self.unregister_job(name)
+        self._jobs[name] = schedule.every(interval_seconds).seconds.do(self._run_job, name, job)
+        self._ensure_scheduler()
+        self._log(f"주기 작업 등록: {name} ({interval_seconds}초 간격)")
+
+    def unregister_job(self, name: str):
+        """주기 작업 해제"""
+        job = self._jobs.pop(name, None)
+        if job is not None:
+            schedule.cancel_job(job)
+            self._log(f"주기 작업 해제: {name}")
+
+    def _run_job(self, name, job):
+        try:
+            job()
+        except Exception as e:
+            self._log(f"{name} 작업 실패: {e}")
+
     def check_health(self, name: str = None):
         """상태 확인"""
         results = {}
@@ -169,13 +194,15 @@ class HealthMonitor:
             except Exception as e:
                 self._log(f"{name} 재시작 실패: {e}")
 
-    def _run_scheduler(self):
-        """스케줄러 실행"""
-        # 매일 지정된 시간에 재시작
-        schedule.every().day.at(self._restart_time).do(self._do_scheduled_restart)
-        self._log(f"자동 재시작 스케줄 등록: 매일 {self._restart_time}")
+    def _ensure_scheduler(self):
+        """스케줄러 스레드 시작 (이미 실행 중이면 그대로 사용)"""
+        if self._scheduler_thread is None or not self._scheduler_thread.is_alive():
+            self._scheduler_thread = threading.Thread(target=self._run_scheduler, daemon=True)
+            self._scheduler_thread.start()
 
-        while self._running:
+    def _run_scheduler(self):
+        """스케줄러 실행 (한 번 시작하면 계속 실행 - 등록된 작업이 없으면 대기만 함)"""
+        while True:
             schedule.run_pending()
             time.sleep(1)
 
@@ -210,9 +237,12 @@ class HealthMonitor:
 
         self._running = True
 
+        # 매일 지정된 시간에 재시작
+        self._restart_job = schedule.every().day.at(self._restart_time).do(self._do_scheduled_restart)
+        self._log(f"자동 재시작 스케줄 등록: 매일 {self._restart_time}")
+
         # 스케줄러 스레드
-        self._scheduler_thread = threading.Thread(target=self._run_scheduler, daemon=True)
-        self._scheduler_thread.start()
+        self._ensure_scheduler()
 
         # 상태 모니터링 스레드
         self._thread = threading.Thread(target=self._run_health_monitor, daemon=True)
@@ -223,7 +253,9 @@ class HealthMonitor:
     def stop(self):
         """모니터링 중지"""
         self._running = False
-        schedule.clear()
+        if self._restart_job is not None:
+            schedule.cancel_job(self._restart_job)
+            self._restart_job = None
         self._log("상태 모니터링 중지")
 
 
@@ -0,0 +1,302 @@
+"""
+SSE 전용 비동기 서버 (asyncio)
+- table_change 구독 스트림을 Waitress 작업 스레드 밖에서 처리
+- 스레드 하나의 이벤트 루프가 유휴 SSE 연결 수천 개를 유지
+- 알림은 change_feed 구독자 큐에서 받음 (DB 연결 없음)
+
+PostgreSQL API 포트(3200)의 /api/subscribe 요청은 이 서버(postgres_sse_port, 기본 3201)로
+307 리다이렉트되므로 클라이언트 URL은 그대로 쓸 수 있다.
+
+    GET /api/subscribe            - 모든 테이블 변경사항
+    GET /api/subscribe/<table>    - 특정 테이블 변경사항
+
+알림마다 이벤트 id를 붙이고, Last-Event-ID 헤더(또는 ?lastEventId=)로 재연결하면 놓친 알림을
+링 버퍼에서 재전송한다. 버퍼보다 오래된 공백이면 {"type": "reset"} 메시지 - 클라이언트가 전체 다시 로드.
+
+?coalesce_ms=200 이면 첫 알림 후 그 시간 동안 모은 알림을 같은 테이블+행 id끼리 합쳐(마지막 것만)
+{"type": "batch", "count": 받은 알림 수, "events": [...]} 메시지 하나로 보낸다.
+"""
+
+import asyncio
+import json
+import threading
+from datetime import datetime
+from urllib.parse import unquote, parse_qs
+from config import load_config
+from services import change_feed
+
+# 서버 설정
+DEFAULT_PORT = 3201
+KEEPALIVE_INTERVAL = 5  # keepalive 전송 간격 (초)
+HEADER_TIMEOUT = 10  # 요청 헤더 수신 제한 (초)
+MAX_HEADER_LINES = 100
+START_TIMEOUT = 5
+MAX_COALESCE_MS = 5000
+
+# 로그 콜백 (GUI에서 설정)
+log_callback = None
+
+_lock = threading.Lock()
+_thread = None
+_loop = None
+_port = None
+_start_error = None
+_stats = {
+    "active_streams": 0,
+    "total_streams": 0,
+    "rejected": 0,
+    "coalesced": 0,  # 배치로 합쳐져 전송하지 않은 알림 수
+}
+
+_CORS_HEADERS = (
+    "Access-Control-Allow-Origin: *\r\n"
+    "Access-Control-Allow-Methods: GET, OPTIONS\r\n"
+    "Access-Control-Allow-Headers: Content-Type, Authorization, X-Requested-With, Last-Event-ID\r\n"
+    "Access-Control-Max-Age: 3600\r\n"
+)
+
+
+def log(message):
+    """SSE 서버 로그 출력"""
+    timestamp = datetime.now().strftime("%H:%M:%S")
+    log_msg = f"[{timestamp}] [SSE] {message}"
+    print(log_msg)
+    if log_callback:
+        log_callback(log_msg)
+
+
+def get_port():
+    """설정된 SSE 포트 (postgres_sse_port)"""
+    return int(load_config().get("postgres_sse_port", DEFAULT_PORT))
+
+
+def is_running():
+    return _thread is not None and _thread.is_alive() and _loop is not None
+
+
+def get_stats():
+    """SSE 서버 상태 조회"""
+    return dict(_stats, running=is_running(), port=_port, error=_start_error)
+
+
+# ============ 서버 시작 ============
+
+def start(port=None, host='0.0.0.0'):
+    """SSE 서버 시작 (이미 실행 중이면 무시)
+
+    Returns:
+        실행 중이면 True (포트 사용 중 등으로 시작 실패 시 False)
+    """
+    global _thread, _port, _start_error
+    with _lock:
+        if is_running():
+            return True
+        port = port or get_port()
+        ready = threading.Event()
+        _port = port
+        _start_error = None
+        _thread = threading.Thread(target=_run, args=(host, port, ready), daemon=True, name="sse-server")
+        _thread.start()
+        ready.wait(START_TIMEOUT)
+        return is_running()
+
+
+def _run(host, port, ready):
+    global _loop, _start_error
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        server = loop.run_until_complete(asyncio.start_server(_handle, host, port))
+    except Exception as e:
+        _start_error = str(e)
+        log(f"SSE 서버 시작 실패 (포트: {port}): {e}")
+        ready.set()
+        loop.close()
+        return
+
+    _loop = loop
+    log(f"SSE 서버 시작 (포트: {port})")
+    ready.set()
+    try:
+        loop.run_forever()
+    finally:
+        _loop = None
+        server.close()
+        loop.close()
+
+
+# ============ 요청 처리 ============
+
+def _response_head(status, content_type):
+    return f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n{_CORS_HEADERS}"
+
+
+async def _send_json(writer, status, data):
+    body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+    head = _response_head(status, "application/json") + (
+        f"Content-Length: {len(body)}\r\n"
+        "Connection: close\r\n\r\n"
+    )
+    writer.write(head.encode("latin-1") + body)
+    await writer.drain()
+
+
+async def _read_request(reader):
+    """요청 줄 + 헤더 읽기 -> (method, path, query, headers)"""
+    request_line = (await reader.readline()).decode("latin-1").strip()
+    headers = {}
+    for _ in range(MAX_HEADER_LINES):
+        line = (await reader.readline()).decode("latin-1").strip()
+        if not line:
+            break
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    parts = request_line.split()
+    if len(parts) != 3:
+        return None, None, None, headers
+    method, target, _ = parts
+    path, _, query = target.partition("?")
+    return method, path, query, headers
+
+
+async def _handle(reader, writer):
+    try:
+        try:
+            method, path, query, headers = await asyncio.wait_for(_read_request(reader), HEADER_TIMEOUT)
+        except asyncio.TimeoutError:
+            return
+
+        if method is None:
+            await _send_json(writer, "400 Bad Request", {"error": "Bad request"})
+            return
+        if method == "OPTIONS":
+            writer.write((_response_head("204 No Content", "text/plain") +
+                          "Content-Length: 0\r\nConnection: close\r\n\r\n").encode("latin-1"))
+            await writer.drain()
+            return
+        if method != "GET":
+            await _send_json(writer, "405 Method Not Allowed", {"error": "Method not allowed"})
+            return
+
+        if path == "/api/subscribe":
+            table = None
+        elif path.startswith("/api/subscribe/") and path.count("/") == 3:
+            table = unquote(path[len("/api/subscribe/"):])
+        else:
+            await _send_json(writer, "404 Not Found", {"error": "Not found"})
+            return
+
+        # 재연결 시 EventSource가 보내는 Last-Event-ID (헤더를 못 보내는 클라이언트는 ?lastEventId=)
+        last_event_id = _parse_int(
+            headers.get("last-event-id") or parse_qs(query).get("lastEventId", [None])[0]
+        )
+        coalesce_ms = _parse_int(parse_qs(query).get("coalesce_ms", [None])[0]) or 0
+        await _stream(reader, writer, table, last_event_id, min(max(coalesce_ms, 0), MAX_COALESCE_MS))
+    except (ConnectionError, asyncio.CancelledError):
+        pass
+    except Exception as e:
+        log(f"요청 처리 오류: {e}")
+    finally:
+        try:
+            writer.close()
+        except Exception:
+            pass
+
+
+async def _wait_disconnect(reader):
+    """클라이언트가 연결을 끊을 때까지 대기 (SSE 클라이언트는 요청 후 보내는 데이터 없음)"""
+    while await reader.read(1024):
+        pass
+
+
+def _parse_int(value):
+    try:
+        return int(value) if value not in (None, "") else None
+    except ValueError:
+        return None
+
+
+# 재전송할 수 없는 공백 - 클라이언트는 전체를 다시 로드
+_RESET_MESSAGE = 'data: {"type": "reset", "message": "missed events, reload required"}\n\n'
+
+
+def _batch_message(events):
+    """알림 여러 건을 같은 테이블+행 id끼리 합쳐 SSE 메시지 하나로 (id 없는 알림은 합치지 않음)"""
+    merged = {}
+    for index, event in enumerate(events):
+        key = (event.table, event.row_id) if event.row_id is not None else index
+        merged.pop(key, None)  # 마지막 변경 순서로
+        merged[key] = event
+    _stats["coalesced"] += len(events) - len(merged)
+
+    # payload는 이미 JSON 문자열이므로 다시 파싱하지 않고 이어 붙임
+    payloads = ",".join(event.payload for event in merged.values())
+    data = f'{{"type": "batch", "count": {len(events)}, "events": [{payloads}]}}'
+    return f"id: {events[-1].id}\ndata: {data}\n\n"
+
+
+async def _stream(reader, writer, table, last_event_id=None, coalesce_ms=0):
+    """table_change 알림 SSE 스트림 (클라이언트가 끊을 때까지)
+
+    알림마다 id 필드를 붙이므로 EventSource가 재연결할 때 Last-Event-ID 이후 알림을 재전송한다.
+    coalesce_ms > 0이면 그 시간 동안 모은 알림을 배치 메시지 하나로 보낸다.
+    """
+    loop = asyncio.get_running_loop()
+    if not change_feed.is_connected():
+        # LISTEN 연결 대기는 블로킹이므로 스레드 풀에서
+        if not await loop.run_in_executor(None, change_feed.wait_connected):
+            error = change_feed.last_error() or "LISTEN connection not ready"
+            _stats["rejected"] += 1
+            await _send_json(writer, "500 Internal Server Error", {"error": f"DB connection failed: {error}"})
+            return
+
+    wake = asyncio.Event()
+    sub = change_feed.subscribe(table, last_event_id=last_event_id)
+    sub.on_push = lambda: loop.call_soon_threadsafe(wake.set)
+    disconnected = asyncio.ensure_future(_wait_disconnect(reader))
+    disconnected.add_done_callback(lambda _: wake.set())
+    _stats["active_streams"] += 1
+    _stats["total_streams"] += 1
+    try:
+        head = _response_head("200 OK", "text/event-stream; charset=utf-8") + (
+            "Cache-Control: no-cache\r\n"
+            "X-Accel-Buffering: no\r\n"
+            "Connection: keep-alive\r\n\r\n"
+        )
+        if table:
+            connected = json.dumps({"type": "connected", "table": table}, ensure_ascii=False)
+        else:
+            connected = json.dumps({"type": "connected", "message": "SSE connected"})
+        # 새 구독(또는 재전송 불가)이면 현재 위치를 id로 알려 다음 재연결부터 재전송 가능하게
+        resumed = last_event_id is not None and not sub.reset
+        connected_id = "" if resumed else f"id: {sub.cursor}\n"
+        writer.write(head.encode("latin-1"))
+        writer.write(f": SSE stream started\n\n{connected_id}data: {connected}\n\n".encode("utf-8"))
+        await writer.drain()
+
+        wake.set()  # 재전송 알림이 이미 큐에 있을 수 있음
+        while not disconnected.done():
+            try:
+                await asyncio.wait_for(wake.wait(), KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                writer.write(b": keepalive\n\n")
+            else:
+                if coalesce_ms and sub.pending():
+                    # 첫 알림 후 잠시 더 모음 (그 사이 클라이언트가 끊으면 바로 종료)
+                    await asyncio.wait([disconnected], timeout=coalesce_ms / 1000)
+                wake.clear()
+                if sub.take_reset():
+                    writer.write(_RESET_MESSAGE.encode("utf-8"))
+                events = sub.drain()
+                if coalesce_ms and events:
+                    writer.write(_batch_message(events).encode("utf-8"))
+                else:
+                    for event in events:
+                        writer.write(f"id: {event.id}\ndata: {event.payload}\n\n".encode("utf-8"))
+            await writer.drain()
+    finally:
+        disconnected.cancel()
+        sub.on_push = None
+        change_feed.unsubscribe(sub)
+        _stats["active_streams"] -= 1
@@ -0,0 +1,86 @@
+"""
+통계 API 결과 캐시
+- 마감된 기간(종료일 < 오늘): 변하지 않으므로 만료 없이 보관 (LRU로 개수 제한)
+- 오늘이 포함된 기간: 짧은 TTL 후 재계산
+- 적중/실패 카운터 (/api/health에서 노출)
+
+라우트 모듈(mssql_routes.py)은 외부 파일로 재로드될 수 있으므로
+캐시 저장소는 services 쪽에 두어 재로드 후에도 유지한다.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+# 캐시 설정
+MAX_ENTRIES = 512  # 최대 캐시 항목 수 (LRU)
+LIVE_TTL = 60  # 오늘이 포함된 기간의 캐시 유지 시간 (초)
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # key -> (value, expires_at 또는 None)
+_hits = 0
+_misses = 0
+_evictions = 0
+
+
+def is_closed_period(end_date):
+    """종료일(YYYY-MM-DD)이 오늘 이전이면 True (결과가 더 이상 바뀌지 않는 기간)"""
+    return str(end_date)[:10] < datetime.now().strftime('%Y-%m-%d')
+
+
+def get(key):
+    """캐시 조회 (없거나 만료되면 None)"""
+    global _hits, _misses
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at is None or expires_at > time.time():
+                _entries.move_to_end(key)
+                _hits += 1
+                return value
+            del _entries[key]
+        _misses += 1
+        return None
+
+
+def put(key, value, end_date):
+    """캐시 저장 (end_date로 영구/TTL 여부 결정)"""
+    global _evictions
+    expires_at = None if is_closed_period(end_date) else time.time() + LIVE_TTL
+    with _lock:
+        _entries[key] = (value, expires_at)
+        _entries.move_to_end(key)
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+            _evictions += 1
+
+
+def clear():
+    """전체 캐시 비우기 (삭제된 항목 수 반환)"""
+    with _lock:
+        count = len(_entries)
+        _entries.clear()
+        return count
+
+
+def get_stats():
+    """캐시 상태 조회"""
+    with _lock:
+        now = time.time()
+        live = sum(1 for _, expires_at in _entries.values() if expires_at is not None)
+        total = _hits + _misses
+        return {
+            "entries": len(_entries),
+            "closed_entries": len(_entries) - live,
+            "live_entries": live,
+            "max_entries": MAX_ENTRIES,
+            "live_ttl": LIVE_TTL,
+            "hits": _hits,
+            "misses": _misses,
+            "hit_rate": round(_hits / total, 3) if total else 0.0,
+            "evictions": _evictions,
+            "expired_pending": sum(1 for _, expires_at in _entries.values()
+                                   if expires_at is not None and expires_at <= now),
+        }
@@ -0,0 +1,197 @@
+"""
+월별 통계 롤업 저장소 (SQLite)
+- 마감된 월(이번 달 이전)의 추이 집계를 로컬 SQLite에 보관
+- 추이 API는 마감 월을 여기서 읽고 이번 달만 MSSQL에서 실시간 계산
+- 백그라운드 갱신 스레드 (빠진 마감 월을 주기적으로 채움)
+
+집계 방법(SQL)은 라우트 모듈에 있으므로 갱신 작업은 라우트 모듈이
+register_refresh_job()으로 등록한다. 라우트 핫 리로드 시에도 스레드는 하나만 유지된다.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from config import APP_DIR
+
+# 롤업 설정
+DB_PATH = APP_DIR / "stats_rollup.db"
+REFRESH_INTERVAL = 3600  # 백그라운드 갱신 간격 (초)
+REFRESH_START_DELAY = 30  # 서버 시작 후 첫 갱신까지 대기 (초)
+
+# 로그 콜백 (GUI에서 설정)
+log_callback = None
+
+_lock = threading.Lock()
+_initialized = False
+_refresh_job = None
+_refresh_thread = None
+_last_refresh = None
+_last_error = None
+
+
+def log(message):
+    """롤업 로그 출력"""
+    timestamp = datetime.now().strftime("%H:%M:%S")
+    log_msg = f"[{timestamp}] [Rollup] {message}"
+    print(log_msg)
+    if log_callback:
+        log_callback(log_msg)
+
+
+def _connect():
+    """SQLite 연결 (최초 1회 테이블 생성, _lock 안에서 호출)"""
+    global _initialized
+    conn = sqlite3.connect(str(DB_PATH), timeout=10)
+    if not _initialized:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS monthly_rollup (
+                metric TEXT NOT NULL,
+                month TEXT NOT NULL,
+                doctor TEXT NOT NULL DEFAULT '',
+                data TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (metric, month, doctor)
+            )
+        """)
+        conn.commit()
+        _initialized = True
+    return conn
+
+
+def current_month():
+    """이번 달 ('YYYY-MM')"""
+    return datetime.now().strftime('%Y-%m')
+
+
+def is_closed_month(month):
+    """이번 달 이전이면 True (더 이상 바뀌지 않는 월)"""
+    return month < current_month()
+
+
+def load(metric, months, doctor=''):
+    """저장된 월별 집계 조회
+
+    Returns:
+        {month: data dict} (저장되지 않은 월은 포함되지 않음)
+    """
+    if not months:
+        return {}
+    placeholders = ','.join('?' * len(months))
+    with _lock:
+        conn = _connect()
+        try:
+            rows = conn.execute(
+                f"SELECT month, data FROM monthly_rollup "
+                f"WHERE metric = ? AND doctor = ? AND month IN ({placeholders})",
+                [metric, doctor, *months]
+            ).fetchall()
+        finally:
+            conn.close()
+    return {month: json.loads(data) for month, data in rows}
+
+
+def save(metric, data_by_month, doctor=''):
+    """월별 집계 저장 (마감된 월만 저장, 이번 달은 무시)
+
+    Returns:
+        저장된 월 수
+    """
+    now = datetime.now().isoformat(timespec='seconds')
+    rows = [
+        (metric, month, doctor, json.dumps(data, ensure_ascii=False), now)
+        for month, data in data_by_month.items()
+        if is_closed_month(month)
+    ]
+    if not rows:
+        return 0
+    with _lock:
+        conn = _connect()
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO monthly_rollup (metric, month, doctor, data, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            conn.commit()
+        finally:
+            conn.close()
+    return len(rows)
+
+
+def clear(metric=None):
+    """롤업 삭제 (metric 지정 시 해당 항목만). 삭제된 행 수 반환"""
+    with _lock:
+        conn = _connect()
+        try:
+            if metric:
+                cur = conn.execute("DELETE FROM monthly_rollup WHERE metric = ?", (metric,))
+            else:
+                cur = conn.execute("DELETE FROM monthly_rollup")
+            conn.commit()
+            return cur.rowcount
+        finally:
+            conn.close()
+
+
+def get_stats():
+    """롤업 상태 조회"""
+    stats = {
+        "db_path": str(DB_PATH),
+        "refresh_interval": REFRESH_INTERVAL,
+        "last_refresh": _last_refresh,
+        "last_error": _last_error,
+        "metrics": {},
+    }
+    try:
+        with _lock:
+            conn = _connect()
+            try:
+                rows = conn.execute(
+                    "SELECT metric, COUNT(*), MIN(month), MAX(month) FROM monthly_rollup GROUP BY metric"
+                ).fetchall()
+            finally:
+                conn.close()
+        for metric, count, first, last in rows:
+            stats["metrics"][metric] = {"months": count, "first": first, "last": last}
+    except Exception as e:
+        stats["last_error"] = str(e)
+    return stats
+
+
+# ============ 백그라운드 갱신 ============
+
+def register_refresh_job(job):
+    """갱신 작업 등록 + 갱신 스레드 시작 (이미 실행 중이면 작업만 교체)"""
+    global _refresh_job, _refresh_thread
+    _refresh_job = job
+    if _refresh_thread is None or not _refresh_thread.is_alive():
+        _refresh_thread = threading.Thread(target=_refresh_loop, daemon=True, name="stats-rollup")
+        _refresh_thread.start()
+
+
+def refresh_now():
+    """등록된 갱신 작업 즉시 실행"""
+    global _last_refresh, _last_error
+    job = _refresh_job
+    if job is None:
+        return 0
+    try:
+        saved = job() or 0
+        _last_refresh = datetime.now().isoformat(timespec='seconds')
+        _last_error = None
+        if saved:
+            log(f"마감 월 집계 {saved}건 저장")
+        return saved
+    except Exception as e:
+        _last_error = str(e)
+        log(f"갱신 오류: {e}")
+        return 0
+
+
+def _refresh_loop():
+    time.sleep(REFRESH_START_DELAY)
+    while True:
+        refresh_now()
+        time.sleep(REFRESH_INTERVAL)
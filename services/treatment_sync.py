@@ -0,0 +1,344 @@
+"""
+MSSQL 치료실(Treating) -> PostgreSQL 치료기록(daily_treatment_records) 동기화
+- MSSQL은 mssql_db, PostgreSQL은 postgres_db로 직접 접근 (localhost HTTP 호출 없음)
+- 직전에 동기화한 Treating 목록과 같으면 PostgreSQL 호출 생략, 새로 들어온 환자만 전송
+- FULL_SYNC_EVERY회마다 전체 전송 (waiting 기록 synced_at 갱신, PostgreSQL에서 지워진 기록 복구)
+- 요일별 스케줄 (config의 sync_schedule)
+- start()가 HealthMonitor 주기 작업으로 등록 (GUI 없이도 동작)
+
+    treatment_sync.start(interval=5, schedule=config.get("sync_schedule"))
+    treatment_sync.stop()
+"""
+
+import threading
+import time
+from datetime import datetime
+from services import mssql_db
+from services import postgres_db
+from services.server_manager import get_health_monitor
+
+# 요일별 스케줄 기본값 (월~일)
+DEFAULT_SCHEDULE = {
+    "mon": {"enabled": True, "start": "08:30", "end": "18:30"},
+    "tue": {"enabled": True, "start": "08:30", "end": "18:30"},
+    "wed": {"enabled": True, "start": "08:30", "end": "18:30"},
+    "thu": {"enabled": True, "start": "08:30", "end": "18:30"},
+    "fri": {"enabled": True, "start": "08:30", "end": "18:30"},
+    "sat": {"enabled": True, "start": "08:30", "end": "13:00"},
+    "sun": {"enabled": False, "start": "09:00", "end": "12:00"},
+}
+
+_DAY_KEYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+JOB_NAME = "treatment_sync"
+DEFAULT_INTERVAL = 5  # 동기화 간격 (초)
+FULL_SYNC_EVERY = 12  # 변화분만 보낸 실행이 이 횟수만큼 이어지면 다음 실행은 전체 전송 (5초 간격이면 1분)
+
+# 로그 콜백 (GUI에서 설정)
+log_callback = None
+
+_lock = threading.Lock()  # run_once 동시 실행 방지 (주기 실행 + 수동 실행) - 동기화 동안 계속 잡힘
+_stats_lock = threading.Lock()  # _stats/_last_synced 읽기/쓰기 (짧게만 잡음 - 상태 조회가 동기화를 기다리지 않음)
+_last_synced = set()  # 마지막으로 동기화에 성공한 Treating 키 (id, patient_id, 입실 시각)
+_last_synced_date = None
+_runs_since_full = 0  # 마지막 전체 전송 이후 변화분만 보낸 실행 수
+_started = False  # HealthMonitor에 주기 작업으로 등록됨
+_index_ready = None  # None: 미확인, True: 인덱스 있음, False: 생성 실패
+_stats = {
+    "runs": 0,
+    "unchanged_runs": 0,  # 변화가 없어 PostgreSQL 호출을 생략한 횟수
+    "total_added": 0,
+    "last_run": None,
+    "last_duration_ms": None,
+    "last_result": None,
+    "last_error": None,
+}
+
+
+def log(message):
+    """동기화 로그 출력"""
+    timestamp = datetime.now().strftime("%H:%M:%S")
+    log_msg = f"[{timestamp}] [Sync] {message}"
+    print(log_msg)
+    if log_callback:
+        log_callback(log_msg)
+
+
+def is_within_schedule(schedule=None, now=None):
+    """현재 시간이 요일별 스케줄 안인지 확인 (파싱 오류 시 True)"""
+    now = now or datetime.now()
+    schedule = schedule or DEFAULT_SCHEDULE
+    day_key = _DAY_KEYS[now.weekday()]
+    day_schedule = schedule.get(day_key, DEFAULT_SCHEDULE[day_key])
+
+    if not day_schedule.get("enabled", True):
+        return False
+
+    try:
+        start_time = datetime.strptime(day_schedule.get("start", "08:30"), "%H:%M").time()
+        end_time = datetime.strptime(day_schedule.get("end", "18:30"), "%H:%M").time()
+        return start_time <= now.time() <= end_time
+    except:
+        return True
+
+
+# ============ MSSQL 읽기 ============
+
+def fetch_treating():
+    """MSSQL 치료실(Treating) 목록 (/api/queue/status의 treating과 같은 형식 + waiting_since)"""
+    conn = mssql_db.get_connection()
+    if not conn:
+        raise Exception("MSSQL 연결 실패")
+    try:
+        cursor = conn.cursor(as_dict=True)
+        cursor.execute("""
+            SELECT
+              Treating_PK as id,
+              Customer_PK as patient_id,
+              BED as bed,
+              SN as chart_no,
+              NAME as patient_name,
+              AGE as age,
+              SEX as sex,
+              IntoTime as treating_since,
+              TxDoctor as doctor,
+              ChartDone as chart_done,
+              CAST(Status AS NVARCHAR(MAX)) as status
+            FROM TreatCurrent.dbo.Treating
+            ORDER BY IntoTime ASC
+        """)
+        treating = cursor.fetchall()
+    finally:
+        conn.close()
+
+    for t in treating:
+        t['sex'] = 'M' if t['sex'] else 'F'
+        if t['treating_since']:
+            t['treating_since'] = t['treating_since'].isoformat()
+        t['waiting_since'] = t['treating_since']
+    return treating
+
+
+# ============ PostgreSQL 쓰기 ============
+
+def ensure_index():
+    """daily_treatment_records (patient_id, treatment_date, visit_number) 유니크 인덱스 확인/생성 (프로세스당 1회)
+
+    Returns:
+        인덱스 사용 가능 여부 (기존 중복 데이터로 생성 실패 시 False - ON CONFLICT 없이 동기화)
+    """
+    global _index_ready
+    if _index_ready is None:
+        try:
+            postgres_db.execute_query("""
+                CREATE UNIQUE INDEX IF NOT EXISTS daily_treatment_records_visit_key
+                ON daily_treatment_records (patient_id, treatment_date, visit_number)
+            """, fetch=False)
+            _index_ready = True
+        except Exception as e:
+            postgres_db.log(f"daily_treatment_records 유니크 인덱스 생성 오류: {e}", force=True)
+            _index_ready = False
+    return _index_ready
+
+
+def upsert_treatments(mssql_patients):
+    """Treating 목록을 daily_treatment_records에 반영
+
+    - 새 환자: INSERT with status='waiting'
+    - 기존 환자(waiting): synced_at 업데이트
+    - 기존 환자(treating/complete): 스킵
+    - 환자 수와 관계없이 한 트랜잭션에서 쿼리 3개로 처리
+
+    Returns:
+        {"added", "updated", "skipped"}
+    """
+    today = datetime.now().strftime('%Y-%m-%d')
+    now = datetime.now().isoformat()
+
+    # 환자별 첫 항목만 사용
+    patients = {}
+    for patient in mssql_patients:
+        patient_id = patient.get('patient_id')
+        if patient_id and patient_id not in patients:
+            patients[patient_id] = patient
+
+    if not patients:
+        return {"added": 0, "updated": 0, "skipped": 0}
+
+    use_conflict = ensure_index()
+
+    with postgres_db.session() as s:
+        # 오늘 환자별 마지막 기록
+        latest = s.query("""
+            SELECT DISTINCT ON (patient_id) id, patient_id, status
+            FROM daily_treatment_records
+            WHERE treatment_date = %s AND patient_id = ANY(%s)
+            ORDER BY patient_id, visit_number DESC
+        """, (today, list(patients)))
+
+        # 이미 치료중이거나 완료된 환자는 스킵, waiting 상태면 synced_at만 업데이트
+        existing_ids = {row['patient_id'] for row in latest}
+        update_ids = [row['id'] for row in latest if row['status'] not in ('treating', 'complete')]
+        skipped = len(latest) - len(update_ids)
+        updated = 0
+        if update_ids:
+            updated = s.execute("""
+                UPDATE daily_treatment_records
+                SET synced_at = %s
+                WHERE id = ANY(%s)
+            """, (now, update_ids))
+
+        # 새 환자 INSERT
+        new_rows = []
+        for patient_id, patient in patients.items():
+            if patient_id in existing_ids:
+                continue
+            intotime = patient.get('waiting_since') or patient.get('treating_since')
+            new_rows.append((
+                patient_id,
+                patient.get('patient_name') or '',
+                patient.get('chart_no') or '',
+                today,
+                patient.get('doctor') or '',
+                intotime,
+                patient.get('id'),  # mssql_waiting_pk
+                intotime,
+                now,
+                patient.get('age'),
+                patient.get('sex') or ''
+            ))
+
+        added = s.execute_values(f"""
+            INSERT INTO daily_treatment_records
+            (patient_id, patient_name, chart_number, treatment_date,
+             status, doctor_name, reception_time,
+             mssql_waiting_pk, mssql_intotime, synced_at,
+             patient_age, patient_sex, visit_number)
+            VALUES %s
+            {"ON CONFLICT (patient_id, treatment_date, visit_number) DO NOTHING" if use_conflict else ""}
+        """, new_rows, template="(%s, %s, %s, %s, 'waiting', %s, %s, %s, %s, %s, %s, %s, 1)")
+
+        # 동시에 들어온 다른 동기화가 먼저 추가한 환자
+        skipped += len(new_rows) - added
+
+    return {"added": added, "updated": updated, "skipped": skipped}
+
+
+# ============ 동기화 실행 ============
+
+def reset():
+    """직전 동기화 목록 초기화 (다음 실행 시 전체 전송)"""
+    global _last_synced
+    with _stats_lock:
+        _last_synced = set()
+
+
+def run_once(schedule=None, full=False):
+    """Treating 읽기 -> 변화분만 PostgreSQL 반영 (FULL_SYNC_EVERY회마다 전체 전송)
+
+    Args:
+        schedule: 요일별 스케줄 (None이면 스케줄 확인 안 함)
+        full: True면 직전 목록과 관계없이 전체 전송 (수동 동기화)
+
+    변화분만 보내면 waiting 기록의 synced_at이 갱신되지 않고, PostgreSQL 쪽에서 지우거나 초기화한 기록도
+    Treating이 그대로인 동안 다시 추가되지 않으므로 주기적으로 전체를 보낸다.
+
+    Returns:
+        {"fetched", "sent", "added", "updated", "skipped"} 또는 스케줄 밖이면 None
+    """
+    global _last_synced, _last_synced_date, _runs_since_full
+    if schedule is not None and not is_within_schedule(schedule):
+        return None
+
+    with _lock:
+        started = time.time()
+        try:
+            treating = fetch_treating()
+
+            with _stats_lock:
+                # 날짜가 바뀌면 처음부터 다시 동기화 (치료기록은 날짜별)
+                today = datetime.now().date()
+                if _last_synced_date != today:
+                    _last_synced = set()
+                    _last_synced_date = today
+                previous = _last_synced
+                full = full or _runs_since_full >= FULL_SYNC_EVERY
+
+            # 직전 목록과 비교 - 새로 들어온 환자만 전송 (나간 환자는 기록이 남으므로 전송할 것 없음)
+            current = {(t['id'], t['patient_id'], t['waiting_since']): t for t in treating}
+            sync_list = list(current.values()) if full else [
+                t for key, t in current.items() if key not in previous
+            ]
+
+            result = {"fetched": len(treating), "sent": len(sync_list), "added": 0, "updated": 0, "skipped": 0}
+            if sync_list:
+                result.update(upsert_treatments(sync_list))
+
+            with _stats_lock:
+                # 동기화 중에 reset()됐으면 그대로 두어 다음 실행에서 전체 전송
+                if _last_synced is previous:
+                    _last_synced = set(current)
+                _runs_since_full = 0 if full else _runs_since_full + 1
+                if not sync_list:
+                    _stats["unchanged_runs"] += 1
+                _stats["total_added"] += result["added"]
+                _stats["last_result"] = result
+                _stats["last_error"] = None
+            if result["added"]:
+                log(f"치료기록 동기화: 추가 {result['added']}, 업데이트 {result['updated']}, 스킵 {result['skipped']}")
+            return result
+        except Exception as e:
+            with _stats_lock:
+                _stats["last_error"] = str(e)
+            log(f"동기화 오류: {e}")
+            raise
+        finally:
+            with _stats_lock:
+                _stats["runs"] += 1
+                _stats["last_run"] = datetime.now().isoformat(timespec='seconds')
+                _stats["last_duration_ms"] = round((time.time() - started) * 1000, 1)
+
+
+def get_stats():
+    """동기화 상태 조회 (실행 중인 동기화를 기다리지 않음)"""
+    with _stats_lock:
+        return dict(_stats, tracked=len(_last_synced), running=_lock.locked(), started=_started)
+
+
+# ============ 주기 실행 ============
+
+def start(interval=DEFAULT_INTERVAL, schedule=None):
+    """HealthMonitor 주기 작업으로 등록 (이미 실행 중이면 새 간격/스케줄로 교체)
+
+    Args:
+        interval: 실행 간격 (초)
+        schedule: 요일별 스케줄 (None이면 DEFAULT_SCHEDULE)
+    """
+    global _started
+    schedule = schedule or DEFAULT_SCHEDULE
+    if not _started:
+        reset()
+
+    def job():
+        try:
+            run_once(schedule)
+        except Exception:
+            pass  # run_once에서 로그 출력
+
+    get_health_monitor().register_job(JOB_NAME, interval, job)
+    if not _started:
+        log(f"치료기록 동기화 시작 ({interval}초 간격)")
+    _started = True
+
+
+def stop():
+    """주기 실행 중지"""
+    global _started
+    if _started:
+        get_health_monitor().unregister_job(JOB_NAME)
+        log("치료기록 동기화 중지")
+    _started = False
+
+
+def is_started():
+    return _started
@@ -0,0 +1,84 @@
+"""
+MSSQL Connection Pool 테스트 (pymssql 없이 가짜 연결로 실행)
+
+    python -m pytest tests
+"""
+
+import gc
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# config.py는 Windows 레지스트리(winreg)를 import - 다른 OS에서는 빈 모듈로 대체
+sys.modules.setdefault("winreg", types.ModuleType("winreg"))
+
+from services import mssql_db  # noqa: E402
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+
+    def cursor(self, as_dict=False):
+        return None
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """연결 1개짜리 풀 (유지보수 스레드 없이)"""
+    pool = mssql_db.ConnectionPool(size=1, max_overflow=0, timeout=0.2, min_size=0)
+    pool._config = {}
+    pool._initialized = True
+    monkeypatch.setattr(pool, "_connect", FakeConnection)
+    monkeypatch.setattr(mssql_db, "log", lambda message: None)
+    return pool
+
+
+def test_closing_twice_does_not_return_other_checkout(pool):
+    """이미 반환한 핸들을 다시 닫아도 같은 연결을 받은 다음 요청에는 영향 없음"""
+    first = pool.get_connection()
+    first.close()
+    second = pool.get_connection()
+
+    first.close()
+
+    assert pool.get_stats()["active"] == 1
+    assert pool.get_connection() is None  # 여전히 사용 중 -> 타임아웃
+    with pytest.raises(RuntimeError):
+        first.cursor()
+    second.close()
+    assert pool.get_stats()["available"] == 1
+
+
+def test_handle_dropped_without_close_is_reclaimed(pool):
+    conn = pool.get_connection()
+    raw = conn._conn
+    del conn
+    gc.collect()
+
+    conn = pool.get_connection()
+
+    assert conn is not None
+    assert raw.closed  # 트랜잭션 상태를 모르는 연결은 재사용하지 않고 닫음
+    assert pool.get_stats()["reclaimed"] == 1
+    conn.close()
+
+
+def test_checkout_held_too_long_is_reclaimed(pool):
+    held = pool.get_connection()
+    pool.max_checkout = 0
+
+    pool._reclaim_stale()
+
+    assert pool.get_stats()["open"] == 0
+    with pytest.raises(RuntimeError):
+        held.cursor()
+    held.close()  # 회수된 핸들을 닫아도 슬롯 수는 그대로
+    assert pool.get_stats()["open"] == 0
+    assert pool.get_connection() is not None
@@ -0,0 +1,143 @@
+"""
+MSSQL 라우트 테스트 (실제 DB 없이 가짜 커서로 실행)
+
+    python -m pytest tests
+"""
+
+import sys
+import types
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# config.py는 Windows 레지스트리(winreg)를 import - 다른 OS에서는 빈 모듈로 대체
+sys.modules.setdefault("winreg", types.ModuleType("winreg"))
+
+pytest.importorskip("flask")
+from flask import Flask  # noqa: E402
+import routes.mssql_routes as mssql_routes  # noqa: E402
+
+
+class CountingCursor:
+    """실행된 쿼리 수를 세는 가짜 커서 (첫 쿼리는 Receipt, 이후는 Detail 결과 반환)"""
+
+    def __init__(self, receipts, details):
+        self.receipts = receipts
+        self.details = details
+        self.queries = []
+        self._rows = []
+
+    def execute(self, query, params=None):
+        self.queries.append(query)
+        if "FROM Receipt" in query:
+            self._rows = self.receipts
+        elif "FROM Detail" in query:
+            ids = set(params or ())
+            self._rows = [d for d in self.details if d["patient_id"] in ids]
+        else:
+            self._rows = []
+
+    def fetchall(self):
+        return [dict(row) for row in self._rows]
+
+    def fetchone(self):
+        return dict(self._rows[0]) if self._rows else None
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.closed = False
+
+    def cursor(self, as_dict=False):
+        return self._cursor
+
+    def close(self):
+        self.closed = True
+
+
+def _receipt(pk):
+    return {
+        "id": pk, "patient_id": pk, "patient_name": f"환자{pk}", "chart_no": str(pk),
+        "insurance_self": 1000, "insurance_claim": 2000, "general_amount": 0, "unpaid": 0,
+        "receipt_time": datetime(2024, 1, 2, 9, 30),
+        "insu_type": None, "insu_bohum_type": None, "insu_boho_type": None,
+        "pregmark": None, "SeriousTag": None, "birth": None,
+        "card_amount": 1000, "cash_amount": 0, "transfer_amount": 0,
+    }
+
+
+def _detail(pk):
+    return {
+        "patient_id": pk, "id": pk * 10, "tx_item": "진찰료", "px_name": "침술",
+        "dx_name": "", "doctor": "원장", "amount": 500, "is_covered": True,
+        "choona_status": "0", "is_yakchim": False, "detail_time": datetime(2024, 1, 2, 9, 0),
+    }
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.register_blueprint(mssql_routes.mssql_bp)
+    return app.test_client()
+
+
+def _run_receipts_by_date(client, monkeypatch, count):
+    """수납 count건으로 /api/receipts/by-date 호출 -> (응답 JSON, 실행된 쿼리 수)"""
+    ids = list(range(1, count + 1))
+    cursor = CountingCursor([_receipt(pk) for pk in ids], [_detail(pk) for pk in ids])
+    conn = FakeConnection(cursor)
+    monkeypatch.setattr(mssql_routes.mssql_db, "get_connection", lambda *args, **kwargs: conn)
+
+    response = client.get("/api/receipts/by-date?date=2024-01-02")
+    assert response.status_code == 200, response.get_json()
+    assert conn.closed
+    return response.get_json(), len(cursor.queries)
+
+
+def test_receipts_by_date_query_count_is_constant(client, monkeypatch):
+    """수납 건수가 늘어도 쿼리 수는 그대로 (환자별 Detail 조회 N+1 방지)"""
+    small, small_queries = _run_receipts_by_date(client, monkeypatch, 1)
+    large, large_queries = _run_receipts_by_date(client, monkeypatch, 200)
+
+    assert small_queries == large_queries == 2
+    assert small["summary"]["count"] == 1
+    assert large["summary"]["count"] == 200
+    # 환자별 진료 내역이 제 환자에게 붙었는지
+    assert all(r["treatments"][0]["id"] == r["patient_id"] * 10 for r in large["receipts"])
+    assert all(r["treatment_summary"]["acupuncture"] for r in large["receipts"])
+
+
+def test_receipts_by_date_without_receipts_skips_detail_query(client, monkeypatch):
+    data, queries = _run_receipts_by_date(client, monkeypatch, 0)
+
+    assert queries == 1
+    assert data["receipts"] == []
+
+
+def test_stats_cache_keys_on_raw_doctor_value(monkeypatch):
+    """?doctor=%20 결과(공백 원장 필터)가 필터 없는 요청에 캐시로 재사용되지 않음"""
+    monkeypatch.setattr(mssql_routes.stats_cache, "_entries", type(mssql_routes.stats_cache._entries)())
+    app = Flask(__name__)
+    calls = []
+
+    @app.route('/api/stats/test-doctor')
+    @mssql_routes._cached_stats()
+    def stats_by_doctor():
+        doctor = mssql_routes.request.args.get('doctor', '')
+        calls.append(doctor)
+        return mssql_routes.jsonify({"doctor": doctor})
+
+    client = app.test_client()
+    blank = client.get('/api/stats/test-doctor?date=2024-01-02&doctor=%20').get_json()
+    unfiltered = client.get('/api/stats/test-doctor?date=2024-01-02').get_json()
+    cached = client.get('/api/stats/test-doctor?date=2024-01-02').get_json()
+
+    assert blank == {"doctor": " "}
+    assert unfiltered == cached == {"doctor": ""}
+    assert calls == [" ", ""]